@@ -0,0 +1,76 @@
+# =============================================================================
+# Benchmark Comparison
+# =============================================================================
+#
+# Comparing two JSON results of the benchmark suite, typically run on two
+# different commits, & flagging the operations which became slower than a
+# given ratio.
+#
+# Usage: python -m benchmarks.compare baseline.json results.json [threshold]
+#
+import json
+import sys
+
+DEFAULT_THRESHOLD = 1.25
+
+
+# Function returning the rows (size, storage, operation, durations & ratio)
+# of the measures found in both results
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    rows = []
+
+    for size, storages in sorted(results['results'].items()):
+        for storage, operations in sorted(storages.items()):
+            for operation, measure in sorted(operations.items()):
+                try:
+                    base = baseline['results'][size][storage][operation]
+                except KeyError:
+                    continue
+
+                ratio = measure['us_per_op'] / base['us_per_op'] if base['us_per_op'] else None
+
+                rows.append({
+                    'size': size,
+                    'storage': storage,
+                    'operation': operation,
+                    'baseline': base['us_per_op'],
+                    'current': measure['us_per_op'],
+                    'ratio': ratio,
+                    'regression': ratio is not None and ratio > threshold
+                })
+
+    return rows
+
+
+def print_comparison(rows):
+    print '\n:: Comparison (microseconds per operation)'
+
+    for row in rows:
+        print '%-5s %-7s %-35s %12.2f %12.2f %7s%s' % (
+            row['size'],
+            row['storage'],
+            row['operation'],
+            row['baseline'],
+            row['current'],
+            'x%.2f' % row['ratio'] if row['ratio'] is not None else '-',
+            '  REGRESSION' if row['regression'] else ''
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print 'Usage: python -m benchmarks.compare baseline.json results.json [threshold]'
+        sys.exit(2)
+
+    with open(sys.argv[1]) as f:
+        baseline = json.load(f)
+
+    with open(sys.argv[2]) as f:
+        results = json.load(f)
+
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_THRESHOLD
+
+    rows = compare(baseline, results, threshold)
+    print_comparison(rows)
+
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
@@ -0,0 +1,184 @@
+# =============================================================================
+# Micro Benchmarks
+# =============================================================================
+#
+# Measuring the per-node cost of the low-level operations (reading, writing &
+# traversing trie nodes, reading & writing link chunks and headers) on every
+# storage, so that changes in the binary layer can be compared.
+#
+# NOTE: durations are wall clock times since the file storages spend time in
+# IO, which the CPU time would leave out.
+#
+# Usage: python -m benchmarks.micro [nb_pages]
+#
+import os
+import shutil
+import sys
+import tempfile
+import time
+from traph.storage import FileStorage, CachedFileStorage, MemoryStorage
+from traph.lru_trie import LRUTrie, LRU_TRIE_NODE_BLOCK_SIZE
+from traph.lru_trie.node import LRUTrieNode, LRU_TRIE_FIRST_DATA_BLOCK
+from traph.lru_trie.header import LRUTrieHeader
+from traph.link_store import LinkStore, LINK_STORE_BLOCK_SIZE
+from traph.link_store.chunk import LinkStoreChunk
+from traph.link_store.header import LinkStoreHeader
+
+timer = time.time
+
+NB_PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+# Number of times each measure is repeated, the best time being kept
+REPEAT = 5
+
+LRUS = [
+    's:http|h:com|h:site%i|p:section%i|p:page%i|' % (i % 100, i % 1000, i)
+    for i in xrange(NB_PAGES)
+]
+
+
+# Function returning the best time, in microseconds per operation, of the
+# given function performing the given number of operations
+def measure(fn, nb_operations):
+    best = None
+
+    for _ in xrange(REPEAT):
+        start = timer()
+        fn()
+        duration = timer() - start
+
+        if best is None or duration < best:
+            best = duration
+
+    return 1e6 * best / max(1, nb_operations)
+
+
+# Storage factories
+def memory_storages(folder):
+    return MemoryStorage(LRU_TRIE_NODE_BLOCK_SIZE), MemoryStorage(LINK_STORE_BLOCK_SIZE)
+
+
+def file_storages(folder):
+    return (
+        FileStorage(LRU_TRIE_NODE_BLOCK_SIZE, open(os.path.join(folder, 'lru_trie.dat'), 'wb+')),
+        FileStorage(LINK_STORE_BLOCK_SIZE, open(os.path.join(folder, 'link_store.dat'), 'wb+'))
+    )
+
+
+def cached_file_storages(folder):
+    return (
+        CachedFileStorage(LRU_TRIE_NODE_BLOCK_SIZE, open(os.path.join(folder, 'lru_trie.dat'), 'wb+')),
+        CachedFileStorage(LINK_STORE_BLOCK_SIZE, open(os.path.join(folder, 'link_store.dat'), 'wb+'))
+    )
+
+
+STORAGES = [
+    ('memory', memory_storages),
+    ('file', file_storages),
+    ('cached', cached_file_storages)
+]
+
+
+# Benchmarks
+def benchmark(lru_trie_storage, link_store_storage):
+    results = []
+
+    lru_trie = LRUTrie(lru_trie_storage)
+    link_store = LinkStore(link_store_storage)
+
+    blocks = [lru_trie.add_page(lru)[0].block for lru in LRUS]
+    nodes = range(LRU_TRIE_FIRST_DATA_BLOCK, len(lru_trie_storage), LRU_TRIE_NODE_BLOCK_SIZE)
+
+    def node_read():
+        node = LRUTrieNode(lru_trie_storage)
+
+        for block in nodes:
+            node.read(block)
+
+    def node_write():
+        node = LRUTrieNode(lru_trie_storage)
+
+        for block in nodes:
+            node.read(block)
+            node.write()
+
+    def cursor_read():
+        cursor = lru_trie.cursor()
+
+        for block in nodes:
+            cursor.read(block)
+
+    def dfs():
+        for _ in lru_trie.dfs_iter():
+            pass
+
+    def header_read_write():
+        header = LRUTrieHeader(lru_trie_storage)
+
+        for _ in nodes:
+            header.read()
+            header.write()
+
+    results.append(('node read', measure(node_read, len(nodes))))
+    results.append(('node write', measure(node_write, len(nodes))))
+    results.append(('cursor read', measure(cursor_read, len(nodes))))
+    results.append(('dfs hop', measure(dfs, len(nodes))))
+    results.append(('trie header read+write', measure(header_read_write, len(nodes))))
+
+    # Links: every page links to the next 10 ones
+    for i, block in enumerate(blocks):
+        link_store.add_outlinks(
+            LRUTrieNode(lru_trie_storage, block=block),
+            [blocks[(i + j) % len(blocks)] for j in xrange(1, 11)]
+        )
+
+    chunk_blocks = [
+        chunk.block
+        for block in blocks
+        for chunk in link_store.chunks_iter(LRUTrieNode(lru_trie_storage, block=block).outlinks())
+    ]
+
+    def chunk_read():
+        chunk = LinkStoreChunk(link_store_storage)
+
+        for block in chunk_blocks:
+            chunk.read(block)
+
+    def chunk_write():
+        for block in chunk_blocks:
+            LinkStoreChunk(link_store_storage, block=block).write()
+
+    def link_store_header_read_write():
+        header = LinkStoreHeader(link_store_storage)
+
+        for _ in chunk_blocks:
+            header.read()
+            header.write()
+
+    results.append(('chunk read', measure(chunk_read, len(chunk_blocks))))
+    results.append(('chunk write', measure(chunk_write, len(chunk_blocks))))
+    results.append(('link store header read+write', measure(link_store_header_read_write, len(chunk_blocks))))
+
+    return results
+
+
+if __name__ == '__main__':
+    print ':: Micro benchmarks on %s pages (microseconds per operation)' % format(NB_PAGES, ',')
+
+    for name, storages in STORAGES:
+        folder = tempfile.mkdtemp()
+        lru_trie_storage, link_store_storage = storages(folder)
+
+        try:
+            print '\n%s' % name
+
+            for operation, duration in benchmark(lru_trie_storage, link_store_storage):
+                print '\t%-30s %8.2f' % (operation, duration)
+        finally:
+
+            # NOTE: memory storages have no file
+            for storage in (lru_trie_storage, link_store_storage):
+                if hasattr(storage, 'file'):
+                    storage.file.close()
+
+            shutil.rmtree(folder)
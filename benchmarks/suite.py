@@ -0,0 +1,399 @@
+# =============================================================================
+# Benchmark Suite
+# =============================================================================
+#
+# Measuring the ingestion & query hot paths of the Traph on seeded synthetic
+# corpora, on every storage backend, and writing the results as JSON so that
+# runs from different commits can be compared (see benchmarks/compare.py).
+#
+# Corpora are generated with scripts.utils.random_lru: the out-degrees of the
+# crawled pages follow a power law, links mostly point to pages of the same
+# host & the targets are drawn by popularity (Zipf), so that some pages &
+# webentities are hubs.
+#
+# NOTE: durations are wall clock times (file storages spend time in IO), the
+# best of the repeated measures being kept for the read-only queries.
+#
+# Usage: python -m benchmarks.suite [--sizes 10k,100k,1M] [--output results.json]
+#
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from traph import Traph, TraphBuilder
+from traph.storage.cached_file import DEFAULT_CACHE_SIZE
+from scripts.utils.random_lru import random_lru
+from benchmarks.compare import compare, print_comparison
+
+# Version of the results' format
+SUITE_FORMAT_VERSION = 1
+
+SIZES = {
+    '10k': 10000,
+    '100k': 100000,
+    '1M': 1000000
+}
+
+STORAGES = ['memory', 'file', 'cached']
+
+# Corpus parameters
+VOC = [
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'hodor', 'consectetur',
+    'adipiscing', 'elit', 'sed', 'do', 'eiusmod'
+]
+DOMAIN_SIZES = [1, 2, 3]
+PATH_SIZES = [1, 2, 3, 4, 5]
+CRAWLED_RATIO = 0.5
+OUTDEGREE_ALPHA = 1.5
+OUTDEGREE_SCALE = 8
+MAX_OUTDEGREE = 1000
+INTERNAL_LINKS_RATIO = 0.6
+
+# Number of crawled pages given to each index_batch_crawl call
+BATCH_SIZE = 1000
+
+# Number of webentities sampled for the webentity queries
+NB_SAMPLED_WEBENTITIES = 20
+
+DEFAULT_WEBENTITY_CREATION_RULE = (
+    '(s:[a-zA-Z]+\\|(t:[0-9]+\\|)?(h:[^\\|]+\\|(h:[^\\|]+\\|)+|'
+    'h:(localhost|(\\d{1,3}\\.){3}\\d{1,3}|\\[[\\da-f]*:[\\da-f:]*\\])\\|))'
+)
+
+timer = time.time
+
+
+# Function returning the host prefix of an LRU
+def host_prefix(lru):
+    return lru[:lru.index('|p:') + 1]
+
+
+# Function drawing an index in [0, n) following a Zipf law (rank r being
+# drawn with a probability proportional to 1 / r)
+def zipf_index(rng, n):
+    return min(n - 1, int(n ** rng.random()) - 1)
+
+
+# Function generating a seeded corpus of the given number of pages, returning
+# the pages & the crawl as a list of (source, targets) pairs
+def generate_corpus(nb_pages, seed):
+    rng = random.Random(seed)
+
+    pages = []
+    seen = set()
+
+    while len(pages) < nb_pages:
+        lru = random_lru(VOC, DOMAIN_SIZES, PATH_SIZES, rng=rng)
+
+        if lru in seen:
+            continue
+
+        seen.add(lru)
+        pages.append(lru)
+
+    # NOTE: popularity is given by the position in this shuffled list
+    rng.shuffle(pages)
+
+    hosts = defaultdict(list)
+
+    for lru in pages:
+        hosts[host_prefix(lru)].append(lru)
+
+    crawl = []
+
+    for lru in pages:
+        if rng.random() >= CRAWLED_RATIO:
+            continue
+
+        outdegree = min(
+            MAX_OUTDEGREE,
+            int(OUTDEGREE_SCALE * (rng.paretovariate(OUTDEGREE_ALPHA) - 1))
+        )
+        targets = set()
+
+        for _ in xrange(outdegree):
+            if rng.random() < INTERNAL_LINKS_RATIO:
+                siblings = hosts[host_prefix(lru)]
+                targets.add(siblings[zipf_index(rng, len(siblings))])
+            else:
+                targets.add(pages[zipf_index(rng, len(pages))])
+
+        targets.discard(lru)
+        crawl.append((lru, sorted(targets)))
+
+    return pages, crawl
+
+
+# Function returning the current commit, if any
+def current_commit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                stderr=devnull
+            ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function opening a new Traph on the given storage backend
+def open_traph(storage, folder):
+    kwargs = {
+        'default_webentity_creation_rule': DEFAULT_WEBENTITY_CREATION_RULE,
+        'webentity_creation_rules': {}
+    }
+
+    if storage == 'memory':
+        return Traph(**kwargs)
+
+    if storage == 'cached':
+        kwargs['cache_size'] = DEFAULT_CACHE_SIZE
+
+    return Traph(folder=folder, overwrite=True, **kwargs)
+
+
+# Function timing a single call
+def measure_once(fn):
+    start = timer()
+    fn()
+    return timer() - start
+
+
+# Function returning the best time of the given number of calls
+def measure_best(fn, repeat, setup=None):
+    best = None
+
+    for _ in xrange(repeat):
+        if setup is not None:
+            setup()
+
+        duration = measure_once(fn)
+
+        if best is None or duration < best:
+            best = duration
+
+    return best
+
+
+# Function formatting a result
+def result(count, seconds):
+    return {
+        'count': count,
+        'seconds': seconds,
+        'us_per_op': 1e6 * seconds / max(1, count)
+    }
+
+
+# Benchmarks
+def benchmark(storage, pages, crawl, repeat, log=None):
+    results = {}
+    nb_links = sum(len(targets) for _, targets in crawl)
+    folder = tempfile.mkdtemp(prefix='traph-benchmark-')
+
+    def record(operation, count, seconds):
+        results[operation] = result(count, seconds)
+
+        if log is not None:
+            log(operation, results[operation])
+
+    try:
+
+        # Ingestion, page by page & link by link
+        traph = open_traph(storage, folder)
+
+        def add_pages():
+            for lru in pages:
+                traph.add_page(lru)
+
+        def add_links():
+            for source, targets in crawl:
+                traph.add_links([(source, target) for target in targets])
+
+        record('add_page', len(pages), measure_once(add_pages))
+        record('add_links', nb_links, measure_once(add_links))
+
+        traph.close()
+
+        # Ingestion, by crawl batches
+        traph = open_traph(storage, folder)
+
+        def index_batch_crawl():
+            for i in xrange(0, len(crawl), BATCH_SIZE):
+                traph.index_batch_crawl(dict(crawl[i:i + BATCH_SIZE]))
+
+        record('index_batch_crawl', nb_links, measure_once(index_batch_crawl))
+
+        # Queries
+        webentities = defaultdict(list)
+
+        for node, prefix in traph.webentity_prefix_iter():
+            webentities[node.webentity()].append(prefix)
+
+        rng = random.Random(len(pages))
+        sample = rng.sample(
+            sorted(webentities.items()),
+            min(NB_SAMPLED_WEBENTITIES, len(webentities))
+        )
+
+        # NOTE: the webentity graph is dropped so that it is computed again
+        def reset_webentity_graph():
+            traph.webentity_graph = None
+
+        def get_webentities_links():
+            traph.get_webentities_links()
+
+        def get_webentity_pagelinks():
+            for weid, prefixes in sample:
+                traph.get_webentity_pagelinks(weid, prefixes, include_inbound=True, include_outbound=True)
+
+        def get_webentity_most_linked_pages():
+            for weid, prefixes in sample:
+                traph.get_webentity_most_linked_pages(weid, prefixes)
+
+        record(
+            'get_webentities_links',
+            len(webentities),
+            measure_best(get_webentities_links, repeat, setup=reset_webentity_graph)
+        )
+        record('get_webentity_pagelinks', len(sample), measure_best(get_webentity_pagelinks, repeat))
+        record('get_webentity_most_linked_pages', len(sample), measure_best(get_webentity_most_linked_pages, repeat))
+        record('metrics', 1, measure_best(traph.metrics, repeat))
+
+        traph.close()
+
+        # Bulk loading the same pages, links & webentities with the builder
+        # NOTE: the builder always writes files, hence a single measure
+        if storage == 'file':
+            crawled = set(source for source, _ in crawl)
+
+            def build():
+                linked = set(crawled)
+                links = []
+
+                for source, targets in crawl:
+                    linked.update(targets)
+                    links.extend((source, target) for target in targets)
+
+                TraphBuilder(os.path.join(folder, 'build'), overwrite=True).build(
+                    sorted((lru, lru in crawled) for lru in linked),
+                    links,
+                    webentities
+                )
+
+            record('traph_builder', nb_links, measure_once(build))
+    finally:
+        shutil.rmtree(folder)
+
+    return results
+
+
+# Function running the whole suite
+def run_suite(sizes, storages, seed, repeat, log=None):
+    report = {
+        'version': SUITE_FORMAT_VERSION,
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': {}
+    }
+
+    for size in sizes:
+        pages, crawl = generate_corpus(SIZES[size], seed)
+
+        if log is not None:
+            log(
+                '\n:: %s pages, %s crawled, %s links' % (
+                    format(len(pages), ','),
+                    format(len(crawl), ','),
+                    format(sum(len(targets) for _, targets in crawl), ',')
+                )
+            )
+
+        report['results'][size] = {}
+
+        for storage in storages:
+            if log is not None:
+                log('\n%s' % storage)
+
+            def log_operation(operation, measure):
+                if log is not None:
+                    log('\t%-35s %10.3fs %12.2fus/op' % (operation, measure['seconds'], measure['us_per_op']))
+
+            report['results'][size][storage] = benchmark(storage, pages, crawl, repeat, log=log_operation)
+
+    return report
+
+
+def parse_list(string, choices):
+    values = [value.strip() for value in string.split(',') if value.strip()]
+
+    for value in values:
+        if value not in choices:
+            raise argparse.ArgumentTypeError(
+                'invalid value "%s" (choose from %s)' % (value, ', '.join(choices))
+            )
+
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Traph benchmark suite.')
+    parser.add_argument(
+        '--sizes',
+        type=lambda s: parse_list(s, sorted(SIZES, key=SIZES.get)),
+        default=['10k'],
+        help='comma separated corpus sizes among 10k, 100k & 1M (default: 10k)'
+    )
+    parser.add_argument(
+        '--storages',
+        type=lambda s: parse_list(s, STORAGES),
+        default=STORAGES,
+        help='comma separated storages among memory, file & cached (default: all)'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='corpora seed (default: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of the queries (default: 3)')
+    parser.add_argument('--output', help='path of the JSON results')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.25,
+        help='slowdown ratio considered as a regression (default: 1.25)'
+    )
+
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print message
+        sys.stdout.flush()
+
+    report = run_suite(args.sizes, args.storages, args.seed, args.repeat, log=log)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        comparison = compare(baseline, report, args.threshold)
+        print_comparison(comparison)
+
+        if any(row['regression'] for row in comparison):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -61,8 +61,10 @@ traph.add_links(LINKS)
 for source_lru, target_lru in traph.links_iter():
     print 'Source: %s, Target: %s' % (source_lru, target_lru)
 
-for node in links.nodes_iter():
-    print node
+for node, lru in trie.pages_iter():
+    if node.has_outlinks():
+        for chunk in links.chunks_iter(node.outlinks()):
+            print chunk
 
 print '\nDetailed DFS...'
 g = nx.Graph()
@@ -0,0 +1,52 @@
+# =============================================================================
+# Benchmark: sequential path stems
+# =============================================================================
+#
+# Measuring the cost of lookups when sibling stems were inserted in sorted
+# order (which degenerates the sibling BSTs into linked lists) and how
+# rebalancing the trie solves the issue.
+#
+# Usage: python -m scripts.benchmark_sequential_stems [nb_pages]
+#
+import sys
+import time
+from traph import Traph
+
+NB_PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+LRUS = ['s:http|h:com|h:hodor|p:%08i|' % i for i in xrange(NB_PAGES)]
+
+
+def lookups(traph):
+    start = time.time()
+
+    for lru in LRUS:
+        traph.lru_trie.lru_node(lru)
+
+    return time.time() - start
+
+
+traph = Traph(overwrite=True, folder='./scripts/data/', debug=True)
+
+print ':: Indexing %s pages with sequential path stems...' % format(NB_PAGES, ',')
+start = time.time()
+
+for lru in LRUS:
+    traph.lru_trie.add_page(lru)
+
+print '\t...done in %s ms' % format(1000 * (time.time() - start), ',.0f')
+
+duration = lookups(traph)
+print '\n:: Lookups (degenerated BST): %s ms' % format(1000 * duration, ',.0f')
+
+start = time.time()
+traph.rebalance()
+print '\n:: Rebalancing: %s ms' % format(1000 * (time.time() - start), ',.0f')
+
+balanced_duration = lookups(traph)
+print '\n:: Lookups (balanced BST): %s ms (x%.1f)' % (
+    format(1000 * balanced_duration, ',.0f'),
+    duration / balanced_duration
+)
+
+traph.close()
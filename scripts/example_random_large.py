@@ -6,6 +6,7 @@
 #
 from traph import Traph
 from scripts.utils.webentity_store import WebEntityStore
+from scripts.utils.random_lru import random_lru
 import random
 import time
 
@@ -37,20 +38,6 @@ traph = Traph(overwrite=True, folder='./scripts/data/',
               default_webentity_creation_rule=default_webentity_creation_rule,
               webentity_creation_rules=webentity_creation_rules)
 
-# LRU generation process
-def random_lru(voc, domain_sizes, path_sizes):
-    host_size = random.choice(domain_sizes)
-    path_size = random.choice(path_sizes)
-    protocol = 's:http|'
-    tld = 'h:com|'
-    host = ''
-    for h in range(host_size):
-        host += 'h:%s|' % (random.choice(voc))
-    path = ''
-    for p in range(path_size):
-        path += 'p:%s|' % (random.choice(voc))
-    return protocol + tld + host + path
-
 voc = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'hodor', 'consectetur']
 path_sizes = [1,2,3,4,5]
 domain_sizes = [1,2,3]
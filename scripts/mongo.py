@@ -4,7 +4,6 @@
 #
 # Attempting to load a corpus from MongoDB
 #
-from collections import defaultdict
 from traph import Traph
 from pymongo import MongoClient
 from config import CONFIG
@@ -33,37 +32,18 @@ traph = Traph(overwrite=True, folder='./scripts/data/',
 client = MongoClient(MONGO['host'], MONGO['port'])
 collection = client[MONGO['db']][MONGO['collection']]
 
-def links_generator(data):
-    source = data['lru']
+# NOTE: the crawl is streamed so that it does not need to fit in RAM
+def crawl_generator():
+    i = 0
 
-    for target in data['lrulinks']:
-        yield source, target
+    for page in collection.find({}, {'lru': 1, 'lrulinks': 1}, sort=[('_job', 1)]):
+        i += 1
 
-links_multimap = defaultdict(list)
+        if i % 100 == 0:
+            print '(%i) [%i] - %s' % (i, len(page['lrulinks']), page['lru'])
 
-i = 0
-links = []
-for page in collection.find({}, {'lru': 1, 'lrulinks': 1}, sort=[('_job', 1)]):
-    i += 1
+        yield page['lru'], page['lrulinks']
 
-    # links.extend(links_generator(page))
-
-    links_multimap[page['lru']].extend(page['lrulinks'])
-
-    # traph.add_links(links_generator(page))
-
-    if i % 100 == 0:
-        print '(%i) [%i] - %s' % (i, len(page['lrulinks']), page['lru'])
-
-    # for link in page['lrulinks']:
-    #     traph.add_page(link)
-
-print 'Gathered links'
-# traph.add_links(links)
-# print links_multimap
-# print links
-# print len(links)
-# print sum([len(i) for i in links_multimap.values()])
-traph.index_batch_crawl(links_multimap)
+traph.index_crawl_stream(crawl_generator())
 
 traph.close()
@@ -0,0 +1,23 @@
+# =============================================================================
+# Random LRU
+# =============================================================================
+#
+# Function generating random LRUs out of a vocabulary, used to build
+# synthetic corpora. A seeded random.Random instance may be given so that
+# the generated corpora are reproducible.
+#
+import random
+
+
+def random_lru(voc, domain_sizes, path_sizes, rng=random):
+    host_size = rng.choice(domain_sizes)
+    path_size = rng.choice(path_sizes)
+    protocol = 's:http|'
+    tld = 'h:com|'
+    host = ''
+    for h in range(host_size):
+        host += 'h:%s|' % (rng.choice(voc))
+    path = ''
+    for p in range(path_size):
+        path += 'p:%s|' % (rng.choice(voc))
+    return protocol + tld + host + path
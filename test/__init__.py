@@ -12,3 +12,13 @@ from test.suites.twitter_family_test import TestTwitterFamily
 from test.suites.creation_rules_test import TestCreationRules
 from test.suites.hugo_links_test import TestHugoLinks
 from test.suites.webentities_test import TestWebentities
+from test.suites.storage_test import TestCachedFileStorage, TestCachedTraph, TestJournal, TestReadOnlyTraph, TestSharedTraph
+from test.suites.builder_test import TestTraphBuilder, TestCompaction
+from test.suites.link_store_test import TestLinkStore
+from test.suites.webentity_index_test import TestWebentityIndex
+from test.suites.webentity_graph_test import TestWebentityGraph
+from test.suites.arrays_test import TestArrays
+from test.suites.async_traph_test import TestAsyncTraph
+from test.suites.iterator_state_test import TestTraphIteratorState, TestIteratorBudget
+from test.suites.instrumentation_test import TestInstrumentation
+from test.suites.runs_test import TestSortedRuns
@@ -0,0 +1,110 @@
+# =============================================================================
+# Columnar Export Unit Tests
+# =============================================================================
+#
+# Testing that the Traph is correctly exported as NumPy arrays.
+#
+import unittest
+from collections import Counter
+from test.test_cases import TraphTestCase
+from traph.arrays import struct_fields
+from traph.lru_trie.node import LRU_TRIE_NODE_BLOCK_SIZE, LRU_TRIE_FIRST_DATA_BLOCK
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def row(block):
+    return (block - LRU_TRIE_FIRST_DATA_BLOCK) // LRU_TRIE_NODE_BLOCK_SIZE
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed.')
+class TestArrays(TraphTestCase):
+
+    def test_export_arrays(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl(dict(
+                ('s:http|h:com|h:site%i|p:page%i|' % (i % 7, i), [
+                    's:http|h:com|h:site%i|p:page%i|' % (j % 7, j)
+                    for j in range(i, i + 3 + i % 11)
+                ])
+                for i in range(40)
+            ))
+
+            # Giving some page more links than a single chunk can hold
+            traph.add_links([
+                ('s:http|h:com|h:site0|p:page0|', 's:http|h:com|h:site1|p:page%i|' % i)
+                for i in range(40)
+            ])
+
+            arrays = traph.export_arrays()
+            pages = (arrays['flags'] & 1).astype(bool)
+
+            self.assertEqual(len(arrays['block']), traph.lru_trie_storage.count_blocks() - 1)
+            self.assertEqual(int(pages.sum()), traph.count_pages())
+            self.assertEqual(len(arrays['outlinks_indices']), traph.count_links())
+
+            for node, lru in traph.pages_iter():
+                i = row(node.block)
+
+                self.assertEqual(arrays['block'][i], node.block)
+                self.assertEqual(arrays['parent'][i], node.parent())
+                self.assertEqual(
+                    arrays['page_webentity'][i],
+                    traph.webentity_index.webentity(node.block) or 0
+                )
+
+                for direction in ('outlinks', 'inlinks'):
+                    indptr = arrays[direction + '_indptr']
+                    start, end = indptr[i], indptr[i + 1]
+
+                    expected = Counter()
+
+                    if node.links(out=direction == 'outlinks'):
+                        for target, weight in traph.link_store.links_iter(node.links(out=direction == 'outlinks')):
+                            expected[row(target)] += weight
+
+                    actual = Counter()
+
+                    for target, weight in zip(arrays[direction + '_indices'][start:end], arrays[direction + '_weights'][start:end]):
+                        actual[target] += weight
+
+                    self.assertEqual(actual, expected)
+
+            # Aggregating webentity links
+            sources = np.repeat(arrays['page_webentity'], np.diff(arrays['outlinks_indptr']))
+            targets = arrays['page_webentity'][arrays['outlinks_indices']]
+
+            network = Counter()
+
+            for source, target, weight in zip(sources, targets, arrays['outlinks_weights']):
+                if source and target and source != target:
+                    network[source, target] += weight
+
+            expected = Counter()
+
+            for source, targets in traph.get_webentities_links().items():
+                for target, weight in targets.items():
+                    expected[source, target] = weight
+
+            self.assertEqual(network, expected)
+
+    def test_empty_traph(self):
+        with self.open_traph() as traph:
+            arrays = traph.export_arrays()
+
+            self.assertEqual(int((arrays['flags'] & 1).sum()), 0)
+            self.assertEqual(len(arrays['outlinks_indptr']), len(arrays['flags']) + 1)
+            self.assertEqual(int(arrays['outlinks_indptr'][-1]), 0)
+
+    def test_struct_fields(self):
+
+        # The columns' offsets should follow the formats' native alignment
+        self.assertEqual(struct_fields('75pBI6Q')[:4], [(None, 0), ('u1', 75), ('u4', 76), ('u8', 80)])
+        self.assertEqual(struct_fields('75pBI6Q')[-1], ('u8', 120))
+        self.assertEqual(
+            struct_fields('B3xIH2sQ'),
+            [('u1', 0), ('u4', 4), ('u2', 8), (None, 10), ('u8', 16)]
+        )
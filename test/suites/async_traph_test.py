@@ -0,0 +1,100 @@
+# =============================================================================
+# Async Traph Unit Tests
+# =============================================================================
+#
+# Testing the Twisted facade of the Traph.
+#
+from unittest import skipIf
+from traph import AsyncTraph, TraphException
+from test.test_cases import TraphTestCase
+
+try:
+    from twisted.internet.task import Cooperator
+except ImportError:
+    Cooperator = None
+
+
+def pump(steps):
+    while steps:
+        steps.pop(0)()
+
+
+@skipIf(Cooperator is None, 'Twisted is not installed.')
+class TestAsyncTraph(TraphTestCase):
+
+    def test_cooperate(self):
+        steps = []
+
+        # NOTE: the cooperator stops after each step & is pumped by hand
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=steps.append
+        )
+
+        with self.open_traph() as traph:
+            async_traph = AsyncTraph(traph, cooperator=cooperator)
+            results = []
+
+            async_traph.index_batch_crawl(dict(
+                ('s:http|h:com|h:site%i|p:page%i|' % (i % 7, i), [
+                    's:http|h:com|h:site%i|p:page%i|' % (j % 7, j)
+                    for j in range(i, i + 5)
+                ])
+                for i in range(500)
+            )).addCallback(results.append)
+
+            # The batch is run by slices
+            self.assertEqual(results, [])
+            self.assertTrue(len(steps) > 0)
+
+            pump(steps)
+            self.assertEqual(len(results), 1)
+
+            async_traph.get_webentities_links().addCallback(results.append)
+            pump(steps)
+            self.assertEqual(results[1], traph.get_webentities_links_slow())
+
+            # Other methods are simply wrapped in a Deferred
+            async_traph.count_pages().addCallback(results.append)
+            self.assertEqual(results[2], traph.count_pages())
+
+            errors = []
+            async_traph.get_webentity_by_prefix('s:http|h:com|h:unknown|').addErrback(errors.append)
+            self.assertTrue(errors[0].check(TraphException))
+
+    def test_budget(self):
+        steps = []
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=steps.append
+        )
+
+        data = {
+            's:http|h:com|h:site|': ['s:http|h:com|h:site|p:%i|' % i for i in range(10)]
+        }
+
+        def count_slices(method, *args, **kwargs):
+            results = []
+            method(*args, **kwargs).addCallback(results.append)
+
+            # NOTE: the cooperator needs a last step to find the iterator done
+            slices = -1
+
+            while steps:
+                steps.pop(0)()
+                slices += 1
+
+            self.assertEqual(len(results), 1)
+
+            return slices
+
+        with self.open_traph() as traph:
+            async_traph = AsyncTraph(traph, budget=0, cooperator=cooperator)
+
+            # The iterators should be given the budget, the Traph being left
+            # untouched for its other users
+            self.assertEqual(count_slices(async_traph.index_batch_crawl, data), 10 + 10 + 1)
+            self.assertIsNone(traph.iterator_budget)
+
+            # Unless the call gives its own
+            self.assertEqual(count_slices(async_traph.index_batch_crawl, data, budget=10), 1)
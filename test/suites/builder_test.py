@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# Traph Builder Unit Tests
+# =============================================================================
+#
+# Testing the bulk loading of a traph.
+#
+from os import path
+from traph import TraphBuilder, TraphException
+from test.test_cases import TraphTestCase
+
+CRAWL = {
+    's:http|h:com|h:world|p:europe|p:spain|': [
+        's:http|h:com|h:world|p:europe|p:spain|p:madrid|',
+        's:http|h:com|h:world|p:america|',
+        's:http|h:com|h:world|p:america|'
+    ],
+    's:http|h:com|h:world|p:america|': [
+        's:http|h:com|h:world|p:asia|',
+        's:https|h:com|h:world|p:africa|',
+        's:http|h:fr|h:sciences-po|p:thisisaveryveryveryverylooooooooooooooooongstem|p:thisalsoisquitethelongstemisntitnotsomuchtobehonest|'
+    ],
+    's:http|h:fr|h:sciences-po|h:medialab|': [
+        's:http|h:com|h:world|p:america|'
+    ]
+}
+
+WEBENTITY_CREATION_RULES = {
+    's:http|h:com|h:world|': '(s:[a-zA-Z]+\\|(t:[0-9]+\\|)?(h:[^\\|]+\\|(h:[^\\|]+\\|)+|h:(localhost|(\\d{1,3}\\.){3}\\d{1,3}|\\[[\\da-f]*:[\\da-f:]*\\])\\|)(p:[^\\|]+\\|){1})'
+}
+
+
+def traph_snapshot(traph):
+    pages = set()
+    links = set()
+
+    for node, lru in traph.pages_iter():
+        pages.add((lru, node.is_crawled()))
+
+        for source, target, weight in traph.get_page_links(lru, include_inbound=False):
+            links.add((source, target, weight))
+
+    webentities = set(
+        (lru, node.webentity())
+        for node, lru in traph.webentity_prefix_iter()
+    )
+
+    return pages, links, webentities
+
+
+class TestTraphBuilder(TraphTestCase):
+
+    def test_build(self):
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            report = traph.index_batch_crawl(CRAWL)
+            expected = traph_snapshot(traph)
+            expected_network = traph.get_webentities_links()
+            expected_inlinks_network = traph.get_webentities_links(out=False)
+
+        links = [
+            (source, target)
+            for source, targets in CRAWL.items()
+            for target in targets
+        ]
+
+        lrus = set(CRAWL) | set(target for _, target in links)
+        pages = [(lru, lru in CRAWL) for lru in sorted(lrus)]
+
+        folder = path.join(self.folder, 'built')
+
+        builder = TraphBuilder(folder)
+        build_report = builder.build(
+            pages,
+            links,
+            webentities=report.created_webentities,
+            webentity_creation_rules=WEBENTITY_CREATION_RULES.keys()
+        )
+
+        self.assertEqual(build_report.nb_created_pages, len(pages))
+
+        # The files already exist
+        with self.assertRaises(TraphException):
+            TraphBuilder(folder).build(pages)
+
+        with self.open_traph(folder=folder, webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            self.assertEqual(traph_snapshot(traph), expected)
+            self.assertEqual(traph.get_webentities_links(), expected_network)
+            self.assertEqual(traph.get_webentities_links(out=False), expected_inlinks_network)
+            self.assertEqual(traph.count_links(), 6)
+
+            for lru, _ in pages:
+                self.assertTrue(traph.lru_trie.lru_node(lru).is_page())
+
+            # The built traph should remain writable
+            traph.index_batch_crawl({
+                's:http|h:com|h:world|p:asia|': [
+                    's:http|h:com|h:world|p:europe|p:spain|',
+                    's:http|h:com|h:world|p:oceania|'
+                ]
+            })
+
+            self.assertEqual(traph.count_pages(), len(pages) + 1)
+            self.assertEqual(traph.get_page_indegree('s:http|h:com|h:world|p:europe|p:spain|'), 1)
+
+    def test_balanced_siblings(self):
+        folder = path.join(self.folder, 'built')
+        pages = [('s:http|h:com|h:world|p:%03i|' % i, False) for i in range(127)]
+
+        TraphBuilder(folder).build(pages)
+
+        with self.open_traph(folder=folder) as traph:
+            trie = traph.lru_trie
+
+            # Walking down the leftmost branch of the sibling BST
+            depth = 1
+            node = trie.lru_node('s:http|h:com|h:world|')
+            node.read_child()
+
+            while node.has_left():
+                node.read_left()
+                depth += 1
+
+            self.assertEqual(depth, 7)
+            self.assertEqual(node.stem(), 'p:000|')
+            self.assertEqual(traph.count_pages(), 127)
+
+    def test_unsorted_pages(self):
+        folder = path.join(self.folder, 'built')
+
+        with self.assertRaises(TraphException):
+            TraphBuilder(folder).build([
+                ('s:http|h:com|h:world|p:b|', False),
+                ('s:http|h:com|h:world|p:a|', False)
+            ])
+
+
+class TestCompaction(TraphTestCase):
+
+    def test_compact(self):
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            traph.index_batch_crawl(CRAWL)
+            traph.index_batch_crawl(CRAWL)
+
+            # Leaving a dead node behind
+            report = traph.create_webentity(['s:http|h:org|h:dead|'])
+            weid = report.created_webentities.keys()[0]
+            traph.delete_webentity(weid, ['s:http|h:org|h:dead|'])
+            last_webentity_id = traph.lru_trie.header.last_webentity_id()
+            epoch = traph.lru_trie.header.epoch()
+
+            expected = traph_snapshot(traph)
+            expected_network = traph.get_webentities_links()
+            expected_nb_links = traph.count_links()
+
+            sizes = traph.compact()
+
+            self.assertLess(sizes['lru_trie']['after'], sizes['lru_trie']['before'])
+            self.assertLessEqual(sizes['link_store']['after'], sizes['link_store']['before'])
+            self.assertFalse(path.isdir(path.join(self.folder, 'compaction')))
+
+            self.assertEqual(traph_snapshot(traph), expected)
+            self.assertEqual(traph.get_webentities_links(), expected_network)
+            self.assertEqual(traph.count_links(), expected_nb_links)
+            self.assertIsNone(traph.lru_trie.lru_node('s:http|h:org|h:dead|'))
+            self.assertEqual(traph.lru_trie.header.last_webentity_id(), last_webentity_id)
+            self.assertEqual(traph.lru_trie.header.epoch(), epoch + 1)
+
+            # Weights should be kept & the traph should remain writable
+            self.assertIn(
+                ('s:http|h:com|h:world|p:europe|p:spain|', 's:http|h:com|h:world|p:america|', 4),
+                expected[1]
+            )
+
+            report = traph.add_page('s:http|h:org|h:alive|p:page|')
+
+            self.assertGreater(min(report.created_webentities), last_webentity_id)
+
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            self.assertEqual(traph.count_pages(), len(expected[0]) + 1)
+            self.assertEqual(traph.get_webentities_links(), expected_network)
+
+    def test_compact_in_memory(self):
+        traph = self.get_traph(folder=None, webentity_creation_rules=WEBENTITY_CREATION_RULES)
+        traph.index_batch_crawl(CRAWL)
+
+        expected = traph_snapshot(traph)
+        expected_network = traph.get_webentities_links()
+
+        traph.compact()
+
+        self.assertEqual(traph_snapshot(traph), expected)
+        self.assertEqual(traph.get_webentities_links(), expected_network)
+
+    def test_interrupted_compaction(self):
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            traph.index_batch_crawl(CRAWL)
+            expected = traph_snapshot(traph)
+
+        # An incomplete compaction should be discarded
+        compaction_folder = path.join(self.folder, 'compaction')
+        TraphBuilder(compaction_folder).build([('s:http|h:com|h:other|', False)])
+
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            self.assertEqual(traph_snapshot(traph), expected)
+
+        self.assertFalse(path.isdir(compaction_folder))
+
+        # While a complete one should be swapped in
+        TraphBuilder(compaction_folder).build([('s:http|h:com|h:other|', False)])
+        open(path.join(compaction_folder, 'ready'), 'w').close()
+
+        with self.open_traph(webentity_creation_rules=WEBENTITY_CREATION_RULES) as traph:
+            self.assertEqual(traph_snapshot(traph)[0], set([('s:http|h:com|h:other|', False)]))
+            self.assertEqual(traph.count_links(), 0)
+
+        self.assertFalse(path.isdir(compaction_folder))
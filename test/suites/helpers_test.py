@@ -38,3 +38,5 @@ class TestHelpers(TestCase):
             list(chunks_iter(7, 's:http|h:fr|h:sciences-po|h:medialab|')),
             ['s:http|', 'h:fr|h:', 'science', 's-po|h:', 'mediala', 'b|']
         )
+
+        self.assertEqual(list(chunks_iter(7, 's:http|')), ['s:http|'])
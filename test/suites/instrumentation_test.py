@@ -0,0 +1,92 @@
+# =============================================================================
+# Instrumentation Unit Tests
+# =============================================================================
+#
+# Testing the opt-in instrumentation of the Traph's hot paths.
+#
+from test.test_cases import TraphTestCase
+
+PAGES = [
+    's:http|h:com|h:site|p:%s|' % stem
+    for stem in ['one', 'two', 'three', 'four', 'five']
+]
+
+LINKS = [
+    (PAGES[0], PAGES[1]),
+    (PAGES[0], PAGES[2]),
+    (PAGES[3], PAGES[0]),
+    (PAGES[4], 's:http|h:com|h:other|p:page|')
+]
+
+
+class TestInstrumentation(TraphTestCase):
+
+    def test_disabled(self):
+        with self.open_traph() as traph:
+            traph.add_links(LINKS)
+
+            self.assertEqual(traph.stats(), {})
+
+            # No probe should be installed
+            self.assertNotIn('node_class', vars(traph.lru_trie))
+            self.assertNotIn('chunk_class', vars(traph.link_store))
+            self.assertNotIn('read', vars(traph.lru_trie_storage))
+
+    def test_stats(self):
+        with self.open_traph(instrument=True) as traph:
+            traph.add_links(LINKS)
+
+            stats = traph.stats()
+
+            for name in ['storage.lru_trie.write', 'storage.link_store.write', 'lru_trie.node.write', 'lru_trie.sibling_hop', 'link_store.chunk.write']:
+                self.assertIn(name, stats)
+                self.assertGreater(stats[name]['count'], 0)
+
+            traph.reset_stats()
+            self.assertEqual(traph.stats(), {})
+
+            prefix = traph.retrieve_prefix(PAGES[0])
+            weid = traph.get_webentity_by_prefix(prefix)
+            traph.reset_stats()
+
+            traph.get_webentity_pagelinks(weid, [prefix], include_outbound=True)
+
+            stats = traph.stats()
+
+            self.assertIn('lru_trie.windup_lru', stats)
+            self.assertIn('link_store.chunk_hop', stats)
+            self.assertNotIn('lru_trie.node.write', stats)
+
+            # The probes should survive a clear
+            traph.clear()
+            traph.reset_stats()
+            traph.add_page(PAGES[0])
+
+            self.assertIn('lru_trie.node.write', traph.stats())
+
+            traph.disable_instrumentation()
+            self.assertEqual(traph.stats(), {})
+            self.assertNotIn('node_class', vars(traph.lru_trie))
+
+    def test_trace(self):
+        with self.open_traph() as traph:
+            traph.add_links(LINKS)
+
+            expected = traph.get_page_links(PAGES[0])
+            links, stats = traph.trace(traph.get_page_links, PAGES[0])
+
+            self.assertEqual(links, expected)
+            self.assertEqual(stats['link_store.chunk_hop']['count'], 2)
+            self.assertGreater(stats['lru_trie.sibling_hop']['count'], 0)
+
+            # The instrumentation should be disabled again
+            self.assertEqual(traph.stats(), {})
+            self.assertNotIn('node_class', vars(traph.lru_trie))
+
+        with self.open_traph(instrument=True) as traph:
+            traph.add_page(PAGES[0])
+
+            _, stats = traph.trace(traph.add_page, PAGES[1])
+
+            self.assertIn('lru_trie.node.write', stats)
+            self.assertGreater(traph.stats()['lru_trie.node.write']['count'], stats['lru_trie.node.write']['count'])
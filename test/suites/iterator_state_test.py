@@ -0,0 +1,120 @@
+# =============================================================================
+# Traph Iterator State Unit Tests
+# =============================================================================
+#
+# Testing when the Traph's cooperative iterators yield.
+#
+from unittest import TestCase
+from traph import traph_iterator_state
+from traph.traph_iterator_state import TraphIteratorState
+from test.test_cases import TraphTestCase
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTraphIteratorState(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        traph_iterator_state.clock = self.clock
+
+    def tearDown(self):
+        traph_iterator_state.clock = traph_iterator_state.time.time
+
+    def test_frequency(self):
+        state = TraphIteratorState()
+
+        yields = [state.should_yield(3) for _ in range(7)]
+        self.assertEqual(yields, [False, False, True, False, False, True, False])
+
+        state.finalize(None)
+        self.assertEqual(state.stats()['iterations'], 7)
+        self.assertEqual(state.stats()['slices'], 3)
+
+    def test_budget(self):
+        state = TraphIteratorState(budget=0.02)
+
+        self.assertFalse(state.should_yield())
+        self.clock.now = 0.03
+        self.assertTrue(state.should_yield())
+
+        # The next slice starts when the iterator is resumed, even if its
+        # first iteration takes the whole budget
+        self.clock.now = 1.0
+        state.resume()
+        self.clock.now = 1.025
+        self.assertTrue(state.should_yield())
+
+        # A clock going backwards ends the slice
+        self.clock.now = 1.03
+        state.resume()
+        self.clock.now = 0.5
+        self.assertTrue(state.should_yield())
+
+        self.clock.now = 1.9
+        state.resume()
+        self.clock.now = 2.0
+        state.finalize(None)
+
+        stats = state.stats()
+        self.assertEqual(stats['iterations'], 4)
+        self.assertEqual(stats['slices'], 4)
+        self.assertAlmostEqual(stats['max_slice_time'], 0.1)
+        self.assertAlmostEqual(stats['busy_time'], 0.03 + 0.025 + 0.1)
+        self.assertAlmostEqual(stats['wall_time'], 2.0)
+
+    def test_callbacks(self):
+        calls = []
+        state = TraphIteratorState(
+            on_yield=lambda: calls.append('yield'),
+            on_resume=lambda: calls.append('resume')
+        )
+
+        for _ in range(4):
+            if state.should_yield(2):
+                state.resume()
+
+        state.finalize(None)
+        self.assertEqual(calls, ['yield', 'resume', 'yield', 'resume'])
+
+
+class TestIteratorBudget(TraphTestCase):
+
+    def test_iterator_budget(self):
+        data = {
+            's:http|h:com|h:site|': ['s:http|h:com|h:site|p:%i|' % i for i in range(50)]
+        }
+
+        with self.open_traph(iterator_budget=0) as traph:
+            states = list(traph.index_batch_crawl_iter(data))
+
+            # NOTE: a null budget yields after each iteration, that is to
+            # say after each new target page & each target's inlinks
+            self.assertEqual(len(states), 50 + 50 + 1)
+            self.assertEqual(states[-1].stats()['iterations'], 100)
+
+            # NOTE: the work done after the last yield makes a final slice
+            self.assertEqual(states[-1].stats()['slices'], 101)
+            self.assertEqual(traph.count_pages(), 51)
+
+    def test_call_budget(self):
+        data = {
+            's:http|h:com|h:site|': ['s:http|h:com|h:site|p:%i|' % i for i in range(50)]
+        }
+
+        # A budget given to a single call overrides the Traph's one
+        with self.open_traph() as traph:
+            states = list(traph.index_batch_crawl_iter(data, budget=0))
+            self.assertEqual(len(states), 50 + 50 + 1)
+
+            states = list(traph.get_webentities_links_iter(budget=0))
+            self.assertTrue(len(states) > 1)
+
+            states = list(traph.get_webentities_links_iter())
+            self.assertEqual(len(states), 1)
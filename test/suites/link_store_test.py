@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# Link Store Unit Tests
+# =============================================================================
+#
+# Testing the chunked adjacency format of the link store.
+#
+import struct
+from collections import Counter
+from traph import TraphException
+from traph.link_store import LinkStore
+from traph.link_store import link_store as link_store_module
+from traph.link_store.chunk import LINK_STORE_BLOCK_FORMAT
+from test.test_cases import TraphTestCase
+
+SOURCE = 's:http|h:com|h:world|'
+
+
+def page(i):
+    return 's:http|h:com|h:world|p:%03i|' % i
+
+
+class TestLinkStore(TraphTestCase):
+
+    def test_chunks(self):
+        with self.open_traph(cache_size=8) as traph:
+            store = traph.link_store
+
+            # Adding links in several batches should grow chunks geometrically
+            traph.add_links([(SOURCE, page(i)) for i in range(3)])
+            traph.add_links([(SOURCE, page(i)) for i in range(2, 30)])
+
+            node = traph.lru_trie.lru_node(SOURCE)
+            chunks = list(store.chunks_iter(node.outlinks()))
+
+            self.assertEqual([chunk.capacity() for chunk in chunks], [4, 8, 16, 32])
+            self.assertEqual([chunk.size() for chunk in chunks], [4, 8, 16, 2])
+            self.assertEqual(store.degree(node.outlinks()), 30)
+            self.assertEqual(store.degree(0), 0)
+
+            self.assertEqual(traph.count_links(), 30)
+            self.assertEqual(traph.get_page_outdegree(SOURCE), 30)
+            self.assertEqual(traph.get_page_outdegree(SOURCE, weighted=True), 31)
+            self.assertEqual(traph.get_page_indegree(page(2)), 1)
+            self.assertEqual(traph.get_page_indegree(page(2), weighted=True), 2)
+
+        with self.open_traph() as traph:
+            self.assertEqual(traph.count_links(), 30)
+            self.assertEqual(
+                sorted(target for _, target in traph.links_iter()),
+                [page(i) for i in range(30)]
+            )
+
+    def test_chain_index(self):
+        with self.open_traph(cache_size=8) as traph:
+            store = traph.link_store
+            expected = Counter()
+
+            # The chain gets indexed once large enough & is then appended to
+            for start, end in [(0, 70), (60, 80), (75, 200), (0, 10), (190, 260)]:
+                links = [(SOURCE, page(i)) for i in range(start, end)] + [(SOURCE, page(start))]
+                traph.add_links(links)
+                expected.update(target for _, target in links)
+
+            node = traph.lru_trie.lru_node(SOURCE)
+            self.assertIn(node.outlinks(), store.indices)
+
+            # A store reading the chain from scratch should agree
+            fresh_store = LinkStore(traph.links_store_storage)
+            windup_lru = traph.lru_trie.windup_lru
+
+            actual = Counter()
+
+            for target_block, weight in fresh_store.links_iter(node.outlinks()):
+                actual[windup_lru(target_block)] += weight
+
+            self.assertEqual(actual, expected)
+            self.assertEqual(fresh_store.degree(node.outlinks()), 260)
+            self.assertEqual(traph.count_links(), 260)
+            self.assertEqual(traph.get_page_indegree(page(0), weighted=True), expected[page(0)])
+
+    def test_chain_index_size(self):
+        size = link_store_module.LINK_STORE_INDEX_SIZE
+        link_store_module.LINK_STORE_INDEX_SIZE = 100
+
+        try:
+            with self.open_traph() as traph:
+                store = traph.link_store
+
+                traph.add_links([(SOURCE, page(i)) for i in range(70)])
+                traph.add_links([(SOURCE, page(0))])
+
+                node = traph.lru_trie.lru_node(SOURCE)
+                self.assertIn(node.outlinks(), store.indices)
+                self.assertEqual(store.nb_indexed_links, 70)
+
+                # Appending to an indexed chain should not grow the indices
+                # beyond their maximum size either
+                traph.add_links([(SOURCE, page(i)) for i in range(70, 140)])
+
+                self.assertLessEqual(store.nb_indexed_links, 100)
+                self.assertNotIn(node.outlinks(), store.indices)
+
+                self.assertEqual(traph.count_links(), 140)
+                self.assertEqual(traph.get_page_outdegree(SOURCE), 140)
+        finally:
+            link_store_module.LINK_STORE_INDEX_SIZE = size
+
+    def test_outdated_format(self):
+        with self.open_traph() as traph:
+            traph.add_links([(SOURCE, page(0))])
+
+        # Rewriting the header as the one of the former format
+        with open(self.folder + '/link_store.dat', 'rb+') as f:
+            f.write(struct.pack(LINK_STORE_BLOCK_FORMAT, 0, 0, 0))
+
+        with self.assertRaises(TraphException):
+            self.get_traph()
@@ -133,7 +133,7 @@ class TestNetwork(TraphTestCase):
                 set([
                     ('s:http|h:com|h:world|p:africa|p:raba|', 3),
                     ('s:http|h:com|h:world|p:africa|p:tunis|', 2),
-                    ('s:http|h:com|h:world|p:africa|', 1),
+                    ('s:http|h:com|h:world|p:africa|', 0),
                     ('s:http|h:com|h:world|p:africa|p:bamako|', 1)
                 ])
             )
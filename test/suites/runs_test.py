@@ -0,0 +1,50 @@
+# =============================================================================
+# Sorted Runs Unit Tests
+# =============================================================================
+#
+# Testing the external sort of the streaming crawl indexation.
+#
+import random
+from unittest import TestCase
+from traph import runs as runs_module
+from traph.runs import SortedRuns
+
+
+class TestSortedRuns(TestCase):
+
+    def test_fan_in(self):
+        rng = random.Random(0)
+        pairs = [(rng.randint(0, 100), rng.randint(0, 100)) for _ in range(500)]
+
+        # Counting the runs open at once
+        temporary_file = runs_module.tempfile.TemporaryFile
+        open_runs = []
+        max_open_runs = [0]
+
+        def tracked_temporary_file(*args, **kwargs):
+            run = temporary_file(*args, **kwargs)
+            open_runs.append(run)
+            max_open_runs[0] = max(max_open_runs[0], sum(1 for f in open_runs if not f.closed))
+            return run
+
+        runs_module.tempfile.TemporaryFile = tracked_temporary_file
+
+        try:
+            runs = SortedRuns(fan_in=3)
+
+            # NOTE: 50 runs, far more than the fan-in, kept as at most 2
+            # runs of each of 4 levels (1, 3, 9 & 27 spilled runs)
+            for i in xrange(0, len(pairs), 10):
+                runs.spill(pairs[i:i + 10])
+                self.assertLessEqual(len(runs), 2 * 4)
+
+            self.assertEqual(list(runs.merge()), sorted(pairs))
+            self.assertLessEqual(len(runs), 3)
+
+            runs.close()
+        finally:
+            runs_module.tempfile.TemporaryFile = temporary_file
+
+        # NOTE: a merge writes a new run while the merged ones are open
+        self.assertLessEqual(max_open_runs[0], 2 * 4 + 1)
+        self.assertTrue(all(run.closed for run in open_runs))
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# Storage Unit Tests
+# =============================================================================
+#
+# Testing the storage classes.
+#
+from os import path
+import os
+import shutil
+import struct
+from unittest import TestCase
+from traph.storage import CachedFileStorage, MemMapStorage
+from traph import traph as traph_module
+from traph.storage.journal import JOURNAL_RECORD_FORMAT
+from traph.traph import TraphException
+from test.test_cases import TraphTestCase, FOLDER
+
+BLOCK_SIZE = 4
+
+
+class TestCachedFileStorage(TestCase):
+
+    def setUp(self):
+        if not path.isdir(FOLDER):
+            os.makedirs(FOLDER)
+
+        self.file = open(path.join(FOLDER, 'storage.dat'), 'wb+')
+
+    def tearDown(self):
+        self.file.close()
+        shutil.rmtree(FOLDER, ignore_errors=True)
+
+    def file_contents(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def test_write_back(self):
+        storage = CachedFileStorage(BLOCK_SIZE, self.file, cache_size=4)
+
+        self.assertEqual(storage.write('aaaa'), 0)
+        self.assertEqual(storage.write('bbbb'), 4)
+
+        # Nothing should have been written yet
+        self.assertEqual(self.file_contents(), '')
+        self.assertEqual(len(storage), 8)
+        self.assertEqual(storage.count_blocks(), 2)
+        self.assertEqual(storage.read(4), 'bbbb')
+        self.assertEqual(storage.read(8), None)
+
+        # Evicting the old generation should write its dirty blocks but hot
+        # blocks should stay in the cache
+        storage.write('cccc')
+        self.assertEqual(self.file_contents(), 'aaaa')
+
+        storage.write('dddd')
+        storage.write('eeee')
+        self.assertEqual(self.file_contents(), 'aaaabbbbcccc')
+
+        storage.write('ffff', 0)
+        storage.flush()
+        self.assertEqual(self.file_contents(), 'ffffbbbbccccddddeeee')
+        self.assertEqual(storage.read(0), 'ffff')
+
+    def test_sequential_read(self):
+        storage = CachedFileStorage(BLOCK_SIZE, self.file, cache_size=2)
+
+        for data in ['aaaa', 'bbbb', 'cccc']:
+            storage.write(data)
+
+        self.assertEqual(storage.read(0), 'aaaa')
+        self.assertEqual(storage.read(), 'bbbb')
+        self.assertEqual(storage.read(), 'cccc')
+        self.assertEqual(storage.read(), None)
+
+    def test_read_blocks(self):
+        storage = CachedFileStorage(BLOCK_SIZE, self.file, cache_size=2)
+
+        self.assertEqual(storage.write('aaaabbbbcccc'), 0)
+        storage.flush()
+
+        # Dirty blocks should take precedence over the file
+        storage.write('BBBB', 4)
+        self.assertEqual(self.file_contents(), 'aaaabbbbcccc')
+        self.assertEqual(storage.read_blocks(0, 3), 'aaaaBBBBcccc')
+        self.assertEqual(storage.read_blocks(8, 4), 'cccc')
+        self.assertEqual(storage.read_blocks(12, 1), None)
+
+
+class TestCachedTraph(TraphTestCase):
+
+    def test_cached_traph(self):
+        with self.open_traph(cache_size=3) as traph:
+            traph.index_batch_crawl({
+                's:http|h:fr|h:sciences-po|h:medialab|': [
+                    's:https|h:com|h:twitter|p:paulanomalie|',
+                    's:http|h:fr|h:sciences-po|p:thisisaveryveryveryverylooooooooooooooooongstem|p:thisalsoisquitethelongstemisntitnotsomuchtobehonest|'
+                ]
+            })
+
+            self.assertEqual(traph.count_pages(), 3)
+            self.assertEqual(traph.count_links(), 2)
+
+        with self.open_traph() as traph:
+            self.assertEqual(set(lru for _, lru in traph.pages_iter()), set([
+                's:http|h:fr|h:sciences-po|h:medialab|',
+                's:https|h:com|h:twitter|p:paulanomalie|',
+                's:http|h:fr|h:sciences-po|p:thisisaveryveryveryverylooooooooooooooooongstem|p:thisalsoisquitethelongstemisntitnotsomuchtobehonest|'
+            ]))
+
+            self.assertEqual(traph.count_links(), 2)
+            self.assertEqual(traph.get_page_outdegree('s:http|h:fr|h:sciences-po|h:medialab|'), 2)
+
+
+class TestReadOnlyTraph(TraphTestCase):
+
+    def test_mmap(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl({
+                's:http|h:fr|h:sciences-po|h:medialab|': [
+                    's:https|h:com|h:twitter|p:paulanomalie|',
+                    's:http|h:fr|h:sciences-po|p:thisisaveryveryveryverylooooooooooooooooongstem|p:thisalsoisquitethelongstemisntitnotsomuchtobehonest|'
+                ]
+            })
+
+            pages = set(lru for _, lru in traph.pages_iter())
+            network = traph.get_webentities_links()
+
+        with self.open_traph(mode='r', mmap=True) as traph:
+            self.assertIsInstance(traph.lru_trie_storage, MemMapStorage)
+            self.assertEqual(set(lru for _, lru in traph.pages_iter()), pages)
+            self.assertEqual(traph.count_pages(), 3)
+            self.assertEqual(traph.count_links(), 2)
+            self.assertEqual(traph.get_page_outdegree('s:http|h:fr|h:sciences-po|h:medialab|'), 2)
+            self.assertEqual(traph.get_webentities_links(), network)
+
+            traph.webentity_graph = None
+            self.assertEqual(traph.get_webentities_links(processes=2), network)
+
+            with self.assertRaises(TraphException):
+                traph.add_page('s:http|h:com|h:world|')
+
+            with self.assertRaises(TraphException):
+                traph.index_batch_crawl({'s:http|h:com|h:world|': []})
+
+        # The index is rebuilt in memory if missing
+        os.remove(path.join(FOLDER, 'webentity_index.dat'))
+
+        with self.open_traph(mode='r', mmap=True) as traph:
+            self.assertEqual(traph.get_webentities_links(), network)
+
+            # The processes cannot read an index which is only in memory
+            traph.webentity_graph = None
+            self.assertEqual(traph.get_webentities_links(processes=2), network)
+
+        self.assertFalse(path.isfile(path.join(FOLDER, 'webentity_index.dat')))
+
+    def test_invalid_options(self):
+        with self.assertRaises(TraphException):
+            self.get_traph(mode='r')
+
+        with self.open_traph():
+            pass
+
+        with self.assertRaises(TraphException):
+            self.get_traph(mmap=True)
+
+        with self.assertRaises(TraphException):
+            self.get_traph(mode='r', journal=True)
+
+        with self.assertRaises(TraphException):
+            self.get_traph(shared=True, journal=True)
+
+
+class TestSharedTraph(TraphTestCase):
+
+    def assertSnapshots(self, **reader_options):
+        writer = self.get_traph(shared=True)
+        writer.add_links([(PAGES[0], PAGES[1])])
+
+        generation = writer.lru_trie.header.generation()
+        self.assertTrue(generation > 0)
+        self.assertEqual(generation % 2, 0)
+
+        reader = self.get_traph(mode='r', **reader_options)
+        self.assertEqual(reader.snapshot(reader.count_pages), 2)
+
+        # Published batches are seen by the reader, even when the files grow
+        writer.add_page('s:http|h:com|h:world|')
+        self.assertEqual(reader.snapshot(reader.count_pages), 3)
+        self.assertEqual(reader.refresh(), writer.lru_trie.header.generation())
+
+        # Long batches are published each time their iterator yields
+        iterator = writer.index_batch_crawl_iter({
+            PAGES[0]: ['s:http|h:com|h:world|p:%i|' % i for i in range(300)]
+        })
+        next(iterator)
+
+        self.assertEqual(reader.snapshot(reader.count_pages), 3 + 200)
+
+        for _ in iterator:
+            pass
+
+        self.assertEqual(reader.snapshot(reader.count_pages), 3 + 300)
+        self.assertEqual(reader.snapshot(reader.get_page_outdegree, PAGES[0]), 301)
+
+        # Queries racing with a batch are run again
+        calls = []
+
+        def count_pages():
+            calls.append(True)
+
+            if len(calls) == 1:
+                writer.add_page('s:http|h:com|h:world|p:europe|')
+
+            return reader.count_pages()
+
+        self.assertEqual(reader.snapshot(count_pages), 3 + 300 + 1)
+        self.assertEqual(len(calls), 2)
+
+        reader.close()
+        writer.close()
+
+    def test_clear(self):
+        writer = self.get_traph(shared=True)
+        writer.add_links([(PAGES[0], PAGES[1])])
+
+        reader = self.get_traph(mode='r')
+        self.assertEqual(
+            reader.snapshot(lambda: list(reader.links_iter())),
+            [(PAGES[0], PAGES[1])]
+        )
+
+        # The trie's blocks now hold other pages, the memoized LRUs being stale
+        epoch = writer.lru_trie.header.epoch()
+        writer.clear()
+        self.assertEqual(writer.lru_trie.header.epoch(), epoch + 1)
+
+        links = [(PAGES[1], 's:http|h:com|h:world|p:%i|' % i) for i in range(10)]
+        writer.add_links(links)
+
+        self.assertEqual(
+            sorted(reader.snapshot(lambda: list(reader.links_iter()))),
+            sorted(links)
+        )
+
+        reader.close()
+        writer.close()
+
+    def assertFollowsCompaction(self, **reader_options):
+        writer = self.get_traph(shared=True)
+        writer.add_links([(PAGES[0], PAGES[1])])
+
+        reader = self.get_traph(mode='r', **reader_options)
+        self.assertEqual(reader.snapshot(reader.count_pages), 2)
+
+        # Readers should follow the files swapped in by the compaction
+        epoch = writer.lru_trie.header.epoch()
+        writer.compact()
+        writer.add_page('s:http|h:com|h:world|')
+
+        self.assertEqual(reader.snapshot(reader.count_pages), 3)
+        self.assertEqual(reader.lru_trie.header.epoch(), epoch + 1)
+        self.assertEqual(
+            reader.snapshot(lambda: list(reader.links_iter())),
+            [(PAGES[0], PAGES[1])]
+        )
+        self.assertEqual(reader.snapshot(reader.get_webentities_links), writer.get_webentities_links())
+        self.assertIsNotNone(reader.webentity_index_file)
+
+        reader.close()
+        writer.close()
+
+    def test_compact(self):
+        self.assertFollowsCompaction()
+
+    def test_compact_with_mmap(self):
+        self.assertFollowsCompaction(mmap=True)
+
+    def test_failed_batch(self):
+        writer = self.get_traph(shared=True)
+        writer.add_links([(PAGES[0], PAGES[1])])
+
+        reader = self.get_traph(mode='r')
+
+        # Batches raising in the middle should still be published
+        with self.assertRaises(AttributeError):
+            writer.index_batch_crawl({PAGES[0]: ['s:http|h:com|h:world|', None]})
+
+        with self.assertRaises(TraphException):
+            writer.delete_webentity(12, [PAGES[0]])
+
+        self.assertEqual(writer.lru_trie.header.generation() % 2, 0)
+        self.assertEqual(reader.snapshot(reader.count_pages), 3)
+
+        # A writer crashing in the middle of a batch should not keep the
+        # readers waiting forever
+        writer.lru_trie.header.increment_generation()
+        writer.lru_trie.header.write()
+        writer.lru_trie.add_page('s:http|h:com|h:world|p:crash|')
+        writer.flush()
+
+        for f in [writer.lru_trie_file, writer.link_store_file, writer.webentity_index_file]:
+            f.close()
+
+        timeout = traph_module.TRAPH_SNAPSHOT_TIMEOUT
+        traph_module.TRAPH_SNAPSHOT_TIMEOUT = 0.05
+
+        try:
+            with self.assertRaises(TraphException):
+                reader.snapshot(reader.count_pages)
+        finally:
+            traph_module.TRAPH_SNAPSHOT_TIMEOUT = timeout
+
+        # The next writer, even unshared, should publish an even generation
+        self.get_traph().close()
+        self.assertEqual(reader.snapshot(reader.count_pages), 4)
+
+        reader.close()
+
+    def test_snapshot(self):
+        self.assertSnapshots(mmap=True)
+
+    # NOTE: readers not using memory maps should not read stale buffers
+    def test_snapshot_without_mmap(self):
+        self.assertSnapshots()
+
+    def test_snapshot_with_cache(self):
+        self.assertSnapshots(cache_size=16)
+
+
+PAGES = [
+    's:http|h:fr|h:sciences-po|h:medialab|',
+    's:https|h:com|h:twitter|p:paulanomalie|'
+]
+
+
+def crash(traph):
+
+    # NOTE: closing the files without flushing the storages' caches
+    for f in [traph.lru_trie_file, traph.link_store_file, traph.webentity_index_file, traph.journal_file]:
+        f.close()
+
+
+class TestJournal(TraphTestCase):
+
+    def test_replay(self):
+        traph = self.get_traph(journal=True)
+        traph.add_links([(PAGES[0], PAGES[1])])
+
+        # The batch was durably logged but not written in place
+        traph.lru_trie.add_page('s:http|h:com|h:world|')
+        self.assertTrue(traph.journal.log())
+        crash(traph)
+
+        with self.open_traph(journal=True) as traph:
+            self.assertEqual(traph.count_pages(), 3)
+            self.assertEqual(traph.count_links(), 1)
+            self.assertEqual(os.path.getsize(traph.journal_path), 0)
+
+    def test_interrupted_batch(self):
+        traph = self.get_traph(journal=True, cache_size=16)
+        traph.add_links([(PAGES[0], PAGES[1])])
+
+        iterator = traph.index_batch_crawl_iter({
+            PAGES[0]: ['s:http|h:com|h:world|p:%i|' % i for i in range(300)]
+        })
+        next(iterator)
+
+        # Neither flushing nor sharing the scan between processes should
+        # commit the batch in progress
+        traph.flush()
+
+        self.assertEqual(
+            traph.get_webentities_links(processes=2),
+            traph.get_webentities_links_slow()
+        )
+
+        crash(traph)
+
+        with self.open_traph(journal=True) as traph:
+            self.assertEqual(traph.count_pages(), 2)
+            self.assertEqual(traph.count_links(), 1)
+            self.assertEqual(traph.get_page_outdegree(PAGES[0]), 1)
+
+    def test_uncommitted_batch(self):
+        traph = self.get_traph(journal=True, cache_size=4)
+        traph.add_links([(PAGES[0], PAGES[1])])
+
+        # Some dirty blocks are spilled to the journal when evicted
+        for i in range(10):
+            traph.lru_trie.add_page('s:http|h:com|h:world|p:%i|' % i)
+
+        self.assertTrue(os.path.getsize(traph.journal_path) > 0)
+        self.assertEqual(traph.count_pages(), 12)
+
+        # Incomplete commit record
+        traph.journal_file.seek(0, os.SEEK_END)
+        traph.journal_file.write(struct.pack(JOURNAL_RECORD_FORMAT, 255, 0, 0)[:4])
+        crash(traph)
+
+        with self.open_traph(journal=True) as traph:
+            self.assertEqual(traph.count_pages(), 2)
+            self.assertEqual(traph.count_links(), 1)
+            self.assertEqual(traph.get_page_outdegree(PAGES[0]), 1)
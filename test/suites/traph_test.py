@@ -5,8 +5,12 @@
 #
 # Testing the Traph class itself.
 #
+import os
 from test.test_cases import TraphTestCase
 from traph.traph import TraphException
+from traph.lru_trie import LRUTrie, LRU_TRIE_NODE_BLOCK_SIZE
+from traph.lru_trie.windup_cache import WindupCache
+from traph.storage import MemMapStorage
 
 
 class TestTraph(TraphTestCase):
@@ -77,6 +81,36 @@ class TestTraph(TraphTestCase):
             self.assertEqual(traph.count_pages(), 3)
             self.assertEqual(traph.count_links(), 2)
 
+    def test_index_crawl_stream(self):
+        data = dict(
+            ('s:http|h:com|h:site%i|p:page%i|' % (i % 7, i), [
+                's:http|h:com|h:site%i|p:page%i|' % (j % 7, j)
+                for j in range(i, i + 5)
+            ] + ['s:http|h:com|h:site0|p:page0|'])
+            for i in range(40)
+        )
+
+        def network(traph):
+            return dict(
+                (lru, sorted(traph.get_page_links(lru)))
+                for _, lru in traph.pages_iter()
+            )
+
+        with self.open_traph(folder=None) as traph:
+            traph.index_batch_crawl(data)
+            expected = network(traph)
+            expected_webentities_links = traph.get_webentities_links()
+            expected_crawled = traph.count_crawled_pages()
+
+        # NOTE: a tiny run size to spill several runs
+        with self.open_traph() as traph:
+            report = traph.index_crawl_stream(data.iteritems(), run_size=7)
+
+            self.assertEqual(report.nb_created_pages, len(expected))
+            self.assertEqual(network(traph), expected)
+            self.assertEqual(traph.get_webentities_links(), expected_webentities_links)
+            self.assertEqual(traph.count_crawled_pages(), expected_crawled)
+
     def test_index_batch_crawl_crawled_pages(self):
         with self.open_traph() as traph:
             traph.create_webentity(['s:http|h:fr|h:sciences-po|h:medialab|'])
@@ -195,6 +229,65 @@ class TestTraph(TraphTestCase):
                 ])
             )
 
+    def test_long_stems_storages(self):
+        lrus = [
+            's:http|h:fr|h:sciences-po|p:%s|' % ('a' * 100),
+            's:http|h:fr|h:sciences-po|p:%s|' % ('b' * 600),
+            's:http|h:fr|h:sciences-po|p:%s|' % ('c' * 600)
+        ]
+
+        for folder in (None, self.folder):
+            with self.open_traph(folder=folder) as traph:
+                traph.add_pages(lrus)
+
+                self.assertEqual(set(lru for _, lru in traph.pages_iter()), set(lrus))
+
+                for lru in lrus:
+                    self.assertTrue(traph.lru_trie.lru_node(lru).is_page())
+
+                # No tail block should be wasted
+                self.assertEqual(traph.metrics()['lru_trie']['nb_tail_nodes'], 1 + 8 + 8)
+
+        # Reading the trie through a memory map
+        with open(os.path.join(self.folder, 'lru_trie.dat'), 'rb') as f:
+            trie = LRUTrie(MemMapStorage(LRU_TRIE_NODE_BLOCK_SIZE, f))
+
+            self.assertEqual(set(lru for node, lru in trie.dfs_iter() if node.is_page()), set(lrus))
+
+            for lru in lrus:
+                self.assertEqual(trie.windup_lru(trie.lru_node(lru).block), lru)
+
+            trie.storage.release()
+
+    def test_windup_cache(self):
+        lrus = [
+            's:http|h:com|h:site%i|p:%s%i|' % (i % 5, 'page' if i % 3 else 'x' * 200, i)
+            for i in range(60)
+        ]
+
+        with self.open_traph() as traph:
+            traph.add_links([(lrus[i], lrus[(i * 7) % 60]) for i in range(60)])
+
+            # NOTE: a tiny memo to exercise the evictions
+            traph.lru_trie.windup_cache = WindupCache(4)
+
+            for _ in range(2):
+                for lru in lrus:
+                    self.assertEqual(traph.lru_trie.windup_lru(traph.lru_trie.lru_node(lru).block), lru)
+
+            self.assertTrue(len(traph.lru_trie.windup_cache) <= 4)
+
+            weid = traph.retrieve_webentity(lrus[1])
+            prefixes = [lru for node, lru in traph.webentity_prefix_iter() if node.webentity() == weid]
+
+            pagelinks = traph.get_webentity_pagelinks(weid, prefixes, include_inbound=True, include_outbound=True)
+
+            self.assertEqual(sorted(map(tuple, pagelinks)), sorted(
+                (source, target, 1)
+                for source, target in ((lrus[i], lrus[(i * 7) % 60]) for i in range(60))
+                if weid in (traph.retrieve_webentity(source), traph.retrieve_webentity(target))
+            ))
+
     def test_clear(self):
         with self.open_traph() as traph:
             traph = self.get_traph()
@@ -205,3 +298,38 @@ class TestTraph(TraphTestCase):
             traph.clear()
 
             self.assertEqual(traph.count_pages(), 0)
+
+    def test_metrics(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl({
+                's:http|h:fr|h:sciences-po|p:%s|' % ('a' * 200): [
+                    's:http|h:fr|h:sciences-po|p:%s|' % ('b' * 100),
+                    's:http|h:fr|h:sciences-po|h:medialab|'
+                ]
+            })
+
+            # NOTE: the iterator yields the same node, hence the tuples
+            nodes = [
+                (node.is_tail(), node.has_tail(), len(node.stem()))
+                for node in traph.lru_trie.nodes_iter()
+            ]
+
+            tails = [node for node in nodes if node[0]]
+            stems = [node for node in nodes if not node[0]]
+            fragmented = [node for node in stems if node[1]]
+
+            metrics = traph.metrics()['lru_trie']
+
+            self.assertEqual(metrics['nb_nodes'], len(nodes))
+            self.assertEqual(metrics['nb_pages'], 3)
+            self.assertEqual(metrics['nb_crawled_pages'], 1)
+            self.assertEqual(traph.count_crawled_pages(), 1)
+            self.assertEqual(metrics['nb_tail_nodes'], len(tails))
+            self.assertEqual(metrics['nb_stems'], len(stems))
+            self.assertEqual(metrics['nb_fragmented_nodes'], len(fragmented))
+            self.assertEqual(metrics['max_tail'], 2)
+            self.assertEqual(metrics['avg_tail'], len(tails) / float(len(fragmented)))
+            self.assertAlmostEqual(
+                metrics['avg_stem_filling'],
+                sum(node[2] for node in stems) / 74.0 / len(stems)
+            )
@@ -84,3 +84,85 @@ class TestTraversal(TraphTestCase):
                 'p:france|',
                 'p:romania|'
             ])
+
+    def test_rebalance(self):
+        with self.open_traph() as traph:
+            trie = traph.lru_trie
+            lrus = ['s:http|h:com|h:world|p:%03i|' % i for i in range(127)]
+
+            # Sequential stems degenerate into a linked list
+            for lru in lrus:
+                trie.add_page(lru)
+
+            trie.add_page('s:ftp|h:com|h:world|')
+            trie.add_page('s:https|h:com|h:world|')
+
+            def siblings_depth(lru):
+                node = trie.lru_node(lru)
+                node.read_child()
+                depth = 1
+
+                while node.has_right():
+                    node.read_right()
+                    depth += 1
+
+                return depth
+
+            self.assertEqual(siblings_depth('s:http|h:com|h:world|'), 127)
+
+            dfs = list(lru for _, lru in trie.dfs_iter())
+
+            traph.rebalance()
+
+            self.assertEqual(siblings_depth('s:http|h:com|h:world|'), 7)
+            self.assertEqual(set(lru for _, lru in trie.dfs_iter()), set(dfs))
+            self.assertTrue(trie.root().is_root())
+            self.assertEqual(trie.root().stem(), 's:http|')
+
+            for lru in lrus:
+                self.assertTrue(trie.lru_node(lru).is_page())
+
+            # The trie should remain writable
+            trie.add_page('s:http|h:com|h:world|p:127|')
+            self.assertEqual(traph.count_pages(), 130)
+
+    def test_cursor(self):
+        lrus = [
+            's:http|h:com|h:world|p:europe|p:%s|' % ('spain' * 40),
+            's:http|h:com|h:world|p:asia|',
+            's:http|h:fr|h:sciences-po|h:medialab|'
+        ]
+
+        for folder in (self.folder, None):
+            with self.open_traph(folder=folder) as traph:
+                trie = traph.lru_trie
+
+                traph.add_pages(lrus)
+
+                cursor = trie.cursor()
+                block = trie.root().block
+
+                while True:
+                    node = trie.node(block=block)
+                    cursor.read(block)
+
+                    self.assertEqual(cursor.exists, node.exists)
+
+                    if not node.exists:
+                        break
+
+                    self.assertEqual(cursor.stem(), node.stem())
+                    self.assertEqual(cursor.is_page(), node.is_page())
+                    self.assertEqual(cursor.is_tail(), node.is_tail())
+                    self.assertEqual(cursor.webentity(), node.webentity())
+                    self.assertEqual(
+                        (cursor.left(), cursor.right(), cursor.child(), cursor.parent()),
+                        (node.left(), node.right(), node.child(), node.parent())
+                    )
+
+                    block += trie.storage.block_size
+
+                self.assertEqual(
+                    set(lru for node, lru in trie.dfs_iter() if node.is_page()),
+                    set(lrus)
+                )
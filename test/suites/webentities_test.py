@@ -134,3 +134,29 @@ class TestWebentities(TraphTestCase):
         self.assertEqual(prefix, 's:http|h:com|h:airbus|')
 
         traph.close()
+
+    def test_windup_webentity(self):
+        with self.open_traph() as traph:
+            traph.add_pages([
+                's:http|h:com|h:world|p:europe|p:spain|',
+                's:http|h:com|h:world|p:europe|p:france|',
+                's:http|h:fr|h:sciences-po|h:medialab|'
+            ])
+
+            traph.create_webentity(['s:http|h:com|h:world|p:europe|'])
+
+            trie = traph.lru_trie
+            memo = {}
+
+            for node, lru in traph.pages_iter():
+                self.assertEqual(
+                    trie.windup_webentity(node.block, memo),
+                    trie.windup_lru_for_webentity(trie.node(block=node.block))
+                )
+
+            # The ancestors were memoized along the way
+            europe = trie.lru_node('s:http|h:com|h:world|p:europe|')
+            self.assertEqual(memo[europe.block], europe.webentity())
+
+            root_block = trie.root().block
+            self.assertNotIn(root_block, memo)
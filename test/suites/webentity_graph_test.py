@@ -0,0 +1,152 @@
+# =============================================================================
+# Webentity Graph Unit Tests
+# =============================================================================
+#
+# Testing that the webentity graph is correctly maintained incrementally.
+#
+from test.test_cases import TraphTestCase
+
+
+class TestWebentityGraph(TraphTestCase):
+
+    def assertGraphIsConsistent(self, traph):
+        for out in (True, False):
+            for include_auto in (True, False):
+                self.assertEqual(
+                    traph.get_webentities_links(out=out, include_auto=include_auto),
+                    traph.get_webentities_links_slow(out=out, include_auto=include_auto)
+                )
+
+    def test_webentity_graph(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl({
+                's:http|h:com|h:world|p:europe|p:spain|': [
+                    's:http|h:com|h:world|p:europe|p:france|',
+                    's:http|h:com|h:world|p:europe|p:spain|',
+                    's:http|h:fr|h:sciences-po|h:medialab|'
+                ],
+                's:http|h:fr|h:sciences-po|h:medialab|': [
+                    's:http|h:com|h:world|p:europe|p:spain|'
+                ]
+            })
+
+            changes = traph.get_webentities_links_changes()
+            version = changes['version']
+
+            self.assertEqual(changes['links'], traph.get_webentities_links())
+            self.assertIsNotNone(traph.webentity_graph)
+            self.assertGraphIsConsistent(traph)
+
+            # Adding links
+            traph.index_batch_crawl({
+                's:http|h:com|h:world|p:europe|p:france|': [
+                    's:http|h:fr|h:sciences-po|h:medialab|',
+                    's:http|h:com|h:twitter|p:paulanomalie|'
+                ]
+            })
+
+            self.assertGraphIsConsistent(traph)
+
+            world = traph.retrieve_webentity('s:http|h:com|h:world|')
+            medialab = traph.retrieve_webentity('s:http|h:fr|h:sciences-po|h:medialab|')
+            twitter = traph.retrieve_webentity('s:http|h:com|h:twitter|p:paulanomalie|')
+
+            changes = traph.get_webentities_links_changes(version)
+
+            self.assertEqual(changes['links'], {
+                world: {
+                    medialab: 2,
+                    twitter: 1
+                }
+            })
+
+            # Splitting a webentity
+            version = changes['version']
+            report = traph.create_webentity(['s:http|h:com|h:world|p:europe|p:spain|'])
+            spain = report.created_webentities.keys()[0]
+
+            self.assertGraphIsConsistent(traph)
+
+            changes = traph.get_webentities_links_changes(version)
+
+            self.assertEqual(changes['links'], {
+                world: {
+                    medialab: 1
+                },
+                spain: {
+                    world: 1,
+                    medialab: 1
+                },
+                medialab: {
+                    world: 0,
+                    spain: 1
+                }
+            })
+
+            self.assertEqual(
+                traph.get_webentities_links_changes(version, include_auto=True)['links'][spain][spain],
+                1
+            )
+
+            # Moving & removing prefixes
+            traph.move_prefix_to_webentity('s:http|h:com|h:world|p:europe|p:spain|', medialab, spain)
+            self.assertGraphIsConsistent(traph)
+
+            traph.remove_prefix_from_webentity('s:http|h:com|h:world|p:europe|p:spain|', medialab)
+            self.assertGraphIsConsistent(traph)
+
+            self.assertEqual(traph.get_webentities_links_changes(changes['version'])['links'], {
+                world: {
+                    medialab: 2
+                },
+                spain: {
+                    world: 0,
+                    medialab: 0
+                },
+                medialab: {
+                    world: 1,
+                    spain: 0
+                }
+            })
+
+    def test_parallel_webentity_graph(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl(dict(
+                ('s:http|h:com|h:site%i|p:page%i|' % (i % 7, i), [
+                    's:http|h:com|h:site%i|p:page%i|' % (j % 7, j)
+                    for j in range(i, i + 5)
+                ])
+                for i in range(50)
+            ))
+
+            expected = traph.get_webentities_links_slow()
+
+            self.assertEqual(traph.get_webentities_links(processes=2), expected)
+            self.assertIsNotNone(traph.webentity_graph)
+
+    def test_epochs(self):
+        def crawl(traph, first, last):
+            traph.index_batch_crawl(dict(
+                ('s:http|h:com|h:site%i|p:page|' % i, ['s:http|h:com|h:site%i|p:page|' % (i + 1)])
+                for i in range(first, last)
+            ))
+
+        with self.open_traph() as traph:
+            for maintenance in (traph.compact, traph.clear):
+                crawl(traph, 0, 5)
+                version = traph.get_webentities_links_changes()['version']
+
+                # Versions of a former graph should not be mistaken for
+                # versions of the current one
+                crawl(traph, 5, 10)
+                maintenance()
+                traph.get_webentities_links()
+                crawl(traph, 10, 15)
+
+                changes = traph.get_webentities_links_changes(version)
+
+                self.assertEqual(changes['links'], traph.get_webentities_links())
+                self.assertNotEqual(changes['version'][0], version[0])
+
+                changes = traph.get_webentities_links_changes(changes['version'])
+                self.assertEqual(changes['links'], {})
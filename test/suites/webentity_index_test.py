@@ -0,0 +1,79 @@
+# =============================================================================
+# Webentity Index Unit Tests
+# =============================================================================
+#
+# Testing that the persistent page => webentity index is kept up to date.
+#
+import os
+from test.test_cases import TraphTestCase
+
+
+def expected_index(traph):
+    return dict(
+        (node.block, weid)
+        for node, weid in traph.lru_trie.dfs_with_webentity_iter()
+        if node.is_page()
+    )
+
+
+def actual_index(traph):
+    return dict(
+        (node.block, traph.webentity_index.webentity(node.block))
+        for node, _ in traph.pages_iter()
+    )
+
+
+class TestWebentityIndex(TraphTestCase):
+
+    def assertIndexIsConsistent(self, traph):
+        self.assertEqual(actual_index(traph), expected_index(traph))
+
+    def test_webentity_index(self):
+        with self.open_traph() as traph:
+            traph.index_batch_crawl({
+                's:http|h:com|h:world|p:europe|p:spain|': [
+                    's:http|h:com|h:world|p:europe|p:france|',
+                    's:http|h:com|h:world|p:asia|'
+                ],
+                's:http|h:com|h:world|p:asia|': [
+                    's:http|h:fr|h:sciences-po|h:medialab|'
+                ]
+            })
+
+            self.assertIndexIsConsistent(traph)
+
+            # Creating a webentity below existing pages
+            report = traph.create_webentity(['s:http|h:com|h:world|p:europe|'])
+            europe = report.created_webentities.keys()[0]
+
+            self.assertIndexIsConsistent(traph)
+            self.assertEqual(
+                traph.webentity_index.webentity(traph.lru_trie.lru_node('s:http|h:com|h:world|p:europe|p:spain|').block),
+                europe
+            )
+
+            # Moving & removing prefixes
+            traph.move_prefix_to_webentity('s:http|h:com|h:world|p:europe|', 1000, europe)
+            self.assertIndexIsConsistent(traph)
+
+            traph.remove_prefix_from_webentity('s:http|h:com|h:world|p:europe|', 1000)
+            self.assertIndexIsConsistent(traph)
+
+            # Deleting a webentity whose pages do not belong to any other one
+            medialab = traph.retrieve_webentity('s:http|h:fr|h:sciences-po|h:medialab|')
+            prefixes = [lru for node, lru in traph.webentity_prefix_iter() if node.webentity() == medialab]
+            traph.delete_webentity(medialab, prefixes)
+
+            self.assertIndexIsConsistent(traph)
+            self.assertIsNone(
+                traph.webentity_index.webentity(traph.lru_trie.lru_node('s:http|h:fr|h:sciences-po|h:medialab|').block)
+            )
+
+            network = traph.get_webentities_links()
+
+        # The index should be rebuilt if missing
+        os.remove(os.path.join(self.folder, 'webentity_index.dat'))
+
+        with self.open_traph() as traph:
+            self.assertIndexIsConsistent(traph)
+            self.assertEqual(traph.get_webentities_links(), network)
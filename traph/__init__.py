@@ -5,3 +5,5 @@
 from traph import Traph, TraphException
 from traph_write_report import TraphWriteReport
 from traph_iterator_state import TraphIteratorState
+from traph_builder import TraphBuilder
+from async_traph import AsyncTraph
@@ -0,0 +1,215 @@
+# =============================================================================
+# Columnar Export Helpers
+# =============================================================================
+#
+# Functions decoding the raw binary data of the LRU Trie & the Link Store
+# into NumPy arrays in a single vectorized pass, so that analytics (degrees,
+# page counts, webentity aggregations etc.) can be computed without walking
+# the structure node by node.
+#
+# Rows of the arrays are the trie's blocks, row i standing for the block
+# LRU_TRIE_FIRST_DATA_BLOCK + i * LRU_TRIE_NODE_BLOCK_SIZE. Note that tail
+# blocks are also exported and should be filtered out using the flags.
+#
+# NOTE: NumPy is an optional dependency and is therefore imported lazily.
+#
+import re
+import struct
+from lru_trie.node import (
+    LRU_TRIE_NODE_FORMAT,
+    LRU_TRIE_NODE_BLOCK_SIZE,
+    LRU_TRIE_FIRST_DATA_BLOCK,
+    LRU_TRIE_NODE_FLAGS,
+    LRU_TRIE_NODE_WEBENTITY,
+    LRU_TRIE_NODE_LEFT_BLOCK,
+    LRU_TRIE_NODE_RIGHT_BLOCK,
+    LRU_TRIE_NODE_CHILD_BLOCK,
+    LRU_TRIE_NODE_PARENT_BLOCK,
+    LRU_TRIE_NODE_OUTLINKS_BLOCK,
+    LRU_TRIE_NODE_INLINKS_BLOCK
+)
+from link_store.chunk import LINK_STORE_BLOCK_FORMAT, LINK_STORE_BLOCK_SIZE
+
+# NumPy types of the struct codes used by the binary formats
+STRUCT_CODE_KINDS = {
+    'B': 'u1',
+    'H': 'u2',
+    'I': 'u4',
+    'Q': 'u8'
+}
+
+
+# Function returning the (type, offset) of every field of the given struct
+# format, natively aligned, so that the columns follow the format's changes
+def struct_fields(format):
+    fields = []
+    prefix = ''
+
+    for count, code in re.findall(r'(\d*)(\D)', format):
+        if code == 'x':
+            prefix += count + code
+            continue
+
+        items = [count + code] if code in 'sp' else [code] * int(count or 1)
+
+        for item in items:
+            offset = struct.calcsize(prefix + item) - struct.calcsize(item)
+            fields.append((STRUCT_CODE_KINDS.get(item), offset))
+            prefix += item
+
+    return fields
+
+
+# Function returning the columns, as (name, type, offset) tuples, of the
+# given fields of a struct format
+def struct_columns(format, fields):
+    format_fields = struct_fields(format)
+
+    return [(name,) + format_fields[field] for name, field in fields]
+
+
+# Columns of the trie's records
+LRU_TRIE_COLUMNS = struct_columns(LRU_TRIE_NODE_FORMAT, [
+    ('flags', LRU_TRIE_NODE_FLAGS),
+    ('webentity', LRU_TRIE_NODE_WEBENTITY),
+    ('left', LRU_TRIE_NODE_LEFT_BLOCK),
+    ('right', LRU_TRIE_NODE_RIGHT_BLOCK),
+    ('child', LRU_TRIE_NODE_CHILD_BLOCK),
+    ('parent', LRU_TRIE_NODE_PARENT_BLOCK),
+    ('outlinks', LRU_TRIE_NODE_OUTLINKS_BLOCK),
+    ('inlinks', LRU_TRIE_NODE_INLINKS_BLOCK)
+])
+
+# Columns of the link store's blocks (chunk headers & links share them)
+LINK_STORE_COLUMNS = struct_columns(LINK_STORE_BLOCK_FORMAT, [
+    ('first', 0),
+    ('second', 1),
+    ('third', 2)
+])
+
+
+# Function importing NumPy
+def require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required to export the Traph as arrays.')
+
+    return numpy
+
+
+# Function returning the NumPy dtype of some binary records
+def records_dtype(columns, itemsize):
+    np = require_numpy()
+
+    return np.dtype({
+        'names': [name for name, _, _ in columns],
+        'formats': ['=' + kind for _, kind, _ in columns],
+        'offsets': [offset for _, _, offset in columns],
+        'itemsize': itemsize
+    })
+
+
+# Function decoding the trie's data into one array per column
+def lru_trie_arrays(data):
+    np = require_numpy()
+
+    dtype = records_dtype(LRU_TRIE_COLUMNS, LRU_TRIE_NODE_BLOCK_SIZE)
+    length = max(0, len(data or '') - LRU_TRIE_FIRST_DATA_BLOCK)
+
+    records = np.frombuffer(
+        data or '',
+        dtype=dtype,
+        count=length // LRU_TRIE_NODE_BLOCK_SIZE,
+        offset=min(len(data or ''), LRU_TRIE_FIRST_DATA_BLOCK)
+    )
+
+    arrays = dict(
+        (name, np.ascontiguousarray(records[name]))
+        for name, _, _ in LRU_TRIE_COLUMNS
+    )
+
+    arrays['block'] = (
+        LRU_TRIE_FIRST_DATA_BLOCK +
+        np.arange(len(records), dtype=np.uint64) * LRU_TRIE_NODE_BLOCK_SIZE
+    )
+
+    return arrays
+
+
+# Function converting trie blocks to rows
+def rows(blocks):
+    return (blocks - LRU_TRIE_FIRST_DATA_BLOCK) // LRU_TRIE_NODE_BLOCK_SIZE
+
+
+# Function decoding the link store's data into CSR arrays (indptr, indices
+# & weights) using the given chunk pointers (one per row)
+def link_store_csr(data, pointers):
+    np = require_numpy()
+
+    dtype = records_dtype(LINK_STORE_COLUMNS, LINK_STORE_BLOCK_SIZE)
+    records = np.frombuffer(
+        data or '',
+        dtype=dtype,
+        count=len(data or '') // LINK_STORE_BLOCK_SIZE
+    )
+
+    sizes = records['first']
+    nexts = records['second']
+
+    # Following the chunks' linked lists of every row at once
+    chunk_sources = []
+    chunk_starts = []
+    chunk_sizes = []
+    chunk_ranks = []
+
+    sources = np.flatnonzero(pointers)
+    current = pointers[sources] // LINK_STORE_BLOCK_SIZE
+    rank = 0
+
+    while len(sources):
+        chunk_sources.append(sources)
+        chunk_starts.append(current + 1)
+        chunk_sizes.append(sizes[current])
+        chunk_ranks.append(np.full(len(sources), rank, dtype=np.int64))
+
+        following = nexts[current]
+        mask = following != 0
+
+        sources = sources[mask]
+        current = following[mask] // LINK_STORE_BLOCK_SIZE
+        rank += 1
+
+    if not chunk_sources:
+        return (
+            np.zeros(len(pointers) + 1, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.uint16)
+        )
+
+    chunk_sources = np.concatenate(chunk_sources)
+    chunk_starts = np.concatenate(chunk_starts).astype(np.int64)
+    chunk_sizes = np.concatenate(chunk_sizes).astype(np.int64)
+    chunk_ranks = np.concatenate(chunk_ranks)
+
+    # Ordering the chunks by row, then by position in the list
+    order = np.lexsort((chunk_ranks, chunk_sources))
+    chunk_sources = chunk_sources[order]
+    chunk_starts = chunk_starts[order]
+    chunk_sizes = chunk_sizes[order]
+
+    # Expanding the chunks into the indices of their link blocks
+    total = int(chunk_sizes.sum())
+    shifts = np.repeat(chunk_starts - (np.cumsum(chunk_sizes) - chunk_sizes), chunk_sizes)
+    links = shifts + np.arange(total, dtype=np.int64)
+
+    indptr = np.zeros(len(pointers) + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(chunk_sources, weights=chunk_sizes, minlength=len(pointers)).astype(np.int64),
+        out=indptr[1:]
+    )
+
+    indices = rows(records['first'][links].astype(np.int64))
+    weights = np.ascontiguousarray(records['third'][links])
+
+    return indptr, indices, weights
@@ -0,0 +1,162 @@
+# =============================================================================
+# Async Traph Class
+# =============================================================================
+#
+# Class wrapping a Traph so that it can be used from a Twisted reactor without
+# blocking it: every method returns a Deferred.
+#
+# Methods having a cooperative *_iter version are driven by a cooperator
+# running their iterator by time slices of a given budget, so that the
+# reactor can serve other requests in between. Alternatively, every call can
+# be offloaded to a dedicated thread.
+#
+# NOTE: the iterators are given the cooperator's budget, unless the call gives
+# its own, so that they yield once a slice is spent rather than every N
+# iterations, a single step otherwise exceeding the budget.
+#
+# NOTE: Twisted is an optional dependency and is therefore imported lazily.
+#
+import time
+from functools import partial
+
+# Default duration, in seconds, of the cooperator's time slices
+ASYNC_TRAPH_DEFAULT_BUDGET = 0.01
+
+# Methods having a cooperative *_iter version yielding TraphIteratorStates
+ASYNC_TRAPH_COOPERATIVE_METHODS = frozenset([
+    'add_webentity_creation_rule',
+    'get_webentity_pages',
+    'get_webentity_crawled_pages',
+    'get_webentity_most_linked_pages',
+    'get_webentity_child_webentities',
+    'get_webentity_pagelinks',
+    'get_webentity_outlinks',
+    'get_webentity_inlinks',
+    'get_webentities_links',
+    'get_webentities_inlinks',
+    'get_webentities_outlinks',
+    'index_batch_crawl',
+    'index_crawl_stream'
+])
+
+
+# Function importing Twisted
+def require_twisted():
+    try:
+        import twisted
+    except ImportError:
+        raise ImportError('Twisted is required to use the AsyncTraph.')
+
+    return twisted
+
+
+# Function returning a cooperator's termination predicate factory, making it
+# stop its current time slice once the given budget is spent
+def time_budget(budget):
+    def factory():
+        deadline = time.time() + budget
+
+        return lambda: time.time() >= deadline
+
+    return factory
+
+
+# Main class
+class AsyncTraph(object):
+
+    def __init__(self, traph, budget=ASYNC_TRAPH_DEFAULT_BUDGET,
+                 offload=False, cooperator=None, reactor=None):
+        require_twisted()
+
+        from twisted.internet.task import Cooperator
+
+        if reactor is None:
+            from twisted.internet import reactor
+
+        # Properties
+        self.traph = traph
+        self.budget = budget
+        self.reactor = reactor
+        self.pool = None
+
+        if cooperator is None:
+            cooperator = Cooperator(
+                terminationPredicateFactory=time_budget(budget),
+                scheduler=lambda step: reactor.callLater(0, step)
+            )
+
+        self.cooperator = cooperator
+
+        # NOTE: a single thread is used since the Traph is not thread-safe
+        if offload:
+            from twisted.python.threadpool import ThreadPool
+
+            self.pool = ThreadPool(1, 1, name='AsyncTraph')
+            self.pool.start()
+
+            reactor.addSystemEventTrigger('during', 'shutdown', self.pool.stop)
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s traph=%(traph)r budget=%(budget)s offload=%(offload)s>'
+        ) % {
+            'class_name': class_name,
+            'traph': self.traph,
+            'budget': self.budget,
+            'offload': self.pool is not None
+        }
+
+    def __getattr__(self, name):
+        attribute = getattr(self.traph, name)
+
+        if not callable(attribute):
+            return attribute
+
+        return partial(self.__call, name)
+
+    # =========================================================================
+    # Internal methods
+    # =========================================================================
+    def __call(self, name, *args, **kwargs):
+        from twisted.internet import defer, threads
+
+        if self.pool is not None:
+            return threads.deferToThreadPool(
+                self.reactor,
+                self.pool,
+                getattr(self.traph, name),
+                *args,
+                **kwargs
+            )
+
+        if name not in ASYNC_TRAPH_COOPERATIVE_METHODS:
+            return defer.maybeDeferred(getattr(self.traph, name), *args, **kwargs)
+
+        kwargs.setdefault('budget', self.budget)
+
+        try:
+            iterator = getattr(self.traph, name + '_iter')(*args, **kwargs)
+        except Exception:
+            return defer.fail()
+
+        return self.cooperate(iterator)
+
+    def __steps(self, iterator, last_state):
+        for state in iterator:
+            last_state[0] = state
+            yield None
+
+    # =========================================================================
+    # Public methods
+    # =========================================================================
+
+    # Method driving the given *_iter iterator through the cooperator &
+    # returning a Deferred firing with its result
+    def cooperate(self, iterator):
+        last_state = [None]
+
+        task = self.cooperator.cooperate(self.__steps(iterator, last_state))
+
+        return task.whenDone().addCallback(lambda _: last_state[0].result)
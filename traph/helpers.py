@@ -64,6 +64,7 @@ def detailed_chunks_iter(chunk_size, string):
     '''
     if len(string) <= chunk_size:
         yield True, string
+        return
 
     nb_chunks = int(math.ceil(len(string) / float(chunk_size)))
 
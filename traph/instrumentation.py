@@ -0,0 +1,174 @@
+# =============================================================================
+# Instrumentation Class
+# =============================================================================
+#
+# Class recording the number of calls & the time spent in the Traph's hot
+# paths: storage I/O, node & chunk (un)packing, BST sibling hops in the trie,
+# chain hops in the link store & windups.
+#
+# The probes are installed by shadowing the methods of the instrumented
+# objects (or by swapping the classes of the nodes, cursors & chunks they
+# create for timed subclasses) and uninstalled by removing the shadows, so
+# that the instrumentation costs nothing when disabled.
+#
+# NOTE: timings are inclusive, i.e. the time spent reading a node includes
+# the time spent reading its block from the storage.
+#
+import time
+
+clock = time.time
+
+# Probes, by counter name, of the nodes, cursors & chunks
+LRU_TRIE_NODE_PROBES = {
+    'read': 'lru_trie.node.read',
+    'pack': 'lru_trie.node.pack',
+    'write': 'lru_trie.node.write',
+    'read_left': 'lru_trie.sibling_hop',
+    'read_right': 'lru_trie.sibling_hop',
+    'read_child': 'lru_trie.child_hop',
+    'read_parent': 'lru_trie.parent_hop'
+}
+
+LRU_TRIE_CURSOR_PROBES = {
+    'read': 'lru_trie.cursor.read'
+}
+
+LINK_STORE_CHUNK_PROBES = {
+    'read': 'link_store.chunk_hop',
+    'pack': 'link_store.chunk.pack',
+    'write': 'link_store.chunk.write'
+}
+
+# Probes of the trie & link store themselves
+LRU_TRIE_PROBES = {
+    'windup_lru': 'lru_trie.windup_lru',
+    'windup_lru_for_webentity': 'lru_trie.windup_lru_for_webentity',
+    'windup_webentity': 'lru_trie.windup_webentity'
+}
+
+LINK_STORE_PROBES = {
+    'degree': 'link_store.degree'
+}
+
+STORAGE_PROBES = ('read', 'read_blocks', 'write')
+
+
+# Function returning the counters recorded between two stats
+def stats_difference(before, after):
+    difference = {}
+
+    for name, counter in after.items():
+        previous = before.get(name, {'count': 0, 'time': 0.0})
+        count = counter['count'] - previous['count']
+
+        if not count:
+            continue
+
+        difference[name] = {
+            'count': count,
+            'time': counter['time'] - previous['time']
+        }
+
+    return difference
+
+
+# Main class
+class Instrumentation(object):
+
+    def __init__(self):
+
+        # Counters, by name, as [count, time] lists
+        self.counters = {}
+
+        # Installed shadows, as (object, attribute) tuples
+        self.shadows = []
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s counters=%(counters)i probes=%(probes)i>'
+        ) % {
+            'class_name': class_name,
+            'counters': len(self.counters),
+            'probes': len(self.shadows)
+        }
+
+    # Method returning a timed version of the given function
+    def probe(self, name, fn):
+        counter = self.counters.setdefault(name, [0, 0.0])
+
+        def timed(*args, **kwargs):
+            start = clock()
+
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += clock() - start
+
+        timed.__name__ = fn.__name__
+        timed.__doc__ = fn.__doc__
+
+        return timed
+
+    # Method returning a subclass of the given class whose methods are timed
+    def probed_class(self, cls, probes):
+        attributes = dict(
+            (method, self.probe(name, getattr(cls, method)))
+            for method, name in probes.items()
+        )
+
+        # NOTE: the cursor relies on __slots__
+        if hasattr(cls, '__slots__'):
+            attributes['__slots__'] = ()
+
+        return type('Probed' + cls.__name__, (cls,), attributes)
+
+    # Method shadowing an attribute of the given object
+    def shadow(self, obj, attribute, value):
+        setattr(obj, attribute, value)
+        self.shadows.append((obj, attribute))
+
+    # =========================================================================
+    # Installation methods
+    # =========================================================================
+    def instrument_storage(self, storage, prefix):
+        for method in STORAGE_PROBES:
+            name = 'storage.%s.%s' % (prefix, method)
+            self.shadow(storage, method, self.probe(name, getattr(storage, method)))
+
+    def instrument_lru_trie(self, lru_trie):
+        for method, name in LRU_TRIE_PROBES.items():
+            self.shadow(lru_trie, method, self.probe(name, getattr(lru_trie, method)))
+
+        self.shadow(lru_trie, 'node_class', self.probed_class(lru_trie.node_class, LRU_TRIE_NODE_PROBES))
+        self.shadow(lru_trie, 'cursor_class', self.probed_class(lru_trie.cursor_class, LRU_TRIE_CURSOR_PROBES))
+
+    def instrument_link_store(self, link_store):
+        for method, name in LINK_STORE_PROBES.items():
+            self.shadow(link_store, method, self.probe(name, getattr(link_store, method)))
+
+        self.shadow(link_store, 'chunk_class', self.probed_class(link_store.chunk_class, LINK_STORE_CHUNK_PROBES))
+
+    # Method removing every probe, the counters being kept
+    def uninstall(self):
+        for obj, attribute in reversed(self.shadows):
+            delattr(obj, attribute)
+
+        self.shadows = []
+
+    # =========================================================================
+    # Counters methods
+    # =========================================================================
+    def reset(self):
+        for counter in self.counters.values():
+            counter[0] = 0
+            counter[1] = 0.0
+
+    def stats(self):
+        return dict(
+            (name, {'count': count, 'time': duration})
+            for name, (count, duration) in self.counters.items()
+            if count
+        )
@@ -3,4 +3,4 @@
 # =============================================================================
 #
 from traph.link_store.link_store import LinkStore
-from traph.link_store.node import LINK_STORE_NODE_BLOCK_SIZE
+from traph.link_store.chunk import LINK_STORE_BLOCK_SIZE
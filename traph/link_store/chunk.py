@@ -0,0 +1,254 @@
+# =============================================================================
+# Link Store Chunk
+# =============================================================================
+#
+# Class representing a chunk of the Link Store, i.e. a header block followed
+# by a fixed number of contiguous link blocks so that a page's links can be
+# read or written in a single I/O.
+#
+# A page's links are stored as a linked list of chunks whose capacity grows
+# geometrically, meaning that a page with n links only needs O(log(n)) reads.
+#
+import struct
+from traph.link_store.header import LINK_STORE_HEADER_BLOCKS
+from traph.lru_trie.node import LRU_TRIE_FIRST_DATA_BLOCK
+
+# Binary format
+# -
+# NOTE: Since python mimics C struct, the block size should be respecting
+# some rules (namely have even addresses or addresses divisble by 4 on some
+# architecture).
+LINK_STORE_BLOCK_FORMAT = 'QQH'
+LINK_STORE_BLOCK_STRUCT = struct.Struct(LINK_STORE_BLOCK_FORMAT)
+LINK_STORE_BLOCK_SIZE = LINK_STORE_BLOCK_STRUCT.size
+LINK_STORE_FIRST_DATA_BLOCK = LINK_STORE_HEADER_BLOCKS * LINK_STORE_BLOCK_SIZE
+
+# Positions (chunk header)
+LINK_STORE_CHUNK_SIZE = 0
+LINK_STORE_CHUNK_NEXT = 1
+LINK_STORE_CHUNK_CAPACITY = 2
+
+# Positions (link)
+LINK_STORE_LINK_TARGET = 0
+LINK_STORE_LINK_WEIGHT = 2
+
+# Capacities
+# -
+# NOTE: the capacity is stored on 16 bits
+LINK_STORE_CHUNK_MIN_CAPACITY = 4
+LINK_STORE_CHUNK_MAX_CAPACITY = 4096
+
+
+# Function returning the capacity of the chunk following the given one
+def next_chunk_capacity(capacity=None):
+    if capacity is None:
+        return LINK_STORE_CHUNK_MIN_CAPACITY
+
+    return max(
+        LINK_STORE_CHUNK_MIN_CAPACITY,
+        min(capacity * 2, LINK_STORE_CHUNK_MAX_CAPACITY)
+    )
+
+
+# Function unpacking the block stored at the given offset, in place from the
+# storage's buffer if given, or returning None if the block does not exist
+def unpack_block(storage, buffer, block):
+    if buffer is not None:
+        if block + LINK_STORE_BLOCK_SIZE > len(buffer):
+            return None
+
+        return LINK_STORE_BLOCK_STRUCT.unpack_from(buffer, block)
+
+    data = storage.read(block)
+
+    if data is None:
+        return None
+
+    return LINK_STORE_BLOCK_STRUCT.unpack(data)
+
+
+# Exceptions
+class LinkStoreChunkUsageException(Exception):
+    pass
+
+
+# Main class
+class LinkStoreChunk(object):
+
+    # =========================================================================
+    # Constructor
+    # =========================================================================
+    def __init__(self, storage, block=None,
+                 capacity=LINK_STORE_CHUNK_MIN_CAPACITY):
+
+        # Properties
+        self.storage = storage
+        self.block = None
+        self.exists = False
+
+        # Loading chunk from storage
+        if block is not None:
+            self.read(block, capacity)
+        else:
+            self.__set_default_data(capacity)
+
+    def __set_default_data(self, capacity):
+        self.header = [
+            0,        # Size
+            0,        # Next
+            capacity  # Capacity
+        ]
+
+        self.targets = []
+        self.weights = []
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s block=%(block)s exists=%(exists)s'
+            ' size=%(size)s capacity=%(capacity)s next=%(next)s>'
+        ) % {
+            'class_name': class_name,
+            'block': self.block,
+            'exists': self.exists,
+            'size': self.size(),
+            'capacity': self.capacity(),
+            'next': self.next()
+        }
+
+    # =========================================================================
+    # Utilities
+    # =========================================================================
+
+    # Method used to read a chunk
+    # NOTE: the expected capacity is read right away so that a chunk can be
+    # read in a single I/O most of the time.
+    def read(self, block, capacity=LINK_STORE_CHUNK_MIN_CAPACITY):
+        unpack_from = LINK_STORE_BLOCK_STRUCT.unpack_from
+        data = self.storage.buffer()
+        offset = block
+
+        # NOTE: when the storage has a buffer, the chunk is read in place
+        if data is None or block + LINK_STORE_BLOCK_SIZE > len(data):
+            data = self.storage.read_blocks(block, 1 + capacity)
+            offset = 0
+
+        if data is None:
+            self.exists = False
+            self.__set_default_data(capacity)
+            return
+
+        header = list(unpack_from(data, offset))
+        size = header[LINK_STORE_CHUNK_SIZE]
+
+        if len(data) < offset + (1 + size) * LINK_STORE_BLOCK_SIZE:
+            data = self.storage.read_blocks(block, 1 + size)
+            offset = 0
+
+        links = [
+            unpack_from(data, link_offset)
+            for link_offset in xrange(
+                offset + LINK_STORE_BLOCK_SIZE,
+                offset + (1 + size) * LINK_STORE_BLOCK_SIZE,
+                LINK_STORE_BLOCK_SIZE
+            )
+        ]
+
+        self.exists = True
+        self.block = block
+        self.header = header
+        self.targets = [link[LINK_STORE_LINK_TARGET] for link in links]
+        self.weights = [link[LINK_STORE_LINK_WEIGHT] for link in links]
+
+    # Method used to pack the chunk to binary form
+    # NOTE: unused link blocks are only packed when allocating the chunk
+    def pack(self, allocate=False):
+        pack_into = LINK_STORE_BLOCK_STRUCT.pack_into
+        nb_blocks = 1 + (self.capacity() if allocate else self.size())
+        data = bytearray(nb_blocks * LINK_STORE_BLOCK_SIZE)
+
+        pack_into(data, 0, *self.header)
+        offset = LINK_STORE_BLOCK_SIZE
+
+        for target, weight in zip(self.targets, self.weights):
+            pack_into(data, offset, target, 0, weight)
+            offset += LINK_STORE_BLOCK_SIZE
+
+        return str(data)
+
+    # Method used to write the chunk's data to storage
+    def write(self):
+        self.block = self.storage.write(
+            self.pack(allocate=not self.exists),
+            self.block
+        )
+        self.exists = True
+
+    # Method returning the number of blocks taken by the chunk
+    def nb_blocks(self):
+        return 1 + self.capacity()
+
+    # =========================================================================
+    # Header methods
+    # =========================================================================
+    def size(self):
+        return self.header[LINK_STORE_CHUNK_SIZE]
+
+    def capacity(self):
+        return self.header[LINK_STORE_CHUNK_CAPACITY]
+
+    def free(self):
+        return self.capacity() - self.size()
+
+    # Method used to know whether the next chunk is set
+    def has_next(self):
+        return self.header[LINK_STORE_CHUNK_NEXT] != 0
+
+    # Method used to retrieve the next chunk's block
+    def next(self):
+        block = self.header[LINK_STORE_CHUNK_NEXT]
+
+        if block < LINK_STORE_FIRST_DATA_BLOCK:
+            return None
+
+        return block
+
+    # Method used to set the next chunk
+    def set_next(self, block):
+        if block < LINK_STORE_FIRST_DATA_BLOCK:
+            raise LinkStoreChunkUsageException('Next chunk cannot be the header.')
+
+        self.header[LINK_STORE_CHUNK_NEXT] = block
+
+    # =========================================================================
+    # Links methods
+    # =========================================================================
+    def links_iter(self):
+        return zip(self.targets, self.weights)
+
+    # Method used to add a link to the chunk
+    def append(self, target_block, weight=1):
+        if not self.free():
+            raise LinkStoreChunkUsageException('Chunk is full.')
+
+        if target_block < LRU_TRIE_FIRST_DATA_BLOCK:
+            raise LinkStoreChunkUsageException('Target node cannot be the root.')
+
+        self.targets.append(target_block)
+        self.weights.append(weight)
+        self.header[LINK_STORE_CHUNK_SIZE] += 1
+
+    # Method used to increment the weight of known targets, consuming them
+    # from the given dict & returning whether the chunk was modified
+    def increment_weights(self, increments):
+        modified = False
+
+        for i, target_block in enumerate(self.targets):
+            increment = increments.pop(target_block, None)
+
+            if increment:
+                self.weights[i] += increment
+                modified = True
+
+        return modified
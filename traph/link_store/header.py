@@ -13,6 +13,7 @@ import struct
 # some rules (namely have even addresses or addresses divisble by 4 on some
 # architecture).
 LINK_STORE_HEADER_FORMAT = 'QQH'
+LINK_STORE_HEADER_STRUCT = struct.Struct(LINK_STORE_HEADER_FORMAT)
 
 # Header blocks
 # -
@@ -20,7 +21,15 @@ LINK_STORE_HEADER_FORMAT = 'QQH'
 # as a NULL pointer and be able to store some metadata about the structure.
 LINK_STORE_HEADER_BLOCKS = 1
 
+# Version of the link store's format
+# -
+# 0: links stored as a linked list of single-link blocks
+# 1: links stored as a linked list of chunks of contiguous links
+LINK_STORE_FORMAT_VERSION = 1
+
 # Positions
+LINK_STORE_HEADER_NB_LINKS = 0
+LINK_STORE_HEADER_VERSION = 2
 
 
 # Main class
@@ -46,15 +55,21 @@ class LinkStoreHeader(object):
         class_name = self.__class__.__name__
 
         return (
-            '<%(class_name)s>'
+            '<%(class_name)s nb_links=%(nb_links)s version=%(version)s>'
         ) % {
-            'class_name': class_name
+            'class_name': class_name,
+            'nb_links': self.nb_links(),
+            'version': self.version()
         }
 
     def __ensure(self):
         block = 0
 
-        empty_data = struct.pack(LINK_STORE_HEADER_FORMAT, *([0] * 3))
+        empty_data = LINK_STORE_HEADER_STRUCT.pack(
+            0,
+            0,
+            LINK_STORE_FORMAT_VERSION
+        )
 
         while block < LINK_STORE_HEADER_BLOCKS:
             data = self.storage.read(block)
@@ -70,7 +85,7 @@ class LinkStoreHeader(object):
 
     # Method used to unpack data
     def unpack(self, data):
-        return list(struct.unpack(LINK_STORE_HEADER_FORMAT, data))
+        return list(LINK_STORE_HEADER_STRUCT.unpack(data))
 
     # Method used to set a switch to another block
     def read(self):
@@ -78,7 +93,7 @@ class LinkStoreHeader(object):
 
     # Method used to pack the node to binary form
     def pack(self):
-        return struct.pack(LINK_STORE_HEADER_FORMAT, *self.data)
+        return LINK_STORE_HEADER_STRUCT.pack(*self.data)
 
     # Method used to write the node's data to storage
     def write(self):
@@ -87,3 +102,17 @@ class LinkStoreHeader(object):
     # =========================================================================
     # Getters/Setters
     # =========================================================================
+    def nb_links(self):
+        return self.data[LINK_STORE_HEADER_NB_LINKS]
+
+    def set_nb_links(self, nb_links):
+        self.data[LINK_STORE_HEADER_NB_LINKS] = nb_links
+
+    def increment_nb_links(self, increment=1):
+        self.data[LINK_STORE_HEADER_NB_LINKS] += increment
+
+    def version(self):
+        return self.data[LINK_STORE_HEADER_VERSION]
+
+    def set_version(self, version):
+        self.data[LINK_STORE_HEADER_VERSION] = version
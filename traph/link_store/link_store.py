@@ -2,11 +2,37 @@
 # Link Store Class
 # =============================================================================
 #
-# Class representing the structure storing the links as linked list of stubs.
+# Class representing the structure storing the links as linked lists of
+# chunks of stubs.
 #
-from itertools import chain
-from traph.link_store.node import LinkStoreNode, LINK_STORE_FIRST_DATA_BLOCK
-from traph.link_store.header import LinkStoreHeader, LINK_STORE_HEADER_BLOCKS
+# Since adding links to a chain means incrementing the weight of the targets
+# it already holds, the store keeps, for the chains having many links, an
+# in-memory index of their tail chunk & of the link block of each of their
+# targets. This way, adding k links to such a chain costs O(k) instead of
+# O(degree). The indices are dropped altogether when they hold too many
+# links.
+#
+from traph.link_store.chunk import (
+    LinkStoreChunk,
+    next_chunk_capacity,
+    unpack_block,
+    LINK_STORE_BLOCK_STRUCT,
+    LINK_STORE_CHUNK_SIZE,
+    LINK_STORE_CHUNK_NEXT,
+    LINK_STORE_LINK_WEIGHT
+)
+from traph.link_store.header import (
+    LinkStoreHeader,
+    LINK_STORE_HEADER_BLOCKS,
+    LINK_STORE_FORMAT_VERSION
+)
+
+
+# Minimum number of links a chain should have to be indexed
+LINK_STORE_INDEX_MIN_DEGREE = 64
+
+# Maximum number of links held by the chains' indices
+LINK_STORE_INDEX_SIZE = 1 << 20
 
 
 # Exceptions
@@ -14,9 +40,35 @@ class LinkStoreTraversalException(Exception):
     pass
 
 
+# Class representing the in-memory index of a chain
+class LinkStoreChainIndex(object):
+    __slots__ = ('tail', 'tail_size', 'tail_capacity', 'links')
+
+    def __init__(self, chunks):
+        block_size = chunks[0].storage.block_size
+        tail = chunks[-1]
+
+        self.tail = tail.block
+        self.tail_size = tail.size()
+        self.tail_capacity = tail.capacity()
+
+        # NOTE: mapping each target to the block of its link
+        self.links = {}
+
+        for chunk in chunks:
+            link_block = chunk.block
+
+            for target_block in chunk.targets:
+                link_block += block_size
+                self.links[target_block] = link_block
+
+
 # Main class
 class LinkStore(object):
 
+    # Class of the chunks (swapped when instrumented)
+    chunk_class = LinkStoreChunk
+
     # =========================================================================
     # Constructor
     # =========================================================================
@@ -25,112 +77,248 @@ class LinkStore(object):
         # Properties
         self.storage = storage
 
+        # Indices of the chains, by first chunk, & number of links they hold
+        self.indices = {}
+        self.nb_indexed_links = 0
+
         # Reading headers
         self.header = LinkStoreHeader(storage)
 
+        # An empty store written in an older format can be upgraded right away
+        if (
+            self.header.version() != LINK_STORE_FORMAT_VERSION and
+            storage.count_blocks() == LINK_STORE_HEADER_BLOCKS
+        ):
+            self.header.set_version(LINK_STORE_FORMAT_VERSION)
+            self.header.write()
+
     # =========================================================================
     # Read methods
     # =========================================================================
 
-    # Method returning a node
-    def node(self, **kwargs):
-        return LinkStoreNode(self.storage, **kwargs)
+    # Method returning a chunk
+    def chunk(self, **kwargs):
+        return self.chunk_class(self.storage, **kwargs)
 
-    # Method returning the root
-    def root(self):
-        return self.node(block=LINK_STORE_FIRST_DATA_BLOCK)
+    # Method returning whether the store uses the current format
+    def is_outdated(self):
+        return self.header.version() != LINK_STORE_FORMAT_VERSION
 
     # =========================================================================
-    # Mutation methods
+    # Internal methods
     # =========================================================================
 
-    # TODO: not used for the time being
-    def add_link(self, source_node, target_block, out=True):
+    # Method indexing the given chain, if it is large enough
+    def __index(self, links_block, chunks):
+        index = LinkStoreChainIndex(chunks)
 
-        # If the node does not have outlinks yet
-        if not source_node.has_links(out=out):
-            link_node = self.node()
-            link_node.set_target(target_block)
-            link_node.write()
+        if len(index.links) < LINK_STORE_INDEX_MIN_DEGREE:
+            return
 
-            source_node.set_links(link_node.block, out=out)
-            source_node.write()
+        if self.nb_indexed_links + len(index.links) > LINK_STORE_INDEX_SIZE:
+            self.indices = {}
+            self.nb_indexed_links = 0
 
-            return
+        self.indices[links_block] = index
+        self.nb_indexed_links += len(index.links)
+
+    # Method adding links to an indexed chain, without reading it
+    def __add_indexed_links(self, index, increments, targets):
+        storage = self.storage
+        buffer = storage.buffer()
+        block_size = storage.block_size
+        links = index.links
+        pack = LINK_STORE_BLOCK_STRUCT.pack
+
+        new_targets = []
+
+        # Incrementing the weight of known targets in place
+        for target_block in targets:
+            link_block = links.get(target_block)
+
+            if link_block is None:
+                new_targets.append(target_block)
+                continue
+
+            link = unpack_block(storage, buffer, link_block)
+
+            if link is None:
+                raise LinkStoreTraversalException('Block does not exist.')
+
+            storage.write(
+                pack(target_block, 0, link[LINK_STORE_LINK_WEIGHT] + increments[target_block]),
+                link_block
+            )
+
+        if not new_targets:
+            return 0
+
+        # Filling the tail chunk, in a single write
+        nb_appended = min(len(new_targets), index.tail_capacity - index.tail_size)
+        link_block = index.tail + (1 + index.tail_size) * block_size
+
+        if nb_appended:
+            storage.write(''.join(
+                pack(target_block, 0, increments[target_block])
+                for target_block in new_targets[:nb_appended]
+            ), link_block)
+
+            for target_block in new_targets[:nb_appended]:
+                links[target_block] = link_block
+                link_block += block_size
+
+        tail_size = index.tail_size + nb_appended
+        tail_next = 0
+
+        # Allocating new chunks contiguously at the end of the storage
+        new_chunks = []
+        capacity = index.tail_capacity
+        next_block = len(storage)
+        i = nb_appended
+
+        while i < len(new_targets):
+            capacity = next_chunk_capacity(capacity)
+            chunk = self.chunk(capacity=capacity)
+            chunk.block = next_block
+            next_block += chunk.nb_blocks() * block_size
+
+            while i < len(new_targets) and chunk.free():
+                chunk.append(new_targets[i], increments[new_targets[i]])
+                i += 1
+
+            if new_chunks:
+                new_chunks[-1].set_next(chunk.block)
+
+            new_chunks.append(chunk)
 
-        # Else:
-        link_node = self.node(block=source_node.links(out=out))
+        for chunk in new_chunks:
+            chunk.write()
 
-        if not link_node.exists:
-            raise LinkStoreTraversalException('Block does not exist.')
+            link_block = chunk.block
 
-        # We go through the linked list to find matching link
-        while link_node.target() != target_block and link_node.has_next():
-            link_node.read_next()
+            for target_block in chunk.targets:
+                link_block += block_size
+                links[target_block] = link_block
 
-        # If we did not find a matching link, we add it
-        if link_node.target() != target_block:
-            sibling = self.node()
-            sibling.set_target(target_block)
-            sibling.write()
-            link_node.set_next(sibling.block)
-            link_node.write()
+        if new_chunks:
+            tail_next = new_chunks[0].block
 
-        # Else we just increment the weight of the existing one
+        storage.write(pack(tail_size, tail_next, index.tail_capacity), index.tail)
+
+        if new_chunks:
+            tail = new_chunks[-1]
+            index.tail = tail.block
+            index.tail_size = tail.size()
+            index.tail_capacity = tail.capacity()
         else:
-            link_node.increment_weight()
-            link_node.write()
+            index.tail_size = tail_size
+
+        self.nb_indexed_links += len(new_targets)
+
+        if self.nb_indexed_links > LINK_STORE_INDEX_SIZE:
+            self.indices = {}
+            self.nb_indexed_links = 0
 
+        return len(new_targets)
+
+    # =========================================================================
+    # Mutation methods
+    # =========================================================================
     def add_links(self, source_node, target_blocks, out=True):
-        target_blocks = iter(target_blocks)
+        increments = {}
+        targets = []
+
+        for target_block in target_blocks:
+            if target_block in increments:
+                increments[target_block] += 1
+            else:
+                increments[target_block] = 1
+                targets.append(target_block)
+
+        if not targets:
+            return
+
         links_block = source_node.links(out=out)
+        index = self.indices.get(links_block) if links_block else None
+
+        if index is not None:
+            nb_new_links = self.__add_indexed_links(index, increments, targets)
+
+            # NOTE: every link is stored twice, we only count the outlinks
+            if out and nb_new_links:
+                self.header.increment_nb_links(nb_new_links)
+                self.header.write()
 
-        try:
-            first_target_block = next(target_blocks)
-        except StopIteration:
             return
 
-        # If the node does not have outlinks yet
-        if not links_block:
-            link_node = self.node()
-            link_node.set_target(first_target_block)
-            link_node.write()
+        chunks = list(self.chunks_iter(links_block)) if links_block else []
 
-            links_block = link_node.block
-            source_node.set_links(link_node.block, out=out)
-            source_node.write()
+        # Incrementing the weight of known targets
+        modified = [chunk.increment_weights(increments) for chunk in chunks]
 
-            first_target_block = None
+        targets = [target_block for target_block in targets if target_block in increments]
 
-        # Finding the current
-        link_nodes_index = {}
-        last_link_node = None
+        if not targets:
+            for chunk, was_modified in zip(chunks, modified):
+                if was_modified:
+                    chunk.write()
 
-        for link_node in self.link_nodes_iter(links_block):
-            link_nodes_index[link_node.target()] = link_node
-            last_link_node = link_node
+            self.__index(links_block, chunks)
 
-        if first_target_block:
-            target_blocks = chain([first_target_block], target_blocks)
+            return
 
-        # Adding new targets
-        # TODO: possible to virtualize chain and flush later to ease writes
-        for target_block in target_blocks:
+        # Filling the last chunk
+        last_chunk = chunks[-1] if chunks else None
+        i = 0
 
-            if target_block in link_nodes_index:
-                link_node = link_nodes_index[target_block]
-                link_node.increment_weight()
-                link_node.write()
+        if last_chunk is not None:
+            while i < len(targets) and last_chunk.free():
+                last_chunk.append(targets[i], increments[targets[i]])
+                i += 1
+
+            modified[-1] = modified[-1] or i > 0
+
+        # Allocating new chunks contiguously at the end of the storage
+        new_chunks = []
+        capacity = last_chunk.capacity() if last_chunk is not None else None
+        next_block = len(self.storage)
+
+        while i < len(targets):
+            capacity = next_chunk_capacity(capacity)
+            chunk = self.chunk(capacity=capacity)
+            chunk.block = next_block
+            next_block += chunk.nb_blocks() * self.storage.block_size
+
+            while i < len(targets) and chunk.free():
+                chunk.append(targets[i], increments[targets[i]])
+                i += 1
+
+            if new_chunks:
+                new_chunks[-1].set_next(chunk.block)
+
+            new_chunks.append(chunk)
+
+        for chunk in new_chunks:
+            chunk.write()
+
+        if new_chunks:
+            if last_chunk is None:
+                source_node.set_links(new_chunks[0].block, out=out)
+                source_node.write()
             else:
-                link_node = self.node()
-                link_node.set_target(target_block)
-                link_node.write()
+                last_chunk.set_next(new_chunks[0].block)
+                modified[-1] = True
 
-                link_nodes_index[target_block] = link_node
+        for chunk, was_modified in zip(chunks, modified):
+            if was_modified:
+                chunk.write()
 
-                last_link_node.set_next(link_node.block)
-                last_link_node.write()
-                last_link_node = link_node
+        self.__index(source_node.links(out=out), chunks + new_chunks)
+
+        # NOTE: every link is stored twice, we only count the outlinks
+        if out:
+            self.header.increment_nb_links(len(targets))
+            self.header.write()
 
     def add_outlinks(self, source_node, target_blocks):
         return self.add_links(source_node, target_blocks, out=True)
@@ -141,32 +329,49 @@ class LinkStore(object):
     # =========================================================================
     # Iteration methods
     # =========================================================================
-    def nodes_iter(self):
-        node = self.root()
+    def chunks_iter(self, block):
+        capacity = None
 
-        while node.exists:
-            yield node
-            node.read(node.block + self.storage.block_size)
+        while block:
+            chunk = self.chunk(block=block, capacity=next_chunk_capacity(capacity))
 
-    def link_nodes_iter(self, block):
-        node = self.node(block=block)
+            if not chunk.exists:
+                raise LinkStoreTraversalException('Block does not exist.')
 
-        if not node.exists:
-            raise LinkStoreTraversalException('Block does not exist.')
+            yield chunk
 
-        yield node
+            capacity = chunk.capacity()
+            block = chunk.next()
 
-        while node.has_next():
-            node.read_next()
-            yield node
+    # Method yielding the (target block, weight) tuples of the given chain
+    def links_iter(self, block):
+        for chunk in self.chunks_iter(block):
+            for link in chunk.links_iter():
+                yield link
 
     # =========================================================================
     # Counting methods
     # =========================================================================
-    def count_links(self):
-        blocks = self.storage.count_blocks() - LINK_STORE_HEADER_BLOCKS
 
-        return blocks / 2
+    # Method returning the number of links of the given chain
+    # NOTE: only the chunks' headers are read
+    def degree(self, block):
+        degree = 0
+        buffer = self.storage.buffer()
+
+        while block:
+            header = unpack_block(self.storage, buffer, block)
+
+            if header is None:
+                raise LinkStoreTraversalException('Block does not exist.')
+
+            degree += header[LINK_STORE_CHUNK_SIZE]
+            block = header[LINK_STORE_CHUNK_NEXT]
+
+        return degree
+
+    def count_links(self):
+        return self.header.nb_links()
 
     def metrics(self):
         stats = {
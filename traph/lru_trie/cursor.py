@@ -0,0 +1,220 @@
+# =============================================================================
+# LRU Trie Node Cursor
+# =============================================================================
+#
+# Class representing a read-only cursor over the LRU trie's nodes, used by
+# the traversals hopping over millions of nodes.
+#
+# Contrary to the LRUTrieNode, the cursor does not build a list out of every
+# node it reads: the node is decoded in a single call into a tuple using the
+# precompiled struct, directly from the storage's buffer when it has one
+# (i.e. without copying a slice out of it), while the tail of long stems is
+# only read if the stem is actually needed.
+#
+# NOTE: decoding the fields one by one when accessed was tried but is slower
+# in CPython since a struct call costs more than decoding the whole block.
+#
+from traph.lru_trie.node import (
+    unpack_block,
+    read_tail,
+    LRU_TRIE_FIRST_DATA_BLOCK,
+    LRU_TRIE_NODE_STEM,
+    LRU_TRIE_NODE_FLAGS,
+    LRU_TRIE_NODE_WEBENTITY,
+    LRU_TRIE_NODE_LEFT_BLOCK,
+    LRU_TRIE_NODE_RIGHT_BLOCK,
+    LRU_TRIE_NODE_CHILD_BLOCK,
+    LRU_TRIE_NODE_PARENT_BLOCK,
+    LRU_TRIE_NODE_OUTLINKS_BLOCK,
+    LRU_TRIE_NODE_INLINKS_BLOCK,
+    LRU_TRIE_NODE_FLAG_PAGE,
+    LRU_TRIE_NODE_FLAG_CRAWLED,
+    LRU_TRIE_NODE_FLAG_WEBENTITY_CREATION_RULE,
+    LRU_TRIE_NODE_FLAG_HAS_TAIL,
+    LRU_TRIE_NODE_FLAG_IS_TAIL
+)
+
+# Flag masks
+PAGE = 1 << LRU_TRIE_NODE_FLAG_PAGE
+CRAWLED = 1 << LRU_TRIE_NODE_FLAG_CRAWLED
+WEBENTITY_CREATION_RULE = 1 << LRU_TRIE_NODE_FLAG_WEBENTITY_CREATION_RULE
+HAS_TAIL = 1 << LRU_TRIE_NODE_FLAG_HAS_TAIL
+IS_TAIL = 1 << LRU_TRIE_NODE_FLAG_IS_TAIL
+
+EMPTY_DATA = ('',) + (0,) * 8
+
+
+# Main class
+class LRUTrieNodeCursor(object):
+
+    __slots__ = (
+        'storage',
+        'buffer',
+        'block',
+        'exists',
+        'data',
+        'tail'
+    )
+
+    # =========================================================================
+    # Constructor
+    # =========================================================================
+    def __init__(self, storage, block=None):
+
+        # Properties
+        self.storage = storage
+        self.buffer = storage.buffer()
+        self.block = None
+        self.exists = False
+        self.data = EMPTY_DATA
+        self.tail = None
+
+        if block is not None:
+            self.read(block)
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s "%(stem)s"'
+            ' block=%(block)s exists=%(exists)s>'
+        ) % {
+            'class_name': class_name,
+            'stem': self.stem(),
+            'block': self.block,
+            'exists': str(self.exists)
+        }
+
+    # =========================================================================
+    # Utilities
+    # =========================================================================
+
+    # Method moving the cursor to the given block
+    def read(self, block):
+        data = unpack_block(self.storage, self.buffer, block)
+
+        self.tail = None
+
+        if data is None:
+            self.exists = False
+            self.data = EMPTY_DATA
+            return
+
+        self.exists = True
+        self.block = block
+        self.data = data
+
+    def is_root(self):
+        return self.block == LRU_TRIE_FIRST_DATA_BLOCK
+
+    # =========================================================================
+    # Flags methods
+    # =========================================================================
+    def is_page(self):
+        return bool(self.data[LRU_TRIE_NODE_FLAGS] & PAGE)
+
+    def is_crawled(self):
+        return bool(self.data[LRU_TRIE_NODE_FLAGS] & CRAWLED)
+
+    def has_webentity_creation_rule(self):
+        return bool(self.data[LRU_TRIE_NODE_FLAGS] & WEBENTITY_CREATION_RULE)
+
+    def has_tail(self):
+        return bool(self.data[LRU_TRIE_NODE_FLAGS] & HAS_TAIL)
+
+    def is_tail(self):
+        return bool(self.data[LRU_TRIE_NODE_FLAGS] & IS_TAIL)
+
+    # =========================================================================
+    # Stem methods
+    # =========================================================================
+    def stem(self):
+        data = self.data
+
+        if not data[LRU_TRIE_NODE_FLAGS] & HAS_TAIL:
+            return data[LRU_TRIE_NODE_STEM]
+
+        if self.tail is None:
+            self.tail = read_tail(self.storage, self.buffer, self.block)
+
+        return data[LRU_TRIE_NODE_STEM] + self.tail
+
+    # =========================================================================
+    # Blocks methods
+    # =========================================================================
+    def has_left(self):
+        return self.data[LRU_TRIE_NODE_LEFT_BLOCK] != 0
+
+    def left(self):
+        block = self.data[LRU_TRIE_NODE_LEFT_BLOCK]
+
+        if block < LRU_TRIE_FIRST_DATA_BLOCK:
+            return None
+
+        return block
+
+    def has_right(self):
+        return self.data[LRU_TRIE_NODE_RIGHT_BLOCK] != 0
+
+    def right(self):
+        block = self.data[LRU_TRIE_NODE_RIGHT_BLOCK]
+
+        if block < LRU_TRIE_FIRST_DATA_BLOCK:
+            return None
+
+        return block
+
+    def has_child(self):
+        return self.data[LRU_TRIE_NODE_CHILD_BLOCK] != 0
+
+    def child(self):
+        block = self.data[LRU_TRIE_NODE_CHILD_BLOCK]
+
+        if block < LRU_TRIE_FIRST_DATA_BLOCK:
+            return None
+
+        return block
+
+    def has_parent(self):
+        return self.data[LRU_TRIE_NODE_PARENT_BLOCK] != 0
+
+    def parent(self):
+        return self.data[LRU_TRIE_NODE_PARENT_BLOCK]
+
+    # =========================================================================
+    # Links methods
+    # =========================================================================
+    def has_outlinks(self):
+        return self.data[LRU_TRIE_NODE_OUTLINKS_BLOCK] != 0
+
+    def outlinks(self):
+        return self.data[LRU_TRIE_NODE_OUTLINKS_BLOCK]
+
+    def has_inlinks(self):
+        return self.data[LRU_TRIE_NODE_INLINKS_BLOCK] != 0
+
+    def inlinks(self):
+        return self.data[LRU_TRIE_NODE_INLINKS_BLOCK]
+
+    def has_links(self, out=True):
+        return self.links(out=out) != 0
+
+    def links(self, out=True):
+        if out:
+            return self.data[LRU_TRIE_NODE_OUTLINKS_BLOCK]
+
+        return self.data[LRU_TRIE_NODE_INLINKS_BLOCK]
+
+    # =========================================================================
+    # WebEntity methods
+    # =========================================================================
+    def has_webentity(self):
+        return self.data[LRU_TRIE_NODE_WEBENTITY] != 0
+
+    def webentity(self):
+        weid = self.data[LRU_TRIE_NODE_WEBENTITY]
+
+        if weid == 0:
+            return None
+
+        return weid
@@ -5,6 +5,12 @@
 # Class representing the header of the LRU Trie buffer. This header can be
 # used to store various metadata and/or state.
 #
+# The header also holds the generation counter used to publish the writer's
+# batches to concurrent readers: the counter is odd while a batch is being
+# written and even once the files are in a consistent state again, and the
+# epoch, incremented each time the trie is cleared or compacted, so that the
+# readers know its blocks do not hold the same pages anymore.
+#
 import struct
 
 # Binary format
@@ -12,8 +18,9 @@ import struct
 # NOTE: Since python mimics C struct, the block size should be respecting
 # some rules (namely have even addresses or addresses divisble by 4 on some
 # architecture).
-LRU_TRIE_HEADER_FORMAT = 'I124x'
-LRU_TRIE_HEADER_BLOCK_SIZE = struct.calcsize(LRU_TRIE_HEADER_FORMAT)
+LRU_TRIE_HEADER_FORMAT = 'IQQ104x'
+LRU_TRIE_HEADER_STRUCT = struct.Struct(LRU_TRIE_HEADER_FORMAT)
+LRU_TRIE_HEADER_BLOCK_SIZE = LRU_TRIE_HEADER_STRUCT.size
 
 # Header blocks
 # -
@@ -23,6 +30,8 @@ LRU_TRIE_HEADER_BLOCKS = 1
 
 # Positions
 LRU_TRIE_HEADER_LAST_WEBENTITY_ID = 0
+LRU_TRIE_HEADER_GENERATION = 1
+LRU_TRIE_HEADER_EPOCH = 2
 
 
 # Main class
@@ -36,7 +45,9 @@ class LRUTrieHeader(object):
         # Properties
         self.storage = storage
         self.data = [
-            0  # Last webentity id
+            0,  # Last webentity id
+            0,  # Generation
+            0   # Epoch
         ]
 
         self.__ensure()
@@ -47,16 +58,20 @@ class LRUTrieHeader(object):
 
         return (
             '<%(class_name)s'
-            ' last_webentity_id=%(last_webentity_id)s>'
+            ' last_webentity_id=%(last_webentity_id)s'
+            ' generation=%(generation)s'
+            ' epoch=%(epoch)s>'
         ) % {
             'class_name': class_name,
-            'last_webentity_id': self.last_webentity_id()
+            'last_webentity_id': self.last_webentity_id(),
+            'generation': self.generation(),
+            'epoch': self.epoch()
         }
 
     def __ensure(self):
         block = 0
 
-        empty_data = struct.pack(LRU_TRIE_HEADER_FORMAT, 0)
+        empty_data = LRU_TRIE_HEADER_STRUCT.pack(0, 0, 0)
 
         while block < LRU_TRIE_HEADER_BLOCKS:
             data = self.storage.read(block)
@@ -72,7 +87,7 @@ class LRUTrieHeader(object):
 
     # Method used to unpack data
     def unpack(self, data):
-        return list(struct.unpack(LRU_TRIE_HEADER_FORMAT, data))
+        return list(LRU_TRIE_HEADER_STRUCT.unpack(data))
 
     # Method used to set a switch to another block
     def read(self):
@@ -80,7 +95,7 @@ class LRUTrieHeader(object):
 
     # Method used to pack the node to binary form
     def pack(self):
-        return struct.pack(LRU_TRIE_HEADER_FORMAT, *self.data)
+        return LRU_TRIE_HEADER_STRUCT.pack(*self.data)
 
     # Method used to write the node's data to storage
     def write(self):
@@ -100,3 +115,21 @@ class LRUTrieHeader(object):
 
     def increment_last_webentity_id(self):
         self.data[LRU_TRIE_HEADER_LAST_WEBENTITY_ID] += 1
+
+    def generation(self):
+        return self.data[LRU_TRIE_HEADER_GENERATION]
+
+    def is_being_written(self):
+        return self.data[LRU_TRIE_HEADER_GENERATION] % 2 == 1
+
+    def set_generation(self, generation):
+        self.data[LRU_TRIE_HEADER_GENERATION] = generation
+
+    def increment_generation(self):
+        self.data[LRU_TRIE_HEADER_GENERATION] += 1
+
+    def epoch(self):
+        return self.data[LRU_TRIE_HEADER_EPOCH]
+
+    def set_epoch(self, epoch):
+        self.data[LRU_TRIE_HEADER_EPOCH] = epoch
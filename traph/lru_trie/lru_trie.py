@@ -6,22 +6,49 @@
 #
 import warnings
 from traph.helpers import lru_iter
-from traph.lru_trie.node import LRUTrieNode, LRU_TRIE_FIRST_DATA_BLOCK, LRU_TRIE_STEM_SIZE
+from traph.lru_trie.node import (
+    LRUTrieNode,
+    LRU_TRIE_FIRST_DATA_BLOCK,
+    LRU_TRIE_STEM_SIZE,
+    LRU_TRIE_NODE_WEBENTITY,
+    LRU_TRIE_NODE_LEFT_BLOCK,
+    LRU_TRIE_NODE_RIGHT_BLOCK,
+    LRU_TRIE_NODE_CHILD_BLOCK,
+    LRU_TRIE_NODE_STEM_LENGTH_OFFSET,
+    LRU_TRIE_NODE_FLAGS_OFFSET,
+    LRU_TRIE_NODE_FLAG_PAGE,
+    LRU_TRIE_NODE_FLAG_CRAWLED,
+    LRU_TRIE_NODE_FLAG_HAS_TAIL,
+    LRU_TRIE_NODE_FLAG_IS_TAIL,
+    count_flagged,
+    longest_flagged_run
+)
+from traph.lru_trie.cursor import LRUTrieNodeCursor
 from traph.lru_trie.header import LRUTrieHeader
 from traph.lru_trie.walk_history import LRUTrieWalkHistory
+from traph.lru_trie.windup_cache import WindupCache, DEFAULT_WINDUP_CACHE_SIZE
+
+# Number of blocks read at once when scanning the raw blocks
+LRU_TRIE_SCAN_WINDOW = 8192
 
 
 # Main class
 class LRUTrie(object):
 
+    # Classes of the nodes & cursors (swapped when instrumented)
+    node_class = LRUTrieNode
+    cursor_class = LRUTrieNodeCursor
+
     # =========================================================================
     # Constructor
     # =========================================================================
-    def __init__(self, storage, encoding='utf-8'):
+    def __init__(self, storage, encoding='utf-8',
+                 windup_cache_size=DEFAULT_WINDUP_CACHE_SIZE):
 
         # Properties
         self.storage = storage
         self.encoding = encoding
+        self.windup_cache = WindupCache(windup_cache_size)
 
         # Reading headers
         self.header = LRUTrieHeader(storage)
@@ -74,6 +101,55 @@ class LRUTrie(object):
 
         return sibling
 
+    # Method returning the blocks of the sibling BST starting at the given
+    # block, in order
+    def __siblings_blocks(self, block):
+        blocks = []
+        stack = []
+        node = self.node()
+
+        while stack or block:
+
+            # Descending left
+            while block:
+                node.read(block)
+                stack.append((block, node.right()))
+                block = node.left()
+
+            block, right = stack.pop()
+            blocks.append(block)
+            block = right
+
+        return blocks
+
+    # Method linking the given sorted sibling blocks as a balanced BST and
+    # returning the BST's root
+    def __balance_siblings(self, blocks, lo, hi, root=None):
+        if lo > hi:
+            return None
+
+        mid = root if root is not None else (lo + hi) // 2
+
+        left = self.__balance_siblings(blocks, lo, mid - 1)
+        right = self.__balance_siblings(blocks, mid + 1, hi)
+
+        node = self.node(block=blocks[mid])
+
+        if node.left() != left or node.right() != right:
+            if left is None:
+                node.unset_left()
+            else:
+                node.set_left(left)
+
+            if right is None:
+                node.unset_right()
+            else:
+                node.set_right(right)
+
+            node.write()
+
+        return node.block
+
     # =========================================================================
     # Mutation methods
     # =========================================================================
@@ -155,13 +231,55 @@ class LRUTrie(object):
 
         return node, history
 
+    # =========================================================================
+    # Maintenance methods
+    # =========================================================================
+
+    # Method rebalancing every sibling BST of the trie
+    def rebalance(self):
+        root = self.root()
+
+        if not root.exists:
+            return
+
+        # NOTE: the top level BST's root must remain in the root block
+        blocks = self.__siblings_blocks(root.block)
+        self.__balance_siblings(
+            blocks,
+            0,
+            len(blocks) - 1,
+            root=blocks.index(root.block)
+        )
+
+        stack = blocks
+        node = self.node()
+
+        while stack:
+            node.read(stack.pop())
+
+            if not node.has_child():
+                continue
+
+            blocks = self.__siblings_blocks(node.child())
+            child = self.__balance_siblings(blocks, 0, len(blocks) - 1)
+
+            if child != node.child():
+                node.set_child(child)
+                node.write()
+
+            stack.extend(blocks)
+
     # =========================================================================
     # Read methods
     # =========================================================================
 
     # Method returning a node
     def node(self, **kwargs):
-        return LRUTrieNode(self.storage, **kwargs)
+        return self.node_class(self.storage, **kwargs)
+
+    # Method returning a read-only cursor, used by the traversals
+    def cursor(self, block=None):
+        return self.cursor_class(self.storage, block=block)
 
     # Method returning root node
     def root(self):
@@ -253,13 +371,38 @@ class LRUTrie(object):
         return node, history
 
     def windup_lru(self, block):
-        # TODO: check block
-        node = self.node(block=block)
+        cache = self.windup_cache
+        lru = cache.get(block)
 
-        lru = node.stem()
+        if lru is not None:
+            return lru
 
-        for parent in self.node_parents_iter(node):
-            lru = parent.stem() + lru
+        # NOTE: stems are collected from the leaf up & joined once reversed,
+        # stopping at the first ancestor whose LRU is memoized
+        node = self.cursor(block)
+        stem = node.stem()
+        stems = [stem]
+        parent = first_parent = node.parent()
+
+        while parent:
+            prefix = cache.get(parent)
+
+            if prefix is not None:
+                stems.append(prefix)
+                break
+
+            node.read(parent)
+            stems.append(node.stem())
+            parent = node.parent()
+
+        stems.reverse()
+        lru = ''.join(stems)
+
+        # Memoizing the parent's LRU as well, since siblings will need it
+        if first_parent:
+            cache.set(first_parent, lru[:len(lru) - len(stem)])
+
+        cache.set(block, lru)
 
         return lru
 
@@ -279,11 +422,57 @@ class LRUTrie(object):
 
         return None
 
+    # Method resolving the webentity of the given block while memoizing, in
+    # the given dict (typically kept for the duration of a query), the answer
+    # for every visited ancestor so that later walks can stop early
+    # NOTE: blocks without any webentity are memoized as 0
+    def windup_webentity(self, block, memo):
+        weid = memo.get(block)
+
+        if weid is not None:
+            return weid or None
+
+        node = self.cursor(block)
+        visited = [block]
+        weid = 0
+
+        while True:
+            if node.has_webentity():
+                weid = node.webentity()
+                break
+
+            parent = node.parent()
+
+            if not parent:
+                break
+
+            known = memo.get(parent)
+
+            if known is not None:
+                weid = known
+                break
+
+            visited.append(parent)
+            node.read(parent)
+
+        for visited_block in visited:
+            memo[visited_block] = weid
+
+        if not weid:
+            warnings.warn(
+                'Could not find a webentity for the given block %i!' % block,
+                RuntimeWarning
+            )
+
+            return None
+
+        return weid
+
     # =========================================================================
     # Iteration methods
     # =========================================================================
     def nodes_iter(self):
-        node = self.root()
+        node = self.cursor(LRU_TRIE_FIRST_DATA_BLOCK)
 
         while node.exists:
             yield node
@@ -310,33 +499,35 @@ class LRUTrie(object):
             starting_block = starting_node.block
             starting_lru = ''.join(list(lru_iter(starting_lru))[:-1])
         else:
-            starting_node = self.root()
-            starting_block = self.root().block
+            starting_node = self.cursor(LRU_TRIE_FIRST_DATA_BLOCK)
+            starting_block = LRU_TRIE_FIRST_DATA_BLOCK
 
         # If there is no starting node, there is no point in doing a DFS
         if not starting_node.exists:
             return
 
         stack = [(starting_block, starting_lru)]
-        node = self.node()
+        node = self.cursor()
 
-        while len(stack):
+        while stack:
             block, lru = stack.pop()
             node.read(block)
 
+            # NOTE: reading the cursor's tuple directly spares method calls
+            data = node.data
             current_lru = lru + node.stem()
 
             yield node, current_lru
 
             if starting_from_root or block != starting_block:
-                if node.has_right():
-                    stack.append((node.right(), lru))
+                if data[LRU_TRIE_NODE_RIGHT_BLOCK]:
+                    stack.append((data[LRU_TRIE_NODE_RIGHT_BLOCK], lru))
 
-                if node.has_left():
-                    stack.append((node.left(), lru))
+                if data[LRU_TRIE_NODE_LEFT_BLOCK]:
+                    stack.append((data[LRU_TRIE_NODE_LEFT_BLOCK], lru))
 
-            if node.has_child():
-                stack.append((node.child(), current_lru))
+            if data[LRU_TRIE_NODE_CHILD_BLOCK]:
+                stack.append((data[LRU_TRIE_NODE_CHILD_BLOCK], current_lru))
 
     def webentity_dfs_iter(self, starting_node, starting_lru):
         '''
@@ -353,13 +544,14 @@ class LRUTrie(object):
             return
 
         stack = [(starting_block, starting_lru)]
-        node = self.node()
+        node = self.cursor()
 
-        while len(stack):
+        while stack:
             block, lru = stack.pop()
             node.read(block)
 
-            relevant_node = block == starting_block or not node.has_webentity()
+            data = node.data
+            relevant_node = block == starting_block or not data[LRU_TRIE_NODE_WEBENTITY]
             current_lru = lru + node.stem()
 
             if relevant_node:
@@ -367,46 +559,44 @@ class LRUTrie(object):
 
             # Following siblings
             if block != starting_block:
-                if node.has_right():
-                    stack.append((node.right(), lru))
+                if data[LRU_TRIE_NODE_RIGHT_BLOCK]:
+                    stack.append((data[LRU_TRIE_NODE_RIGHT_BLOCK], lru))
 
-                if node.has_left():
-                    stack.append((node.left(), lru))
+                if data[LRU_TRIE_NODE_LEFT_BLOCK]:
+                    stack.append((data[LRU_TRIE_NODE_LEFT_BLOCK], lru))
 
             # Following child
-            if relevant_node and node.has_child():
-                stack.append((node.child(), current_lru))
+            if relevant_node and data[LRU_TRIE_NODE_CHILD_BLOCK]:
+                stack.append((data[LRU_TRIE_NODE_CHILD_BLOCK], current_lru))
 
     def dfs_with_webentity_iter(self):
-        starting_node = self.root()
-        starting_block = self.root().block
+        starting_node = self.cursor(LRU_TRIE_FIRST_DATA_BLOCK)
+        starting_block = LRU_TRIE_FIRST_DATA_BLOCK
 
         # If there is no starting node, there is no point in doing a DFS
         if not starting_node.exists:
             return
 
         stack = [(starting_block, None)]
-        node = self.node()
+        node = self.cursor()
 
-        while len(stack):
+        while stack:
             block, webentity = stack.pop()
             node.read(block)
 
-            current_webentity = webentity
-
-            if node.has_webentity():
-                current_webentity = node.webentity()
+            data = node.data
+            current_webentity = data[LRU_TRIE_NODE_WEBENTITY] or webentity
 
             yield node, current_webentity
 
-            if node.has_right():
-                stack.append((node.right(), webentity))
+            if data[LRU_TRIE_NODE_RIGHT_BLOCK]:
+                stack.append((data[LRU_TRIE_NODE_RIGHT_BLOCK], webentity))
 
-            if node.has_left():
-                stack.append((node.left(), webentity))
+            if data[LRU_TRIE_NODE_LEFT_BLOCK]:
+                stack.append((data[LRU_TRIE_NODE_LEFT_BLOCK], webentity))
 
-            if node.has_child():
-                stack.append((node.child(), current_webentity))
+            if data[LRU_TRIE_NODE_CHILD_BLOCK]:
+                stack.append((data[LRU_TRIE_NODE_CHILD_BLOCK], current_webentity))
 
     def pages_iter(self):
         for node, lru in self.dfs_iter():
@@ -421,87 +611,72 @@ class LRUTrie(object):
     # =========================================================================
     # Counting methods
     # =========================================================================
-    def count_pages(self):
-        nb = 0
+    # Method returning, for each given byte offset, a string made of the byte
+    # found at this offset in every node block
+    # NOTE: this is way faster than unpacking every node since the strided
+    # slices are computed at C speed
+    def raw_columns(self, *offsets):
+        columns = [[] for _ in offsets]
+        block_size = self.storage.block_size
+        block = LRU_TRIE_FIRST_DATA_BLOCK
 
-        # Here we don't need a DFS so we can plainly iterate over the nodes
-        for node in self.nodes_iter():
-            if node.is_page():
-                nb += 1
-
-        return nb
+        while True:
+            data = self.storage.read_blocks(block, LRU_TRIE_SCAN_WINDOW)
 
-    def count_crawled_pages(self):
-        nb = 0
+            if not data:
+                break
 
-        # Here we don't need a DFS so we can plainly iterate over the nodes
-        for node in self.nodes_iter():
-            if node.is_page() and node.is_crawled():
-                nb += 1
+            data = str(data)
 
-        return nb
+            for column, offset in zip(columns, offsets):
+                column.append(data[offset::block_size])
 
-    def metrics(self):
-        stats = {
-            'nb_nodes': 0,
-            'nb_pages': 0,
-            'nb_crawled_pages': 0,
-            'nb_tail_nodes': 0,
-            'nb_fragmented_nodes': 0,
-            'nb_stems': 0,
-            'avg_stem_filling': 0,
-            'max_tail': 0,
-            'avg_tail': 0
-        }
+            block += LRU_TRIE_SCAN_WINDOW * block_size
 
-        current_tail_size = 0
-        last_tail_size = 0
+        return [''.join(column) for column in columns]
 
-        for node in self.nodes_iter():
-            stats['nb_nodes'] += 1
+    def count_pages(self):
+        flags, = self.raw_columns(LRU_TRIE_NODE_FLAGS_OFFSET)
 
-            if node.is_page():
-                stats['nb_pages'] += 1
+        return count_flagged(flags, [LRU_TRIE_NODE_FLAG_PAGE])
 
-                if node.is_crawled():
-                    stats['nb_crawled_pages'] += 1
+    def count_crawled_pages(self):
+        flags, = self.raw_columns(LRU_TRIE_NODE_FLAGS_OFFSET)
 
-            if node.has_tail():
-                stats['nb_fragmented_nodes'] += 1
+        return count_flagged(flags, [LRU_TRIE_NODE_FLAG_PAGE, LRU_TRIE_NODE_FLAG_CRAWLED])
 
-            if node.is_tail():
-                stats['nb_tail_nodes'] += 1
-                current_tail_size += 1
+    def metrics(self):
+        flags, lengths = self.raw_columns(
+            LRU_TRIE_NODE_FLAGS_OFFSET,
+            LRU_TRIE_NODE_STEM_LENGTH_OFFSET
+        )
 
-                if current_tail_size > stats['max_tail']:
-                    stats['max_tail'] = current_tail_size
+        stats = {
+            'nb_nodes': len(flags),
+            'nb_pages': count_flagged(flags, [LRU_TRIE_NODE_FLAG_PAGE]),
+            'nb_crawled_pages': count_flagged(flags, [LRU_TRIE_NODE_FLAG_PAGE, LRU_TRIE_NODE_FLAG_CRAWLED]),
+            'nb_tail_nodes': count_flagged(flags, [LRU_TRIE_NODE_FLAG_IS_TAIL]),
+            'nb_fragmented_nodes': count_flagged(flags, [LRU_TRIE_NODE_FLAG_HAS_TAIL], [LRU_TRIE_NODE_FLAG_IS_TAIL]),
+            'max_tail': longest_flagged_run(flags, LRU_TRIE_NODE_FLAG_IS_TAIL)
+        }
 
-                last_tail_size = current_tail_size
-            else:
-                current_tail_size = 0
-                filling = len(node.stem()) / float(LRU_TRIE_STEM_SIZE)
-
-                stats['nb_stems'] += 1
-                stats['avg_stem_filling'] = (
-                    stats['avg_stem_filling'] +
-                    (
-                        (filling - stats['avg_stem_filling']) /
-                        float(stats['nb_stems'])
-                    )
-                )
+        stats['nb_stems'] = stats['nb_nodes'] - stats['nb_tail_nodes']
 
-                if last_tail_size:
-                    stats['avg_tail'] = (
-                        stats['avg_tail'] + (
-                            (last_tail_size - stats['avg_tail']) /
-                            float(stats['nb_fragmented_nodes'])
-                        )
-                    )
+        # NOTE: a stem's filling accounts for its tail, as the stored lengths
+        # of the tail blocks are summed along with the stems' ones
+        stats['avg_stem_filling'] = (
+            sum(bytearray(lengths)) / float(LRU_TRIE_STEM_SIZE * stats['nb_stems'])
+            if stats['nb_stems'] else 0
+        )
 
-                    last_tail_size = 0
+        stats['avg_tail'] = (
+            stats['nb_tail_nodes'] / float(stats['nb_fragmented_nodes'])
+            if stats['nb_fragmented_nodes'] else 0
+        )
 
         stats['prop_fragmented_stems'] = (
             stats['nb_fragmented_nodes'] / float(stats['nb_stems'])
+            if stats['nb_stems'] else 0
         )
 
         return stats
@@ -21,7 +21,8 @@ from traph.helpers import detailed_chunks_iter
 
 # TODO: it's possible to differentiate the tail's blocks format if needed
 LRU_TRIE_NODE_FORMAT = '75pBI6Q'
-LRU_TRIE_NODE_BLOCK_SIZE = struct.calcsize(LRU_TRIE_NODE_FORMAT)
+LRU_TRIE_NODE_STRUCT = struct.Struct(LRU_TRIE_NODE_FORMAT)
+LRU_TRIE_NODE_BLOCK_SIZE = LRU_TRIE_NODE_STRUCT.size
 LRU_TRIE_FIRST_DATA_BLOCK = LRU_TRIE_HEADER_BLOCKS * LRU_TRIE_NODE_BLOCK_SIZE
 
 # NOTE: this MUST be 1 less than the number above because varchars or
@@ -32,6 +33,10 @@ LRU_TRIE_FIRST_DATA_BLOCK = LRU_TRIE_HEADER_BLOCKS * LRU_TRIE_NODE_BLOCK_SIZE
 # advise against block fattening since we are currently in the sweet spot).
 LRU_TRIE_STEM_SIZE = 74
 
+# Number of tail blocks read at once when the storage has no buffer
+# NOTE: this means that stems up to 370 characters are read in two I/Os
+LRU_TRIE_TAIL_READ_BLOCKS = 4
+
 # Node Positions
 LRU_TRIE_NODE_STEM = 0
 LRU_TRIE_NODE_FLAGS = 1
@@ -45,6 +50,11 @@ LRU_TRIE_NODE_INLINKS_BLOCK = 8
 
 LRU_TRIE_NODE_REGISTERS = 8
 
+# Byte offsets (used to scan raw blocks without unpacking them)
+# NOTE: the stem's first byte is the pascal string's length
+LRU_TRIE_NODE_STEM_LENGTH_OFFSET = 0
+LRU_TRIE_NODE_FLAGS_OFFSET = struct.calcsize('75p')
+
 # Flags (Currently allocating 7/8 bits)
 LRU_TRIE_NODE_FLAG_PAGE = 0
 LRU_TRIE_NODE_FLAG_CRAWLED = 1
@@ -68,6 +78,96 @@ def test(data, register, pos):
     return bool((data[register] >> pos) & 1)
 
 
+def unpack_block(storage, buffer, block):
+    '''
+    Unpacking the node stored at the given block, in place from the storage's
+    buffer if given, or returning None if the block does not exist.
+    '''
+    if buffer is not None:
+        if block + LRU_TRIE_NODE_BLOCK_SIZE > len(buffer):
+            return None
+
+        return LRU_TRIE_NODE_STRUCT.unpack_from(buffer, block)
+
+    data = storage.read(block)
+
+    if data is None:
+        return None
+
+    return LRU_TRIE_NODE_STRUCT.unpack(data)
+
+
+def read_tail(storage, buffer, block):
+    '''
+    Reading the tail of the node stored at the given block, i.e. the stem
+    chunks stored in the contiguous blocks following it, in place from the
+    storage's buffer if given, or else by reading several blocks at once.
+    '''
+    chunks = []
+    block += LRU_TRIE_NODE_BLOCK_SIZE
+
+    while True:
+        if buffer is not None:
+            data, offset = buffer, block
+        else:
+            data, offset = storage.read_blocks(block, LRU_TRIE_TAIL_READ_BLOCKS), 0
+
+        if not data or offset + LRU_TRIE_NODE_BLOCK_SIZE > len(data):
+            raise LRUTrieNodeTraversalException('Tail block does not exist.')
+
+        while offset + LRU_TRIE_NODE_BLOCK_SIZE <= len(data):
+            tail_data = LRU_TRIE_NODE_STRUCT.unpack_from(data, offset)
+            chunks.append(tail_data[LRU_TRIE_NODE_STEM])
+
+            if not test(tail_data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_HAS_TAIL):
+                return ''.join(chunks)
+
+            offset += LRU_TRIE_NODE_BLOCK_SIZE
+            block += LRU_TRIE_NODE_BLOCK_SIZE
+
+
+def count_flagged(flags, positions, excluded=()):
+    '''
+    Counting the bytes of the given string of flags having every given flag
+    set & every excluded flag unset, by deleting the other ones at C speed.
+    '''
+    deleted = ''.join(
+        chr(byte) for byte in xrange(256)
+        if not all((byte >> pos) & 1 for pos in positions) or
+        any((byte >> pos) & 1 for pos in excluded)
+    )
+
+    return len(flags.translate(None, deleted))
+
+
+def longest_flagged_run(flags, pos):
+    '''
+    Returning the length of the longest run of consecutive bytes of the given
+    string of flags having the given flag set.
+    '''
+    table = ''.join('1' if (byte >> pos) & 1 else '0' for byte in xrange(256))
+    bits = flags.translate(table)
+
+    if '1' not in bits:
+        return 0
+
+    # Doubling, then bisecting, the length of the searched run
+    lo, hi = 1, 2
+
+    while '1' * hi in bits:
+        lo, hi = hi, hi * 2
+
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+
+        if '1' * mid in bits:
+            lo = mid
+        else:
+            hi = mid
+
+    return lo
+
+
 # Exceptions
 class LRUTrieNodeTraversalException(Exception):
     pass
@@ -138,11 +238,12 @@ class LRUTrieNode(object):
 
     # unpack data
     def unpack(self, data):
-        return list(struct.unpack(LRU_TRIE_NODE_FORMAT, data))
+        return list(LRU_TRIE_NODE_STRUCT.unpack(data))
 
     # set a switch to another block
     def read(self, block):
-        data = self.storage.read(block)
+        buffer = self.storage.buffer()
+        data = unpack_block(self.storage, buffer, block)
 
         if data is None:
             self.exists = False
@@ -150,27 +251,16 @@ class LRUTrieNode(object):
             self.tail = ''
         else:
             self.exists = True
-            self.data = self.unpack(data)
+            self.data = list(data)
             self.block = block
             self.tail = ''
 
-            # Reading the tail recursively
+            # Reading the tail, stored in the blocks following the node's one
             # TODO: it's possible not to read the tail in some cases
             # TODO: it might be possible to "stream" the tail when performing
             # BST comparison (probably overkill)
             if self.has_tail():
-                chunks = []
-
-                while True:
-                    data = struct.unpack(LRU_TRIE_NODE_FORMAT, self.storage.read())
-                    chars = data[LRU_TRIE_NODE_STEM]
-
-                    chunks.append(chars)
-
-                    if not test(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_HAS_TAIL):
-                        break
-
-                self.tail = ''.join(chunks)
+                self.tail = read_tail(self.storage, buffer, block)
 
     # re-acquiring data from storage because it may have changed
     def refresh(self):
@@ -178,31 +268,34 @@ class LRUTrieNode(object):
 
     # pack the node to binary form
     def pack(self):
-        return struct.pack(LRU_TRIE_NODE_FORMAT, *self.data)
+        return LRU_TRIE_NODE_STRUCT.pack(*self.data)
+
+    # pack the node's tail to a list of binary blocks
+    def pack_tail(self):
+        blocks = []
+
+        for is_last, chunk in detailed_chunks_iter(LRU_TRIE_STEM_SIZE, self.tail):
+            data = [chunk] + [0] * LRU_TRIE_NODE_REGISTERS
+
+            flag(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_IS_TAIL)
+
+            if not is_last:
+                flag(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_HAS_TAIL)
+
+            blocks.append(LRU_TRIE_NODE_STRUCT.pack(*data))
+
+        return blocks
 
     # write the node's data to storage
     def write(self):
-        block = self.storage.write(self.pack(), self.block)
-        self.block = block
+        data = self.pack()
 
-        # Writing the tail recursively
+        # Writing the tail right after the node, in a single write
         # NOTE: does not work on subsequent updates
         if self.tail and not self.exists:
-            for is_last, chunk in detailed_chunks_iter(LRU_TRIE_STEM_SIZE, self.tail):
-                data = [chunk] + [0] * LRU_TRIE_NODE_REGISTERS
-
-                flag(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_IS_TAIL)
-
-                if not is_last:
-                    flag(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_HAS_TAIL)
-
-                self.storage.write(
-                    struct.pack(
-                        LRU_TRIE_NODE_FORMAT,
-                        *data
-                    )
-                )
+            data += ''.join(self.pack_tail())
 
+        self.block = self.storage.write(data, self.block)
         self.exists = True
 
     # Method returning whether this node is the root
@@ -294,6 +387,10 @@ class LRUTrieNode(object):
 
         self.data[LRU_TRIE_NODE_LEFT_BLOCK] = block
 
+    # remove the left sibling
+    def unset_left(self):
+        self.data[LRU_TRIE_NODE_LEFT_BLOCK] = 0
+
     # read the left sibling
     def read_left(self):
         if not self.has_left():
@@ -328,6 +425,10 @@ class LRUTrieNode(object):
 
         self.data[LRU_TRIE_NODE_RIGHT_BLOCK] = block
 
+    # remove the right sibling
+    def unset_right(self):
+        self.data[LRU_TRIE_NODE_RIGHT_BLOCK] = 0
+
     # read the right sibling
     def read_right(self):
         if not self.has_right():
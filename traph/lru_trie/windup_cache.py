@@ -0,0 +1,65 @@
+# =============================================================================
+# Windup Cache Class
+# =============================================================================
+#
+# Class representing a bounded memo of the LRUs wound up from the trie's
+# blocks. Since a block's stem & parent never change once written, an entry
+# never needs to be invalidated, until the trie itself is cleared.
+#
+# Like the CachedFileStorage, the memo approximates a LRU eviction policy
+# using two generations of entries: entries are always accessed in the young
+# generation and, when the young generation is full, the old one is dropped
+# and replaced by the young one.
+#
+
+# Default number of LRUs kept in the memo
+DEFAULT_WINDUP_CACHE_SIZE = 65536
+
+
+# Main class
+class WindupCache(object):
+
+    def __init__(self, size=DEFAULT_WINDUP_CACHE_SIZE):
+
+        if size < 2:
+            raise ValueError('Windup cache size should be at least 2.')
+
+        # Properties
+        self.size = size
+        self.generation_size = size // 2
+        self.young = {}
+        self.old = {}
+
+    def __len__(self):
+        return len(self.young) + len(self.old)
+
+    # Method returning the LRU of the given block, or None if unknown
+    def get(self, block):
+        lru = self.young.get(block)
+
+        if lru is not None:
+            return lru
+
+        lru = self.old.get(block)
+
+        if lru is not None:
+            self.set(block, lru)
+
+        return lru
+
+    # Method memoizing the LRU of the given block
+    def set(self, block, lru):
+        young = self.young
+
+        young[block] = lru
+
+        if len(young) < self.generation_size:
+            return
+
+        self.old = young
+        self.young = {}
+
+    # Method dropping every entry
+    def clear(self):
+        self.young = {}
+        self.old = {}
@@ -0,0 +1,116 @@
+# =============================================================================
+# Parallel Helpers
+# =============================================================================
+#
+# Functions used to compute the webentity graph using a pool of processes.
+# Each process scans a range of the trie's blocks through read-only memory
+# maps of the Traph's files and computes a partial graph, the partial graphs
+# being merged by the caller.
+#
+import os
+from array import array
+from collections import Counter
+from multiprocessing import Pool
+from storage import MemMapStorage
+from link_store import LinkStore, LINK_STORE_BLOCK_SIZE
+from lru_trie.node import (
+    test,
+    unpack_block,
+    LRU_TRIE_NODE_BLOCK_SIZE,
+    LRU_TRIE_FIRST_DATA_BLOCK,
+    LRU_TRIE_NODE_FLAGS,
+    LRU_TRIE_NODE_FLAG_PAGE,
+    LRU_TRIE_NODE_OUTLINKS_BLOCK
+)
+from webentity_index import WebentityIndex, WEBENTITY_INDEX_BLOCK_SIZE
+
+# Number of block ranges per process, so that the load stays balanced
+RANGES_PER_PROCESS = 4
+
+
+# Function returning the block ranges to scan
+def block_ranges(nb_blocks, nb_ranges):
+    first = LRU_TRIE_FIRST_DATA_BLOCK // LRU_TRIE_NODE_BLOCK_SIZE
+    step = max(1, -(-(nb_blocks - first) // nb_ranges))
+
+    for start in xrange(first, nb_blocks, step):
+        yield (
+            start * LRU_TRIE_NODE_BLOCK_SIZE,
+            min(start + step, nb_blocks) * LRU_TRIE_NODE_BLOCK_SIZE
+        )
+
+
+# Function computing the webentity edges of the pages of a block range
+def webentity_edges_worker(task):
+    lru_trie_path, link_store_path, webentity_index_path, start, end = task
+
+    edges = Counter()
+
+    with open(lru_trie_path, 'rb') as lru_trie_file, \
+            open(link_store_path, 'rb') as link_store_file, \
+            open(webentity_index_path, 'rb') as webentity_index_file:
+
+        lru_trie_storage = MemMapStorage(LRU_TRIE_NODE_BLOCK_SIZE, lru_trie_file)
+        link_store_storage = MemMapStorage(LINK_STORE_BLOCK_SIZE, link_store_file)
+        link_store = LinkStore(link_store_storage)
+
+        # NOTE: one cannot map an empty file
+        if os.fstat(webentity_index_file.fileno()).st_size:
+            webentity_index_storage = MemMapStorage(WEBENTITY_INDEX_BLOCK_SIZE, webentity_index_file)
+            page_to_webentity = WebentityIndex(webentity_index_storage).load(lru_trie_storage)
+            webentity_index_storage.release()
+        else:
+            page_to_webentity = array('I', [0]) * lru_trie_storage.count_blocks()
+
+        # NOTE: we only need the flags & the outlinks so we don't read tails
+        buffer = lru_trie_storage.buffer()
+
+        for block in xrange(start, end, LRU_TRIE_NODE_BLOCK_SIZE):
+            data = unpack_block(lru_trie_storage, buffer, block)
+
+            if not test(data, LRU_TRIE_NODE_FLAGS, LRU_TRIE_NODE_FLAG_PAGE):
+                continue
+
+            links_block = data[LRU_TRIE_NODE_OUTLINKS_BLOCK]
+
+            if not links_block:
+                continue
+
+            source_webentity = page_to_webentity[block // LRU_TRIE_NODE_BLOCK_SIZE]
+
+            if not source_webentity:
+                continue
+
+            for target_block, weight in link_store.links_iter(links_block):
+                target_webentity = page_to_webentity[target_block // LRU_TRIE_NODE_BLOCK_SIZE]
+
+                if target_webentity:
+                    edges[source_webentity, target_webentity] += weight
+
+        lru_trie_storage.release()
+        link_store_storage.release()
+
+    return edges
+
+
+# Function yielding the partial webentity edges computed by a pool of
+# processes over the given Traph's files
+def webentity_edges_iter(lru_trie_path, link_store_path, webentity_index_path,
+                         nb_blocks, processes):
+    tasks = [
+        (lru_trie_path, link_store_path, webentity_index_path, start, end)
+        for start, end in block_ranges(nb_blocks, processes * RANGES_PER_PROCESS)
+    ]
+
+    pool = Pool(processes)
+
+    try:
+        for edges in pool.imap_unordered(webentity_edges_worker, tasks):
+            yield edges
+
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,133 @@
+# =============================================================================
+# Sorted Runs Helpers
+# =============================================================================
+#
+# Functions used to sort more (block, block) pairs than RAM can hold: pairs
+# are sorted by batches which are spilled to temporary files, called runs,
+# and the runs are then merged lazily.
+#
+# Since each run holds a file open, at most a given number of runs are
+# merged at once: runs are leveled, the runs of a level being merged into a
+# single run of the next level as soon as there are enough of them, so that
+# every pair is only written a logarithmic number of times.
+#
+import heapq
+import struct
+import tempfile
+
+# Binary format
+RUNS_PAIR_FORMAT = 'QQ'
+RUNS_PAIR_STRUCT = struct.Struct(RUNS_PAIR_FORMAT)
+RUNS_PAIR_SIZE = RUNS_PAIR_STRUCT.size
+
+# Number of pairs read at once from a run when merging
+RUNS_READ_SIZE = 8192
+
+# Maximum number of runs merged at once
+RUNS_MERGE_FAN_IN = 64
+
+
+# Function sorting the given pairs & spilling them to a temporary file
+def spill_run(pairs, folder=None):
+    pairs.sort()
+
+    pack = RUNS_PAIR_STRUCT.pack
+
+    run = tempfile.TemporaryFile(dir=folder)
+    run.write(''.join(pack(a, b) for a, b in pairs))
+    run.seek(0)
+
+    return run
+
+
+# Function iterating over the pairs of a run
+def run_iter(run):
+    unpack_from = RUNS_PAIR_STRUCT.unpack_from
+
+    while True:
+        data = run.read(RUNS_READ_SIZE * RUNS_PAIR_SIZE)
+
+        if not data:
+            break
+
+        for offset in xrange(0, len(data), RUNS_PAIR_SIZE):
+            yield unpack_from(data, offset)
+
+
+# Function merging the given runs into a single sorted iterator of pairs
+def merge_runs(runs):
+    return heapq.merge(*[run_iter(run) for run in runs])
+
+
+# Function merging the given runs into a new run
+def merge_to_run(runs, folder=None):
+    pack = RUNS_PAIR_STRUCT.pack
+
+    run = tempfile.TemporaryFile(dir=folder)
+    buffer = []
+
+    for a, b in merge_runs(runs):
+        buffer.append(pack(a, b))
+
+        if len(buffer) >= RUNS_READ_SIZE:
+            run.write(''.join(buffer))
+            buffer = []
+
+    run.write(''.join(buffer))
+    run.seek(0)
+
+    return run
+
+
+# Class holding the leveled runs of a single sort
+class SortedRuns(object):
+
+    def __init__(self, folder=None, fan_in=None):
+
+        # Properties
+        self.folder = folder
+        self.fan_in = fan_in or RUNS_MERGE_FAN_IN
+
+        # Runs, as (level, run) tuples, the levels being decreasing
+        self.runs = []
+
+    def __len__(self):
+        return len(self.runs)
+
+    # Method merging the last given number of runs into a single run
+    def __merge_tail(self, count, level):
+        tail = self.runs[-count:]
+        run = merge_to_run([run for _, run in tail], self.folder)
+
+        for _, merged_run in tail:
+            merged_run.close()
+
+        self.runs[-count:] = [(level, run)]
+
+    # Method sorting the given pairs & spilling them to a new run
+    def spill(self, pairs):
+        self.runs.append((0, spill_run(pairs, self.folder)))
+
+        # Merging the runs of the last level while there are enough of them
+        while len(self.runs) >= self.fan_in:
+            level = self.runs[-1][0]
+
+            if any(run_level != level for run_level, _ in self.runs[-self.fan_in:]):
+                break
+
+            self.__merge_tail(self.fan_in, level + 1)
+
+    # Method returning a single sorted iterator of the pairs
+    # NOTE: the smallest runs are merged first until few enough remain
+    def merge(self):
+        while len(self.runs) > self.fan_in:
+            count = min(self.fan_in, len(self.runs) - self.fan_in + 1)
+            self.__merge_tail(count, self.runs[-count][0])
+
+        return merge_runs([run for _, run in self.runs])
+
+    def close(self):
+        for _, run in self.runs:
+            run.close()
+
+        self.runs = []
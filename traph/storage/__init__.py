@@ -3,5 +3,7 @@
 # =============================================================================
 #
 from traph.storage.file import FileStorage
+from traph.storage.cached_file import CachedFileStorage
 from traph.storage.memory import MemoryStorage
 from traph.storage.memmap import MemMapStorage
+from traph.storage.journal import Journal
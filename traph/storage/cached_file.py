@@ -0,0 +1,255 @@
+# =============================================================================
+# Cached File Storage Class
+# =============================================================================
+#
+# Class adding a write-back block cache on top of the FileStorage so that hot
+# blocks (typically the root & the upper levels of the trie) stay in RAM and
+# so that a single write operation does not cost dozens of syscalls.
+#
+# The cache approximates a LRU eviction policy using two generations of
+# blocks: blocks are always accessed in the young generation and, when the
+# young generation is full, the old one is evicted and replaced by the young
+# one. This means that blocks not accessed during a whole generation will be
+# evicted while relying only on python dicts, which is way faster than
+# maintaining an exact LRU order in python.
+#
+# Dirty blocks are only written to the file when evicted or when flushing, in
+# which case they are written in sorted order while coalescing contiguous
+# blocks into a single write.
+#
+# When given a journal, the storage never writes a block in place before its
+# batch has been committed: evicted dirty blocks are spilled to the journal
+# instead and are read back from there until the next checkpoint.
+#
+import os
+from traph.storage.file import FileStorage
+
+# Default number of blocks kept in the cache
+DEFAULT_CACHE_SIZE = 4096
+
+
+# Main class
+class CachedFileStorage(FileStorage):
+
+    def __init__(self, block_size, file, cache_size=DEFAULT_CACHE_SIZE,
+                 journal=None):
+        super(CachedFileStorage, self).__init__(block_size, file)
+
+        if cache_size < 2:
+            raise ValueError('Cache size should be at least 2.')
+
+        # Properties
+        self.cache_size = cache_size
+        self.generation_size = cache_size // 2
+        self.young = {}
+        self.old = {}
+        self.dirty = set()
+
+        # Journal & offsets of the blocks spilled to the journal
+        self.journal = journal
+        self.spilled = {}
+
+        if journal is not None:
+            self.id = journal.register(self)
+
+        # NOTE: we need to track the logical length & cursor of the file
+        # since the actual file lags behind until dirty blocks are flushed
+        self.length = super(CachedFileStorage, self).__len__()
+        self.position = 0
+
+    def __len__(self):
+        return self.length
+
+    # Method writing the given (block, data) pairs to the file
+    def __write_blocks(self, blocks):
+        run_block = None
+        run = []
+
+        for block, data in sorted(blocks):
+
+            # Coalescing contiguous blocks
+            if run and block == run_block + len(run) * self.block_size:
+                run.append(data)
+                continue
+
+            if run:
+                self.file.seek(run_block)
+                self.file.write(''.join(run))
+
+            run_block = block
+            run = [data]
+
+        if run:
+            self.file.seek(run_block)
+            self.file.write(''.join(run))
+
+    # Method caching a block in the young generation
+    def __cache(self, block, data):
+        young = self.young
+
+        young[block] = data
+
+        if len(young) < self.generation_size:
+            return
+
+        # Evicting the old generation
+        old = self.old
+
+        if self.dirty:
+            evicted = [(b, d) for b, d in old.iteritems() if b in self.dirty]
+
+            if evicted:
+                if self.journal is not None:
+                    for b, d in evicted:
+                        self.spilled[b] = self.journal.append(self.id, b, d)
+                else:
+                    self.__write_blocks(evicted)
+
+                self.dirty.difference_update(b for b, _ in evicted)
+
+        self.old = young
+        self.young = {}
+
+    # Method reading a block in the cache or the file
+    def read(self, block=None):
+
+        # Emulating the file's cursor
+        if block is None:
+            block = self.position
+
+        self.position = block + self.block_size
+
+        data = self.young.get(block)
+
+        if data is not None:
+            return data
+
+        data = self.old.pop(block, None)
+
+        if data is None:
+            if block + self.block_size > self.length:
+                return None
+
+            if block in self.spilled:
+                data = self.journal.read(self.spilled[block], self.block_size)
+            else:
+                self.file.seek(block)
+                data = self.file.read(self.block_size)
+
+        self.__cache(block, data)
+
+        return data
+
+    # Method reading several contiguous blocks in a single I/O
+    def read_blocks(self, block, count):
+        block_size = self.block_size
+        end = min(block + block_size * count, self.length)
+
+        if end <= block:
+            return None
+
+        blocks = xrange(block, end, block_size)
+        young = self.young
+        old = self.old
+
+        # NOTE: the chunk is read from the file only if some block is missing
+        # and the cached blocks, which might be dirty, take precedence
+        if all(b in young or b in old for b in blocks):
+            data = [young[b] if b in young else old[b] for b in blocks]
+        else:
+            self.file.seek(block)
+            raw = self.file.read(end - block)
+            spilled = self.spilled
+
+            data = [
+                young.get(b) or old.get(b) or (
+                    self.journal.read(spilled[b], block_size) if b in spilled
+                    else raw[b - block:b - block + block_size]
+                )
+                for b in blocks
+            ]
+
+        self.position = end
+
+        return ''.join(data)
+
+    # Method writing a node (or several contiguous nodes) in the cache
+    def write(self, data, block=None):
+        if block is None:
+            block = self.length
+
+        block_size = self.block_size
+        self.position = block + len(data)
+
+        if self.position > self.length:
+            self.length = self.position
+
+        for offset in xrange(0, len(data), block_size):
+            b = block + offset
+
+            self.old.pop(b, None)
+            self.spilled.pop(b, None)
+            self.dirty.add(b)
+            self.__cache(b, data[offset:offset + block_size])
+
+        return block
+
+    # Method returning the dirty (block, data) pairs still in the cache
+    def dirty_items(self):
+        young = self.young
+        old = self.old
+
+        return [(b, young[b] if b in young else old[b]) for b in self.dirty]
+
+    # Method writing the journaled blocks in place, once committed
+    def checkpoint(self):
+        blocks = self.dirty_items()
+
+        for b, offset in self.spilled.iteritems():
+            blocks.append((b, self.journal.read(offset, self.block_size)))
+
+        if blocks:
+            self.__write_blocks(blocks)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+        self.dirty.clear()
+        self.spilled.clear()
+
+    # Method dropping the cached copy of the given block, or of every block,
+    # because another process may have written the file
+    # NOTE: this is only meant to be used by readers, having no dirty blocks
+    def refresh(self, block=None):
+        if block is not None:
+            self.young.pop(block, None)
+            self.old.pop(block, None)
+            return
+
+        self.young = {}
+        self.old = {}
+        self.length = super(CachedFileStorage, self).__len__()
+
+    # Method returning whether the storage holds blocks of an uncommitted
+    # batch, either dirty in the cache or spilled to the journal
+    def is_pending(self):
+        return bool(self.dirty or self.spilled)
+
+    # Method writing the dirty blocks to the file
+    # NOTE: with a journal, the dirty blocks are only written in place once
+    # their whole batch is committed, which is up to the journal's owner
+    def flush(self):
+        if self.journal is not None:
+            self.file.flush()
+            return
+
+        if self.dirty:
+            self.__write_blocks(self.dirty_items())
+            self.dirty.clear()
+
+        self.file.flush()
+
+    # Method returning a map
+    def map(self):
+        self.flush()
+
+        return super(CachedFileStorage, self).map()
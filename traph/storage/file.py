@@ -34,6 +34,12 @@ class FileStorage(object):
 
         return False
 
+    # Method refreshing the data, which is a no-op since every read hits the
+    # file anyway
+    # NOTE: this only holds if the file is unbuffered, as readers' files are
+    def refresh(self, block=None):
+        pass
+
     # Method reading a block in the file and returning the contained node
     def read(self, block=None):
 
@@ -44,6 +50,19 @@ class FileStorage(object):
 
         return data or None
 
+    # Method returning the underlying buffer, if any, so that it can be
+    # read in place
+    def buffer(self):
+        return None
+
+    # Method reading several contiguous blocks in a single I/O
+    def read_blocks(self, block, count):
+        self.file.seek(block)
+
+        data = self.file.read(self.block_size * count)
+
+        return data or None
+
     # Method writing a node
     def write(self, data, block=None):
         if block is not None:
@@ -54,10 +73,14 @@ class FileStorage(object):
         self.file.write(data)
 
         # TODO: can be avoided if we do not append
-        block = self.file.tell() - self.block_size
+        block = self.file.tell() - len(data)
 
         return block
 
+    # Method flushing the file's buffer
+    def flush(self):
+        self.file.flush()
+
     # Method returning a map
     def map(self):
         return MemMapStorage(self.block_size, self.file)
@@ -0,0 +1,171 @@
+# =============================================================================
+# Journal Class
+# =============================================================================
+#
+# Class representing a write-ahead journal shared by the cached file
+# storages of a Traph so that a whole batch of writes is either entirely
+# applied to the files or not at all, even in case of a crash.
+#
+# Dirty blocks stay in the storages' caches (or are spilled to the journal
+# when evicted) until the journal is committed, in which case:
+#
+#   1) Every dirty block is appended to the journal, followed by a commit
+#      record holding a checksum of the batch, and the journal is fsynced.
+#   2) The blocks are written in place, the files being fsynced.
+#   3) The journal is truncated.
+#
+# When opening the Traph, a committed batch found in the journal is replayed
+# while an uncommitted one is discarded.
+#
+import os
+import struct
+import zlib
+
+# Binary format
+# -
+# Each record is made of the storage's id, the block & the data's length,
+# followed by the data itself. The commit record has a special storage id,
+# the number of records & the batch's checksum instead.
+JOURNAL_RECORD_FORMAT = '<BQI'
+JOURNAL_RECORD_STRUCT = struct.Struct(JOURNAL_RECORD_FORMAT)
+JOURNAL_RECORD_SIZE = JOURNAL_RECORD_STRUCT.size
+JOURNAL_COMMIT = 255
+
+
+# Exceptions
+class JournalException(Exception):
+    pass
+
+
+# Main class
+class Journal(object):
+
+    def __init__(self, file):
+
+        # Properties
+        self.file = file
+        self.storages = []
+        self.nb_records = 0
+        self.checksum = 0
+
+        self.file.seek(0, os.SEEK_END)
+        self.length = self.file.tell()
+
+    # Method registering a storage & returning its id
+    def register(self, storage):
+        if len(self.storages) >= JOURNAL_COMMIT:
+            raise JournalException('Too many storages.')
+
+        self.storages.append(storage)
+
+        return len(self.storages) - 1
+
+    # Method appending a record & returning the offset of its data
+    def append(self, storage_id, block, data):
+        record = JOURNAL_RECORD_STRUCT.pack(storage_id, block, len(data)) + data
+
+        self.file.seek(self.length)
+        self.file.write(record)
+
+        self.nb_records += 1
+        self.checksum = zlib.crc32(record, self.checksum)
+        self.length += len(record)
+
+        return self.length - len(data)
+
+    # Method reading some data from the journal
+    def read(self, offset, length):
+        self.file.seek(offset)
+
+        return self.file.read(length)
+
+    # Method truncating the journal
+    def truncate(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.nb_records = 0
+        self.checksum = 0
+        self.length = 0
+
+    # Method returning whether a batch is in progress, i.e. whether some
+    # storage holds blocks which are not committed yet
+    def is_pending(self):
+        return any(storage.is_pending() for storage in self.storages)
+
+    # Method durably logging the storages' dirty blocks
+    def log(self):
+        for storage_id, storage in enumerate(self.storages):
+            for block, data in storage.dirty_items():
+                self.append(storage_id, block, data)
+
+        if not self.nb_records:
+            return False
+
+        self.file.seek(self.length)
+        self.file.write(JOURNAL_RECORD_STRUCT.pack(
+            JOURNAL_COMMIT,
+            self.nb_records,
+            self.checksum & 0xffffffff
+        ))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        return True
+
+    # Method committing the current batch
+    def commit(self):
+        if not self.log():
+            return
+
+        for storage in self.storages:
+            storage.checkpoint()
+
+        self.truncate()
+
+    # Method replaying the committed batch, if any, on the given files (in
+    # the storages' registration order)
+    def replay(self, files):
+        self.file.seek(0)
+
+        records = []
+        checksum = 0
+        committed = False
+
+        while True:
+            header = self.file.read(JOURNAL_RECORD_SIZE)
+
+            if len(header) < JOURNAL_RECORD_SIZE:
+                break
+
+            storage_id, block, length = JOURNAL_RECORD_STRUCT.unpack(header)
+
+            if storage_id == JOURNAL_COMMIT:
+                committed = (
+                    block == len(records) and
+                    length == checksum & 0xffffffff
+                )
+                break
+
+            data = self.file.read(length)
+
+            if len(data) < length or storage_id >= len(files):
+                break
+
+            checksum = zlib.crc32(header + data, checksum)
+            records.append((storage_id, block, data))
+
+        if committed:
+            for storage_id, block, data in records:
+                files[storage_id].seek(block)
+                files[storage_id].write(data)
+
+            for f in files:
+                f.flush()
+                os.fsync(f.fileno())
+
+        self.truncate()
+
+        return len(records) if committed else 0
@@ -4,7 +4,16 @@
 #
 # Class abstracting reading the given file using python's mmap module
 #
+# NOTE: the map is read-only, which means several processes can share the
+# same pages of the OS cache.
+#
 import mmap
+import os
+
+
+# Exceptions
+class MemMapStorageException(Exception):
+    pass
 
 
 # Main class
@@ -17,10 +26,42 @@ class MemMapStorage(object):
         self.file = file
         self.map = mmap.mmap(file.fileno(), access=mmap.ACCESS_READ, length=0)
 
+    def __len__(self):
+        return len(self.map)
+
+    # Method returning the number of blocks
+    def count_blocks(self):
+        return self.__len__() / self.block_size
+
+    # Method returning whether the file is corrupted
+    def check_for_corruption(self):
+        return bool(self.__len__() % self.block_size)
+
     # Method reading a block in the map and returning the contained node
     def read(self, block):
         return self.map[block:block + self.block_size] or None
 
+    # Method returning the map so that it can be read in place
+    def buffer(self):
+        return self.map
+
+    # Method reading several contiguous blocks in the map
+    def read_blocks(self, block, count):
+        return self.map[block:block + self.block_size * count] or None
+
+    # Method remapping the file if it was resized by another process
+    # NOTE: the map always reflects the file's current content otherwise
+    def refresh(self, block=None):
+        if os.fstat(self.file.fileno()).st_size == len(self.map):
+            return
+
+        self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), access=mmap.ACCESS_READ, length=0)
+
+    # Method refusing to write since the map is read-only
+    def write(self, data, block=None):
+        raise MemMapStorageException('Cannot write in a read-only memory map.')
+
     # Method releasing the map from memory
     def release(self):
         self.map.close()
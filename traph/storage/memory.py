@@ -22,6 +22,14 @@ class MemoryStorage(object):
     def count_blocks(self):
         return self.__len__() / self.block_size
 
+    # Method returning whether the data is corrupted
+    def check_for_corruption(self):
+        return bool(self.__len__() % self.block_size)
+
+    # Method refreshing the data, which is a no-op for this storage
+    def refresh(self, block=None):
+        pass
+
     # Method clearing the memory
     def clear(self):
         self.array = bytearray()
@@ -35,14 +43,22 @@ class MemoryStorage(object):
         except:
             raise
 
+    # Method returning the bytearray so that it can be read in place
+    def buffer(self):
+        return self.array
+
+    # Method reading several contiguous blocks in the bytearray
+    def read_blocks(self, block, count):
+        return self.array[block:block + self.block_size * count] or None
+
     # Method writing nodes to the bytearray
     def write(self, data, block=None):
         if block is None:
             self.array.extend(data)
 
             # TODO: cache the length maybe?
-            block = len(self.array) - self.block_size
+            block = len(self.array) - len(data)
         else:
-            self.array[block:block + self.block_size] = data
+            self.array[block:block + len(data)] = data
 
         return block
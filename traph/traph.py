@@ -8,14 +8,61 @@ import errno
 import heapq
 import os
 import re
+import shutil
+import tempfile
+import time
 import warnings
+from array import array
 from collections import defaultdict, Counter
+from functools import wraps
+from inspect import isgeneratorfunction
+from itertools import groupby
+from operator import itemgetter
 from traph_write_report import TraphWriteReport
 from traph_iterator_state import TraphIteratorState, run_iterator
-from storage import FileStorage, MemoryStorage
+from storage import FileStorage, CachedFileStorage, MemoryStorage, MemMapStorage, Journal
+from storage.cached_file import DEFAULT_CACHE_SIZE
 from lru_trie import LRUTrie, LRU_TRIE_NODE_BLOCK_SIZE
-from link_store import LinkStore, LINK_STORE_NODE_BLOCK_SIZE
+from lru_trie.node import LRU_TRIE_FIRST_DATA_BLOCK
+from link_store import LinkStore, LINK_STORE_BLOCK_SIZE
+from webentity_index import WebentityIndex, WEBENTITY_INDEX_BLOCK_SIZE
+from webentity_graph import WebentityGraph
+from parallel import webentity_edges_iter
+from arrays import lru_trie_arrays, link_store_csr, require_numpy
 from helpers import lru_variations
+from runs import SortedRuns
+from instrumentation import Instrumentation, stats_difference
+
+
+# Delay, in seconds, before a reader checks again whether the writer is done
+# with its current batch
+TRAPH_SNAPSHOT_POLL_DELAY = 0.005
+
+# Maximum time, in seconds, a reader waits for a consistent snapshot before
+# giving up, the writer having possibly crashed in the middle of a batch
+TRAPH_SNAPSHOT_TIMEOUT = 10.0
+
+
+# Typecode of the arrays storing node indices (i.e. block // block size)
+TRAPH_NODE_INDEX_TYPECODE = 'L'
+
+# Number of inlinks kept in RAM by the streaming crawl indexation before being
+# spilled to a sorted run on disk
+TRAPH_STREAM_RUN_SIZE = 262144
+
+# Maximum number of LRU => block entries memoized by the streaming crawl
+# indexation, the memo being dropped each time it is full
+TRAPH_STREAM_PAGES_MEMO_SIZE = 262144
+
+
+# Name of the folder in which a compaction writes the new files, & of the
+# file marking them as complete
+TRAPH_COMPACTION_FOLDER = 'compaction'
+TRAPH_COMPACTION_MARKER = 'ready'
+
+# Files swapped by a compaction & files derived from the former ones
+TRAPH_COMPACTED_FILES = ('lru_trie.dat', 'link_store.dat')
+TRAPH_COMPACTION_STALE_FILES = ('webentity_index.dat', 'journal.dat')
 
 
 # Exceptions
@@ -23,6 +70,51 @@ class TraphException(Exception):
     pass
 
 
+# Function flushing the given file or folder to disk
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Function finishing the compaction found in the given folder, if complete,
+# by moving the new files in place & dropping the stale ones, or else
+# discarding it. Returns whether the files were swapped.
+# NOTE: every step can safely be run again if interrupted
+def recover_compaction(folder):
+    compaction_folder = os.path.join(folder, TRAPH_COMPACTION_FOLDER)
+
+    if not os.path.isdir(compaction_folder):
+        return False
+
+    complete = os.path.isfile(os.path.join(compaction_folder, TRAPH_COMPACTION_MARKER))
+
+    if complete:
+
+        # NOTE: the stale files are dropped first so that readers following
+        # the swapped files never open them again
+        for name in TRAPH_COMPACTION_STALE_FILES:
+            path = os.path.join(folder, name)
+
+            if os.path.isfile(path):
+                os.remove(path)
+
+        for name in TRAPH_COMPACTED_FILES:
+            path = os.path.join(compaction_folder, name)
+
+            if os.path.isfile(path):
+                os.rename(path, os.path.join(folder, name))
+
+        fsync_path(folder)
+
+    shutil.rmtree(compaction_folder)
+
+    return complete
+
+
 # Main class
 class Traph(object):
 
@@ -31,11 +123,51 @@ class Traph(object):
     # =========================================================================
     def __init__(self, folder=None, overwrite=False, encoding='utf-8',
                  debug=False, default_webentity_creation_rule=None,
-                 webentity_creation_rules=None):
+                 webentity_creation_rules=None, cache_size=None,
+                 journal=False, mode='w', mmap=False, shared=False,
+                 iterator_budget=None, instrument=False):
 
         # Handling encoding
         self.encoding = encoding
 
+        # Time budget, in seconds, of the cooperative iterators' slices
+        # NOTE: if None, iterators yield every N iterations instead
+        self.iterator_budget = iterator_budget
+
+        # Access mode
+        # NOTE: in read-only mode, the files may be memory mapped so that
+        # several processes can share the OS page cache
+        if mode not in ('r', 'w'):
+            raise TraphException('Invalid mode "%s", should be either "r" or "w".' % mode)
+
+        self.read_only = mode == 'r'
+        self.mmap = mmap
+
+        if self.read_only and (not folder or overwrite or journal):
+            raise TraphException('Read-only mode needs an existing folder & cannot be used with overwrite or journal.')
+
+        if mmap and not self.read_only:
+            raise TraphException('Memory maps can only be used in read-only mode.')
+
+        # Whether the writer should publish its batches to concurrent readers
+        # NOTE: readers always follow the header's generation counter
+        if shared and (not folder or self.read_only):
+            raise TraphException('Only a writer having a folder can be shared.')
+
+        # NOTE: a journaled batch only reaches the files when committed as a
+        # whole, while a shared writer publishes its batches as it goes
+        if shared and journal:
+            raise TraphException('A shared Traph cannot be journaled.')
+
+        self.shared = shared
+
+        # Number of blocks each file storage should keep in its cache
+        # NOTE: the journal needs the cache to hold the batches' blocks
+        if journal and not cache_size:
+            cache_size = DEFAULT_CACHE_SIZE
+
+        self.cache_size = cache_size
+
         # Debugging mode
         if debug:
             if not default_webentity_creation_rule:
@@ -56,16 +188,24 @@ class Traph(object):
         self.folder = folder
         self.lru_trie_file = None
         self.link_store_file = None
+        self.webentity_index_file = None
+        self.journal_file = None
         self.lru_trie_path = None
         self.link_store_path = None
+        self.webentity_index_path = None
+        self.journal_path = None
+        self.journal = None
 
         create = overwrite
+        build_webentity_index = False
         self.in_memory = not bool(folder)
 
         # Solving paths
         if not self.in_memory:
             self.lru_trie_path = os.path.join(folder, 'lru_trie.dat')
             self.link_store_path = os.path.join(folder, 'link_store.dat')
+            self.webentity_index_path = os.path.join(folder, 'webentity_index.dat')
+            self.journal_path = os.path.join(folder, 'journal.dat')
 
             # Ensuring the given folder exists
             try:
@@ -76,6 +216,11 @@ class Traph(object):
                 else:
                     raise
 
+            # Finishing or discarding an interrupted compaction
+            # NOTE: in read-only mode, the compaction belongs to the writer
+            if not self.read_only:
+                recover_compaction(folder)
+
             # Testing existence of files
             lru_trie_file_exists = os.path.isfile(self.lru_trie_path)
             link_store_file_exists = os.path.isfile(self.link_store_path)
@@ -94,18 +239,59 @@ class Traph(object):
             # Do we need to create the files for the first time?
             create = overwrite or (not lru_trie_file_exists and not link_store_file_exists)
 
+            if create and self.read_only:
+                raise TraphException('Cannot open a missing Traph in read-only mode.')
+
             flags = 'wb+' if create else 'rb+'
+            buffering = -1
 
-            self.lru_trie_file = open(self.lru_trie_path, flags)
-            self.link_store_file = open(self.link_store_path, flags)
+            # NOTE: readers' files are unbuffered so that they never serve
+            # stale bytes once a shared writer published a new generation
+            if self.read_only:
+                flags = 'rb'
+                buffering = 0
+
+            self.lru_trie_file = open(self.lru_trie_path, flags, buffering)
+            self.link_store_file = open(self.link_store_path, flags, buffering)
+
+            # NOTE: the webentity index can be rebuilt from the trie if missing
+            build_webentity_index = (
+                not create and
+                not os.path.isfile(self.webentity_index_path)
+            )
+
+            # NOTE: in read-only mode, a missing index is rebuilt in memory
+            if not (self.read_only and build_webentity_index):
+                self.webentity_index_file = open(
+                    self.webentity_index_path,
+                    'wb+' if create or build_webentity_index else flags,
+                    buffering
+                )
+
+            # Replaying the last committed batch, if any
+            # NOTE: in read-only mode, the journal belongs to the writer
+            if not self.read_only and os.path.isfile(self.journal_path):
+                self.journal_file = open(self.journal_path, 'wb+' if create else 'rb+')
+
+                Journal(self.journal_file).replay([
+                    self.lru_trie_file,
+                    self.link_store_file,
+                    self.webentity_index_file
+                ])
+
+            if journal:
+                if not self.journal_file:
+                    self.journal_file = open(self.journal_path, 'wb+')
+
+                self.journal = Journal(self.journal_file)
 
-            self.lru_trie_storage = FileStorage(
+            self.lru_trie_storage = self.__file_storage(
                 LRU_TRIE_NODE_BLOCK_SIZE,
                 self.lru_trie_file
             )
 
-            self.links_store_storage = FileStorage(
-                LINK_STORE_NODE_BLOCK_SIZE,
+            self.links_store_storage = self.__file_storage(
+                LINK_STORE_BLOCK_SIZE,
                 self.link_store_file
             )
 
@@ -120,16 +306,52 @@ class Traph(object):
                     'File corrupted: `link_store.dat`'
                 )
 
+            self.webentity_index_storage = self.__webentity_index_storage()
+
+            if not create and self.webentity_index_storage.check_for_corruption():
+                raise TraphException(
+                    'File corrupted: `webentity_index.dat`'
+                )
+
         else:
             self.lru_trie_storage = MemoryStorage(LRU_TRIE_NODE_BLOCK_SIZE)
-            self.links_store_storage = MemoryStorage(LINK_STORE_NODE_BLOCK_SIZE)
+            self.links_store_storage = MemoryStorage(LINK_STORE_BLOCK_SIZE)
+            self.webentity_index_storage = MemoryStorage(WEBENTITY_INDEX_BLOCK_SIZE)
 
         # LRU Trie initialization
         self.lru_trie = LRUTrie(self.lru_trie_storage, encoding=encoding)
 
+        # NOTE: an odd generation means that a shared writer crashed in the
+        # middle of a batch, its readers waiting until an even one is written
+        if not self.read_only and self.lru_trie.header.is_being_written():
+            self.lru_trie.header.increment_generation()
+            self.lru_trie.header.write()
+            self.__commit()
+
         # Link Store initialization
         self.link_store = LinkStore(self.links_store_storage)
 
+        if self.link_store.is_outdated():
+            raise TraphException(
+                'Outdated format: `link_store.dat` should be rebuilt using the TraphBuilder.'
+            )
+
+        # Webentity Index initialization
+        self.webentity_index = WebentityIndex(self.webentity_index_storage)
+
+        if build_webentity_index:
+            self.__build_webentity_index()
+
+        # Webentity graph is computed lazily & then maintained in RAM
+        self.webentity_graph = None
+        self.webentity_graph_is_stale = False
+
+        # Opt-in instrumentation of the hot paths
+        self.instrumentation = None
+
+        if instrument:
+            self.enable_instrumentation()
+
         # Webentity creation rules are stored in RAM
         if not debug:
             self.default_webentity_creation_rule = re.compile(
@@ -145,6 +367,225 @@ class Traph(object):
     # =========================================================================
     # Internal methods
     # =========================================================================
+    # Method (re)installing the probes on the current storages & structures
+    def __instrument(self):
+        instrumentation = self.instrumentation
+        instrumentation.uninstall()
+
+        instrumentation.instrument_storage(self.lru_trie_storage, 'lru_trie')
+        instrumentation.instrument_storage(self.links_store_storage, 'link_store')
+        instrumentation.instrument_storage(self.webentity_index_storage, 'webentity_index')
+        instrumentation.instrument_lru_trie(self.lru_trie)
+        instrumentation.instrument_link_store(self.link_store)
+
+    # Method opening the files & the structures again, after a clear or a
+    # compaction (or, for a reader, once a compaction swapped the files)
+    def __reopen(self, create=False):
+        if self.read_only:
+            self.lru_trie_file = open(self.lru_trie_path, 'rb', 0)
+            self.link_store_file = open(self.link_store_path, 'rb', 0)
+
+            # NOTE: the writer may not have rebuilt the index yet
+            self.webentity_index_file = None
+
+        elif not self.in_memory:
+            flags = 'wb+' if create else 'rb+'
+
+            self.lru_trie_file = open(self.lru_trie_path, flags)
+            self.link_store_file = open(self.link_store_path, flags)
+
+            # NOTE: the webentity index is always rebuilt
+            self.webentity_index_file = open(self.webentity_index_path, 'wb+')
+
+            if self.journal is not None:
+                self.journal_file = open(self.journal_path, 'wb+')
+                self.journal = Journal(self.journal_file)
+
+        if not self.in_memory:
+            self.lru_trie_storage = self.__file_storage(
+                LRU_TRIE_NODE_BLOCK_SIZE,
+                self.lru_trie_file
+            )
+
+            self.links_store_storage = self.__file_storage(
+                LINK_STORE_BLOCK_SIZE,
+                self.link_store_file
+            )
+
+            self.webentity_index_storage = self.__webentity_index_storage()
+
+        # LRU Trie re-initialization
+        self.lru_trie = LRUTrie(self.lru_trie_storage, encoding=self.encoding)
+
+        # Link Store re-initialization
+        self.link_store = LinkStore(self.links_store_storage)
+
+        # Webentity Index re-initialization
+        self.webentity_index = WebentityIndex(self.webentity_index_storage)
+        self.webentity_graph = None
+
+        if self.instrumentation is not None:
+            self.__instrument()
+
+    def __file_storage(self, block_size, file):
+        if self.mmap:
+
+            # NOTE: one cannot map an empty file
+            if not os.fstat(file.fileno()).st_size:
+                return MemoryStorage(block_size)
+
+            return MemMapStorage(block_size, file)
+
+        if self.cache_size:
+            return CachedFileStorage(
+                block_size,
+                file,
+                cache_size=self.cache_size,
+                journal=self.journal
+            )
+
+        return FileStorage(block_size, file)
+
+    def __webentity_index_storage(self):
+        if self.webentity_index_file is None:
+            return MemoryStorage(WEBENTITY_INDEX_BLOCK_SIZE)
+
+        if self.mmap:
+            return self.__file_storage(
+                WEBENTITY_INDEX_BLOCK_SIZE,
+                self.webentity_index_file
+            )
+
+        # NOTE: the index is written in small random writes, which is why
+        # it does not use the cache, unless it needs to be journaled
+        if self.journal is not None:
+            return self.__file_storage(
+                WEBENTITY_INDEX_BLOCK_SIZE,
+                self.webentity_index_file
+            )
+
+        return FileStorage(WEBENTITY_INDEX_BLOCK_SIZE, self.webentity_index_file)
+
+    # Method raising if the Traph was opened in read-only mode & beginning
+    # a batch of writes otherwise
+    def __ensure_writable(self):
+        if self.read_only:
+            raise TraphException('Cannot write: the Traph was opened in read-only mode.')
+
+        self.__begin()
+
+    # Method flagging the files as being written, through an odd generation,
+    # before touching them so that concurrent readers know they should wait
+    def __begin(self):
+        if not self.shared:
+            return
+
+        header = self.lru_trie.header
+
+        if header.is_being_written():
+            return
+
+        header.increment_generation()
+        header.write()
+        self.lru_trie_storage.flush()
+
+    # Method writing the pending blocks & then publishing a new, even,
+    # generation so that concurrent readers can see the batch
+    def __publish(self):
+        if not self.shared or self.lru_trie_file.closed:
+            return
+
+        header = self.lru_trie.header
+
+        if not header.is_being_written():
+            return
+
+        self.links_store_storage.flush()
+        self.webentity_index_storage.flush()
+        self.lru_trie_storage.flush()
+
+        header.increment_generation()
+        header.write()
+        self.lru_trie_storage.flush()
+
+    # Method publishing the writes done so far when an iterator yields, so
+    # that readers are not kept waiting by a long batch
+    # NOTE: a shared Traph is never journaled, so batches need not be atomic
+    def __pause(self):
+        self.__publish()
+
+    # Method returning the state of a cooperative iterator, whose slices last
+    # the given budget or else the Traph's one. Iterators writing a batch
+    # pause it each time they yield & begin it again once resumed.
+    def __iterator_state(self, budget=None, writes=False):
+        if budget is None:
+            budget = self.iterator_budget
+
+        if not writes:
+            return TraphIteratorState(budget=budget)
+
+        return TraphIteratorState(
+            budget=budget,
+            on_yield=self.__pause,
+            on_resume=self.__begin
+        )
+
+    # Method stamping the trie's header, after a clear or a compaction, with
+    # the former generation, so that it keeps increasing, & the epoch
+    # following the former one so that readers drop their memoized LRUs, the
+    # blocks holding other pages now
+    def __renew_header(self, generation, epoch):
+        header = self.lru_trie.header
+        header.set_generation(generation)
+        header.set_epoch(epoch + 1)
+        header.write()
+
+    # Method returning whether the files opened by a reader were swapped by
+    # a compaction since
+    def __files_were_swapped(self):
+        for f, path in ((self.lru_trie_file, self.lru_trie_path), (self.link_store_file, self.link_store_path)):
+            try:
+                if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    # Method committing the current batch of writes, if journaled
+    def __commit(self):
+        if self.journal is not None:
+            self.journal.commit()
+
+        self.__publish()
+
+    # Decorator of the methods writing a batch, publishing an even generation
+    # even if the batch raised so that concurrent readers are not kept waiting
+    # NOTE: a raising journaled batch is not committed, its blocks being
+    # discarded when the Traph is closed
+    def __batch(method):
+        if isgeneratorfunction(method):
+            def batch(self, *args, **kwargs):
+                try:
+                    for state in method(self, *args, **kwargs):
+                        yield state
+                finally:
+                    self.__publish()
+        else:
+            def batch(self, *args, **kwargs):
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    self.__publish()
+
+        return wraps(method)(batch)
+
+    @__batch
+    def __build_webentity_index(self):
+        self.__begin()
+        self.webentity_index.build(self.lru_trie)
+        self.__commit()
+
     def __encode(self, string):
         if isinstance(string, str):
             return string
@@ -186,8 +627,81 @@ class Traph(object):
                 node.set_webentity(webentity_id)
                 node.write()
 
+                self.__index_webentity_prefix(node, prefix)
+
             return webentity_id, valid_prefixes_index.keys()
 
+    # Method updating the webentity index for the pages of the given prefix
+    def __index_webentity_prefix(self, node, prefix):
+        weid = node.webentity() if node.has_webentity() else None
+
+        # The pages may now belong to an upper webentity
+        if weid is None:
+            for parent in self.lru_trie.node_parents_iter(node):
+                if parent.has_webentity():
+                    weid = parent.webentity()
+                    break
+
+        for page_node, _ in self.lru_trie.webentity_dfs_iter(node, prefix):
+            if not page_node.is_page():
+                continue
+
+            current_weid = self.webentity_index.webentity(page_node.block)
+
+            if current_weid == weid:
+                continue
+
+            self.__move_webentity_links(page_node, current_weid, weid)
+            self.webentity_index.set_webentity(page_node.block, weid)
+
+    # Method moving the links of a page in the webentity graph
+    # NOTE: the page's webentity must still be the old one in the index
+    def __move_webentity_links(self, node, old_weid, new_weid):
+        graph = self.webentity_graph
+
+        if graph is None:
+            self.webentity_graph_is_stale = True
+            return
+
+        for out in (True, False):
+            if not node.has_links(out=out):
+                continue
+
+            for block, weight in self.link_store.links_iter(node.links(out=out)):
+
+                # NOTE: self links are found both in outlinks & inlinks
+                if block == node.block:
+                    if out:
+                        graph.add(old_weid, old_weid, -weight)
+                        graph.add(new_weid, new_weid, weight)
+
+                    continue
+
+                weid = self.webentity_index.webentity(block)
+
+                if out:
+                    graph.add(old_weid, weid, -weight)
+                    graph.add(new_weid, weid, weight)
+                else:
+                    graph.add(weid, old_weid, -weight)
+                    graph.add(weid, new_weid, weight)
+
+    # Method adding the given page links to the webentity graph
+    def __add_webentity_links(self, source_block, target_blocks):
+        graph = self.webentity_graph
+
+        if graph is None:
+            self.webentity_graph_is_stale = True
+            return
+
+        source_weid = self.webentity_index.webentity(source_block)
+
+        if not source_weid:
+            return
+
+        for target_block in target_blocks:
+            graph.add(source_weid, self.webentity_index.webentity(target_block), 1)
+
     def __create_webentity(self, prefix, expand=True, use_best_case=True):
         if expand:
             expanded_prefixes = self.expand_prefix(prefix)
@@ -228,6 +742,7 @@ class Traph(object):
 
         if history.page_was_created:
             report.nb_created_pages += 1
+            self.webentity_index.set_webentity(node.block, history.webentity)
 
         # Expected behavior is:
         #   1) Retrieve all creation rules triggered 'above' in the trie
@@ -272,10 +787,27 @@ class Traph(object):
         node.refresh()  # update node
         return node, report
 
+    def __get_page_degree(self, lru, out=True, weighted=False):
+        lru = self.__encode(lru)
+        node = self.lru_trie.lru_node(lru)
+
+        if not node or not node.is_page() or not node.has_links(out=out):
+            return 0
+
+        degree = 0
+
+        # NOTE: internal links are ignored
+        for block, weight in self.link_store.links_iter(node.links(out=out)):
+            if block != node.block:
+                degree += weight if weighted else 1
+
+        return degree
+
     # =========================================================================
     # Public interface
     # =========================================================================
-    def add_webentity_creation_rule_iter(self, rule_prefix, pattern, write_in_trie=True):
+    @__batch
+    def add_webentity_creation_rule_iter(self, rule_prefix, pattern, write_in_trie=True, budget=None):
         '''
         Note: write_in_trie has 2 effects: store the rule in the trie, and apply it to existing entities.
         write_in_trie=False is essentially for init on an existing traph.
@@ -291,9 +823,11 @@ class Traph(object):
         )
 
         report = TraphWriteReport()
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget, writes=True)
 
         if write_in_trie:
+            self.__ensure_writable()
+
             node, history = self.lru_trie.add_lru(rule_prefix)
             if not node:
                 raise TraphException('Prefix not in tree: ' + rule_prefix)
@@ -308,13 +842,19 @@ class Traph(object):
 
                 if state.should_yield():
                     yield state
+                    state.resume()
+
+            self.__commit()
 
         yield state.finalize(report)
 
     def add_webentity_creation_rule(self, rule_prefix, pattern, write_in_trie=True):
         return run_iterator(self.add_webentity_creation_rule_iter(rule_prefix, pattern, write_in_trie=write_in_trie))
 
+    @__batch
     def remove_webentity_creation_rule(self, rule_prefix):
+        self.__ensure_writable()
+
         rule_prefix = self.__encode(rule_prefix)
 
         if not self.webentity_creation_rules[rule_prefix]:
@@ -326,26 +866,34 @@ class Traph(object):
             raise TraphException('Prefix %s cannot be found' % (prefix))
         node.unflag_as_webentity_creation_rule()
         node.write()
+        self.__commit()
 
         return True
 
+    @__batch
     def create_webentity(self, prefixes):
         '''
         Note: will raise an error if any of the prefixes is already defining an existing entity
         '''
+        self.__ensure_writable()
+
         prefixes = [self.__encode(prefix) for prefix in prefixes]
 
         report = TraphWriteReport()
         # Note: with use_best_case=False an error will be raised if any of the prefixes is invalid
         webentity_id, valid_prefixes = self.__add_prefixes(prefixes, use_best_case=False)
         report.created_webentities[webentity_id] = valid_prefixes
+        self.__commit()
         return report
 
+    @__batch
     def delete_webentity(self, weid, weid_prefixes, check_for_corruption=True):
         '''
         Note: weid is only useful to check data consistency, but not strictly necessary to the method.
         It there is no weid, a consistency check will be skipped but the method will execute regardless.
         '''
+        self.__ensure_writable()
+
         weid_prefixes = [self.__encode(weid_prefix) for weid_prefix in weid_prefixes]
 
         # Note: weid is ignored if no check for data consistency
@@ -368,9 +916,16 @@ class Traph(object):
             node.unset_webentity()
             node.write()
 
+            self.__index_webentity_prefix(node, prefix)
+
+        self.__commit()
+
         return True
 
+    @__batch
     def add_prefix_to_webentity(self, prefix, weid):
+        self.__ensure_writable()
+
         prefix = self.__encode(prefix)
 
         # check prefix
@@ -380,9 +935,15 @@ class Traph(object):
         else:
             node.set_webentity(weid)
             node.write()
+
+            self.__index_webentity_prefix(node, prefix)
+            self.__commit()
             return True
 
+    @__batch
     def remove_prefix_from_webentity(self, prefix, weid=False):
+        self.__ensure_writable()
+
         prefix = self.__encode(prefix)
 
         # check prefix
@@ -390,6 +951,9 @@ class Traph(object):
         if not weid or node.webentity() == weid:
             node.unset_webentity()
             node.write()
+
+            self.__index_webentity_prefix(node, prefix)
+            self.__commit()
             return True
         else:
             raise TraphException('Prefix %s not attributed to webentity %s' % (prefix, node.webentity()))
@@ -491,11 +1055,11 @@ class Traph(object):
             raise TraphException('LRU %s is not a webentity prefix' % (prefix))
         return node.webentity()
 
-    def get_webentity_pages_iter(self, weid, prefixes):
+    def get_webentity_pages_iter(self, weid, prefixes, budget=None):
         '''
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget)
         pages = []
         for node, lru in self.webentity_page_nodes_iter(weid, prefixes):
             pages.append({
@@ -505,17 +1069,18 @@ class Traph(object):
 
             if state.should_yield(2000):
                 yield state
+                state.resume()
 
         yield state.finalize(pages)
 
     def get_webentity_pages(self, weid, prefixes):
         return run_iterator(self.get_webentity_pages_iter(weid, prefixes))
 
-    def get_webentity_crawled_pages_iter(self, weid, prefixes):
+    def get_webentity_crawled_pages_iter(self, weid, prefixes, budget=None):
         '''
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget)
         pages = []
         for node, lru in self.webentity_page_nodes_iter(weid, prefixes):
             if node.is_crawled():
@@ -526,18 +1091,19 @@ class Traph(object):
 
             if state.should_yield(2000):
                 yield state
+                state.resume()
 
         yield state.finalize(pages)
 
     def get_webentity_crawled_pages(self, weid, prefixes):
         return run_iterator(self.get_webentity_crawled_pages_iter(weid, prefixes))
 
-    def get_webentity_most_linked_pages_iter(self, weid, prefixes, pages_count=10):
+    def get_webentity_most_linked_pages_iter(self, weid, prefixes, pages_count=10, budget=None):
         '''
         Returns a list of objects {lru:, indegree:}
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget)
         pages = []
         c = 0
         for prefix in prefixes:
@@ -550,11 +1116,7 @@ class Traph(object):
             for node, lru in self.lru_trie.webentity_dfs_iter(starting_node, prefix):
                 if node.is_page():
 
-                    # Iterate over link nodes
-                    indegree = 0
-
-                    for linknode in self.link_store.link_nodes_iter(node.inlinks()):
-                        indegree += 1
+                    indegree = self.link_store.degree(node.inlinks())
 
                     c += 1
                     heapq.heappush(pages, (indegree, c, lru))
@@ -564,6 +1126,7 @@ class Traph(object):
 
                 if state.should_yield(2000):
                     yield state
+                    state.resume()
 
         sorted_pages = range(len(pages))
         i = len(pages) - 1
@@ -597,11 +1160,11 @@ class Traph(object):
 
         return list(weids)
 
-    def get_webentity_child_webentities_iter(self, weid, prefixes):
+    def get_webentity_child_webentities_iter(self, weid, prefixes, budget=None):
         '''
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget)
         weids = set()
         for prefix in prefixes:
             prefix = self.__encode(prefix)
@@ -617,26 +1180,27 @@ class Traph(object):
 
                 if state.should_yield(5000):
                     yield state
+                    state.resume()
 
         yield state.finalize(list(weids))
 
     def get_webentity_child_webentities(self, weid, prefixes):
         return run_iterator(self.get_webentity_child_webentities_iter(weid, prefixes))
 
-    def get_webentity_pagelinks_iter(self, weid, prefixes, include_inbound=False, include_internal=True, include_outbound=False):
+    def get_webentity_pagelinks_iter(self, weid, prefixes, include_inbound=False, include_internal=True, include_outbound=False, budget=None):
         '''
         Returns all or part of: pagelinks to the entity, internal pagelinks, pagelinks out of the entity.
         Default is only internal pagelinks.
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
 
-        # TODO: Can be optimized caching windups
-
-        state = TraphIteratorState()
+        # NOTE: LRUs are memoized by the trie & webentities are read from
+        # the webentity index, instead of winding up every link's page
+        state = self.__iterator_state(budget)
         pagelinks = []
 
-        source_node = self.lru_trie.node()
-        target_node = self.lru_trie.node()
+        windup_lru = self.lru_trie.windup_lru
+        page_webentity = self.webentity_index.webentity
 
         for prefix in prefixes:
             prefix = self.__encode(prefix)
@@ -653,50 +1217,48 @@ class Traph(object):
                 # Iterating over the page's outlinks
                 if node.has_outlinks() and (include_outbound or include_internal):
                     links_block = node.outlinks()
-                    for link_node in self.link_store.link_nodes_iter(links_block):
+                    for target_block, weight in self.link_store.links_iter(links_block):
 
-                        target_node.read(link_node.target())
-                        target_lru = self.lru_trie.windup_lru(target_node.block)
-                        target_webentity = self.lru_trie.windup_lru_for_webentity(target_node)
+                        target_lru = windup_lru(target_block)
+                        target_webentity = page_webentity(target_block)
 
                         if (include_outbound and target_webentity != weid) or (include_internal and target_webentity == weid):
-                            pagelinks.append([lru, target_lru, link_node.weight()])
+                            pagelinks.append([lru, target_lru, weight])
 
                         if state.should_yield(5000):
                             yield state
+                            state.resume()
 
                 # Iterating over the page's inlinks
                 if node.has_inlinks() and include_inbound:
                     links_block = node.inlinks()
-                    for link_node in self.link_store.link_nodes_iter(links_block):
+                    for source_block, weight in self.link_store.links_iter(links_block):
 
-                        source_node.read(link_node.target())
-                        source_lru = self.lru_trie.windup_lru(source_node.block)
-                        source_webentity = self.lru_trie.windup_lru_for_webentity(source_node)
+                        source_lru = windup_lru(source_block)
+                        source_webentity = page_webentity(source_block)
 
                         if source_webentity != weid:
-                            pagelinks.append([source_lru, lru, link_node.weight()])
+                            pagelinks.append([source_lru, lru, weight])
 
                         if state.should_yield(5000):
                             yield state
+                            state.resume()
 
         yield state.finalize(pagelinks)
 
     def get_webentity_pagelinks(self, weid, prefixes, include_inbound=False, include_internal=True, include_outbound=False):
         return run_iterator(self.get_webentity_pagelinks_iter(weid, prefixes, include_inbound=include_inbound, include_internal=include_internal, include_outbound=include_outbound))
 
-    def get_webentity_outlinks_iter(self, weid, prefixes):
+    def get_webentity_outlinks_iter(self, weid, prefixes, budget=None):
         '''
         Returns the list of cited web entities
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
 
-        state = TraphIteratorState()
-        done_blocks = set()
+        state = self.__iterator_state(budget)
+        webentities = {}
         weids = set()
 
-        target_node = self.lru_trie.node()
-
         for prefix in prefixes:
             prefix = self.__encode(prefix)
 
@@ -712,15 +1274,13 @@ class Traph(object):
                 # Iterating over the page's outlinks
                 if node.has_outlinks():
                     links_block = node.outlinks()
-                    for link_node in self.link_store.link_nodes_iter(links_block):
-                        target_node.read(link_node.target())
-                        if target_node.block not in done_blocks:
-                            target_webentity = self.lru_trie.windup_lru_for_webentity(target_node)
-                            done_blocks.add(target_node.block)
-                            weids.add(target_webentity)
+                    for target_block, _ in self.link_store.links_iter(links_block):
+                        if target_block not in webentities:
+                            weids.add(self.lru_trie.windup_webentity(target_block, webentities))
 
                         if state.should_yield(5000):
                             yield state
+                            state.resume()
 
         yield state.finalize(weids)
 
@@ -736,18 +1296,16 @@ class Traph(object):
 
         return len(self.get_webentity_outlinks(weid, prefixes))
 
-    def get_webentity_inlinks_iter(self, weid, prefixes):
+    def get_webentity_inlinks_iter(self, weid, prefixes, budget=None):
         '''
         Returns the list of citing web entities
         Note: the prefixes are supposed to match the webentity id. We do not check.
         '''
 
-        state = TraphIteratorState()
-        done_blocks = set()
+        state = self.__iterator_state(budget)
+        webentities = {}
         weids = set()
 
-        source_node = self.lru_trie.node()
-
         for prefix in prefixes:
             prefix = self.__encode(prefix)
 
@@ -763,15 +1321,13 @@ class Traph(object):
                 # Iterating over the page's inlinks
                 if node.has_inlinks():
                     links_block = node.inlinks()
-                    for link_node in self.link_store.link_nodes_iter(links_block):
-                        source_node.read(link_node.target())
-                        if source_node.block not in done_blocks:
-                            source_webentity = self.lru_trie.windup_lru_for_webentity(source_node)
-                            done_blocks.add(source_node.block)
-                            weids.add(source_webentity)
+                    for source_block, _ in self.link_store.links_iter(links_block):
+                        if source_block not in webentities:
+                            weids.add(self.lru_trie.windup_webentity(source_block, webentities))
 
                         if state.should_yield(5000):
                             yield state
+                            state.resume()
 
         yield state.finalize(weids)
 
@@ -805,56 +1361,33 @@ class Traph(object):
 
         pagelinks = []
 
-        source_node = self.lru_trie.node()
-        target_node = self.lru_trie.node()
-
         # Iterating over the page's outlinks
         if node.has_outlinks() and (include_outbound or include_internal):
             links_block = node.outlinks()
-            for link_node in self.link_store.link_nodes_iter(links_block):
+            for target_block, weight in self.link_store.links_iter(links_block):
 
-                target_node.read(link_node.target())
-                target_lru = self.lru_trie.windup_lru(target_node.block)
+                target_lru = self.lru_trie.windup_lru(target_block)
 
                 if (include_outbound and target_lru != lru) or (include_internal and target_lru == lru):
-                    pagelinks.append([lru, target_lru, link_node.weight()])
+                    pagelinks.append([lru, target_lru, weight])
 
         # Iterating over the page's inlinks
         if node.has_inlinks() and include_inbound:
             links_block = node.inlinks()
-            for link_node in self.link_store.link_nodes_iter(links_block):
+            for source_block, weight in self.link_store.links_iter(links_block):
 
-                source_node.read(link_node.target())
-                source_lru = self.lru_trie.windup_lru(source_node.block)
+                source_lru = self.lru_trie.windup_lru(source_block)
 
                 if source_lru != lru:
-                    pagelinks.append([source_lru, lru, link_node.weight()])
+                    pagelinks.append([source_lru, lru, weight])
 
         return pagelinks
 
     def get_page_indegree(self, lru, weighted=False):
-        '''
-        Convenience method relying on get_page_links (thus NOT more efficient)
-        '''
-        if weighted:
-            total = 0
-            for _, _, weight in self.get_page_links(lru, include_inbound=True, include_internal=False, include_outbound=False):
-                total += weight
-            return total
-        else:
-            return len(self.get_page_links(lru, include_inbound=True, include_internal=False, include_outbound=False))
+        return self.__get_page_degree(lru, out=False, weighted=weighted)
 
     def get_page_outdegree(self, lru, weighted=False):
-        '''
-        Convenience method relying on get_page_links (thus NOT more efficient)
-        '''
-        if weighted:
-            total = 0
-            for _, _, weight in self.get_page_links(lru, include_inbound=False, include_internal=False, include_outbound=True):
-                total += weight
-            return total
-        else:
-            return len(self.get_page_links(lru, include_inbound=False, include_internal=False, include_outbound=True))
+        return self.__get_page_degree(lru, out=True, weighted=weighted)
 
     def get_page_degree(self, lru, weighted=False):
         '''
@@ -872,8 +1405,6 @@ class Traph(object):
         graph = defaultdict(Counter)
         page_to_webentity = dict()
 
-        target_node = self.lru_trie.node()
-
         for node, source_webentity in self.lru_trie.dfs_with_webentity_iter():
 
             if not node.is_page() or not node.has_links(out=out):
@@ -886,88 +1417,134 @@ class Traph(object):
 
             # Iterating over the page's links
             links_block = node.links(out=out)
-            for link_node in self.link_store.link_nodes_iter(links_block):
-
-                target_block = link_node.target()
-                target_webentity = page_to_webentity.get(target_block)
-
-                if target_webentity is None:
-                    target_node.read(target_block)
-                    target_webentity = self.lru_trie.windup_lru_for_webentity(target_node)
+            for target_block, weight in self.link_store.links_iter(links_block):
 
-                    # Beware: it's possible that we could not find a webentity
-                    if not target_webentity:
-                        continue
+                # NOTE: the ancestors' webentities are memoized along the way
+                target_webentity = self.lru_trie.windup_webentity(target_block, page_to_webentity)
 
-                    page_to_webentity[target_block] = target_webentity
+                # Beware: it's possible that we could not find a webentity
+                if not target_webentity:
+                    continue
 
                 # Allowing auto links?
                 if not include_auto and source_webentity == target_webentity:
                     continue
 
                 # Adding to the graph
-                graph[source_webentity][target_webentity] += link_node.weight()
+                graph[source_webentity][target_webentity] += weight
 
         return graph
 
-    def get_webentities_links_iter(self, out=True, include_auto=False):
+    def get_webentities_links_iter(self, out=True, include_auto=False, processes=None, budget=None):
         '''
-        This method should be faster than the slow version because it avoids
-        unnecessary upward traversal.
-
-        Note that it is also possible to solve the links right away and store
-        them to solve their webentities later but this is most costly in RAM.
+        The webentity graph is computed once, using the webentity index to
+        solve the pages' webentities so that we only need a linear scan of
+        the trie's blocks, and is then maintained incrementally in RAM.
+        If processes is given, the scan is shared by a pool of processes
+        reading memory maps of the files (not available in memory, for
+        readers whose missing webentity index was rebuilt in memory, nor
+        while a journaled batch is in progress, in which case the scan is
+        done serially).
         '''
-        graph = defaultdict(Counter)
-        page_to_webentity = dict()
-        link_pointers = []
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget)
+
+        if self.webentity_graph is None:
+            edges = defaultdict(Counter)
+            self.webentity_graph_is_stale = False
+
+            # NOTE: the processes read the files, while a reader may only
+            # have rebuilt a missing webentity index in memory
+            # NOTE: the files lack the blocks of a journaled batch in progress
+            if (
+                processes and
+                not self.in_memory and
+                self.webentity_index_file is not None and
+                (self.journal is None or not self.journal.is_pending())
+            ):
+                self.flush()
+
+                partial_edges_iter = webentity_edges_iter(
+                    self.lru_trie_path,
+                    self.link_store_path,
+                    self.webentity_index_path,
+                    self.lru_trie_storage.count_blocks(),
+                    processes
+                )
 
-        # Solving the page => webentity relation
-        for node, source_webentity in self.lru_trie.dfs_with_webentity_iter():
-            if not node.is_page():
-                continue
+                for partial_edges in partial_edges_iter:
+                    for (source_webentity, target_webentity), weight in partial_edges.iteritems():
+                        edges[source_webentity][target_webentity] += weight
 
-            if not source_webentity:
-                continue
+                    yield state
 
-            page_to_webentity[node.block] = source_webentity
+            else:
+                page_to_webentity = self.webentity_index.load(self.lru_trie_storage)
 
-            if node.has_links(out=out):
-                link_pointers.append((source_webentity, node.links(out=out)))
+                for node in self.lru_trie.nodes_iter():
+                    if not node.is_page() or not node.has_outlinks():
+                        continue
 
-            if state.should_yield():
-                yield state
+                    source_webentity = page_to_webentity[node.block // LRU_TRIE_NODE_BLOCK_SIZE]
 
-        # Computing the links
-        for source_webentity, links_block in link_pointers:
+                    if not source_webentity:
+                        continue
 
-            for link_node in self.link_store.link_nodes_iter(links_block):
-                target_webentity = page_to_webentity.get(link_node.target())
+                    for target_block, weight in self.link_store.links_iter(node.outlinks()):
+                        target_webentity = page_to_webentity[target_block // LRU_TRIE_NODE_BLOCK_SIZE]
 
-                # The target page might not have a target webentity
-                if not target_webentity:
-                    continue
+                        # The target page might not have a target webentity
+                        if not target_webentity:
+                            continue
 
-                if not include_auto and source_webentity == target_webentity:
-                    continue
+                        # Adding to the graph
+                        edges[source_webentity][target_webentity] += weight
 
-                # Adding to the graph
-                graph[source_webentity][target_webentity] += link_node.weight()
+                        if state.should_yield(5000):
+                            yield state
+                            state.resume()
 
-                if state.should_yield(5000):
-                    yield state
+                    if state.should_yield():
+                        yield state
+                        state.resume()
+
+            graph = WebentityGraph(edges)
+
+            # NOTE: the graph is kept only if nothing was written meanwhile
+            if not self.webentity_graph_is_stale:
+                self.webentity_graph = graph
+        else:
+            graph = self.webentity_graph
+
+        yield state.finalize(graph.links(out=out, include_auto=include_auto))
+
+    def get_webentities_inlinks_iter(self, include_auto=False, budget=None):
+        return self.get_webentities_links_iter(out=False, include_auto=include_auto, budget=budget)
 
-        yield state.finalize(graph)
+    def get_webentities_outlinks_iter(self, include_auto=False, budget=None):
+        return self.get_webentities_links_iter(out=True, include_auto=include_auto, budget=budget)
 
-    def get_webentities_inlinks_iter(self, include_auto=False):
-        return self.get_webentities_links_iter(out=False, include_auto=include_auto)
+    def get_webentities_links(self, out=True, include_auto=False, processes=None):
+        return run_iterator(self.get_webentities_links_iter(out=out, include_auto=include_auto, processes=processes))
 
-    def get_webentities_outlinks_iter(self, include_auto=False):
-        return self.get_webentities_links_iter(out=True, include_auto=include_auto)
+    def get_webentities_links_changes(self, version=None, out=True, include_auto=False):
+        '''
+        Returns {version:, links:} where links are the webentity links whose
+        weight changed since the given version (a weight of 0 meaning the link
+        does not exist anymore) and version is the one to give next time.
+        Versions are opaque (epoch, version) tokens: the whole graph is
+        returned when no version is given or when the given one comes from a
+        former graph, since the graph kept in RAM is computed again each time
+        the Traph is opened, cleared or compacted.
+        '''
+        if version is None or self.webentity_graph is None:
+            links = self.get_webentities_links(out=out, include_auto=include_auto)
+        else:
+            links = self.webentity_graph.changes(version, out=out, include_auto=include_auto)
 
-    def get_webentities_links(self, out=True, include_auto=False):
-        return run_iterator(self.get_webentities_links_iter(out=out, include_auto=include_auto))
+        return {
+            'version': self.webentity_graph.token() if self.webentity_graph is not None else None,
+            'links': links
+        }
 
     def get_webentities_inlinks(self, include_auto=False):
         return self.get_webentities_links(out=False, include_auto=include_auto)
@@ -980,17 +1557,23 @@ class Traph(object):
 
         return lru_variations(prefix)
 
+    @__batch
     def add_page(self, lru):
         '''
         Returns a webentity creation report as {created_webentities: {weid:[prefixes], ...}}
         '''
+        self.__ensure_writable()
+
         lru = self.__encode(lru)
 
         node, report = self.__add_page(lru, crawled=True)
+        self.__commit()
 
         return report
 
+    @__batch
     def add_pages(self, lrus):
+        self.__ensure_writable()
 
         report = TraphWriteReport()
 
@@ -1003,9 +1586,14 @@ class Traph(object):
             node.flag_as_crawled()
             node.write()
 
+        self.__commit()
+
         return report
 
+    @__batch
     def add_links(self, links):
+        self.__ensure_writable()
+
         store = self.link_store
         report = TraphWriteReport()
 
@@ -1036,8 +1624,9 @@ class Traph(object):
 
             # Refreshing node's data
             source_node.refresh()
-            target_blocks = (pages[target_page].block for target_page in target_pages)
+            target_blocks = [pages[target_page].block for target_page in target_pages]
             store.add_outlinks(source_node, target_blocks)
+            self.__add_webentity_links(source_node.block, target_blocks)
 
         for target_page, source_pages in inlinks.items():
             target_node = pages[target_page]
@@ -1047,17 +1636,25 @@ class Traph(object):
             source_blocks = (pages[source_page].block for source_page in source_pages)
             store.add_inlinks(target_node, source_blocks)
 
+        self.__commit()
+
         return report
 
-    def index_batch_crawl_iter(self, data):
+    @__batch
+    def index_batch_crawl_iter(self, data, budget=None):
         '''
         data is must be a multimap 'source_lru' => 'target_lrus'
         '''
+        self.__ensure_writable()
+
         store = self.link_store
-        state = TraphIteratorState()
+        state = self.__iterator_state(budget, writes=True)
         report = TraphWriteReport()
+
+        # NOTE: pages are mapped to their block & inlinks are accumulated
+        # in compact arrays of source node indices, keyed by target block
         pages = dict()
-        inlinks = defaultdict(list)
+        inlinks = defaultdict(lambda: array(TRAPH_NODE_INDEX_TYPECODE))
 
         for source_page, target_pages in data.items():
             source_page = self.__encode(source_page)
@@ -1066,54 +1663,334 @@ class Traph(object):
             if source_page not in pages:
                 source_node, source_page_report = self.__add_page(source_page, crawled=True)
                 report += source_page_report
-                pages[source_page] = source_node
+                pages[source_page] = source_node.block
             else:
-                source_node = pages[source_page]
+                source_node = self.lru_trie.node(block=pages[source_page])
 
                 if not source_node.is_crawled():
-                    source_node.refresh()
                     source_node.flag_as_crawled()
                     source_node.write()
 
+            source_block = source_node.block
+            source_index = source_block // LRU_TRIE_NODE_BLOCK_SIZE
             target_blocks = []
 
             for target_page in target_pages:
                 target_page = self.__encode(target_page)
+                target_block = pages.get(target_page)
 
-                if target_page not in pages:
+                if target_block is None:
                     target_node, target_page_report = self.__add_page(target_page)
                     report += target_page_report
-                    pages[target_page] = target_node
-                    target_blocks.append(target_node.block)
+                    target_block = target_node.block
+                    pages[target_page] = target_block
 
                     if state.should_yield(200):
                         yield state
+                        state.resume()
 
-                else:
-                    target_blocks.append(pages[target_page].block)
-
-                # TODO: possible to store block as value rather
-                inlinks[target_page].append(source_page)
+                target_blocks.append(target_block)
+                inlinks[target_block].append(source_index)
 
             source_node.refresh()
             store.add_outlinks(source_node, target_blocks)
+            self.__add_webentity_links(source_block, target_blocks)
 
-        for target_page, source_pages in inlinks.items():
-            target_node = pages[target_page]
-            target_node.refresh()
-            source_blocks = (pages[source_page].block for source_page in source_pages)
+        # Writing the inlinks in the order of the target blocks
+        target_node = self.lru_trie.node()
+
+        for target_block in sorted(inlinks):
+            target_node.read(target_block)
+            source_blocks = (index * LRU_TRIE_NODE_BLOCK_SIZE for index in inlinks[target_block])
             store.add_inlinks(target_node, source_blocks)
 
             if state.should_yield():
                 yield state
+                state.resume()
+
+        self.__commit()
 
         yield state.finalize(report)
 
     def index_batch_crawl(self, data):
         return run_iterator(self.index_batch_crawl_iter(data))
 
+    @__batch
+    def index_crawl_stream_iter(self, pairs, run_size=TRAPH_STREAM_RUN_SIZE, budget=None):
+        '''
+        Streaming version of index_batch_crawl_iter consuming an iterable of
+        (source_lru, target_lrus) pairs with bounded memory: outlinks are
+        written as they come while inlinks are spilled to sorted temporary
+        runs which are merged in the end, a bounded number at a time.
+        Note: a source given several times has its outlinks added each time.
+        '''
+        self.__ensure_writable()
+
+        store = self.link_store
+        state = self.__iterator_state(budget, writes=True)
+        report = TraphWriteReport()
+        folder = None if self.in_memory else os.path.dirname(self.lru_trie_path)
+        pages = {}
+        inlinks = []
+        runs = SortedRuns(folder)
+
+        try:
+            for source_page, target_pages in pairs:
+                source_page = self.__encode(source_page)
+                source_node, source_page_report = self.__add_page(source_page, crawled=True)
+                report += source_page_report
+                source_block = source_node.block
+                pages[source_page] = source_block
+
+                target_blocks = []
+
+                for target_page in target_pages:
+                    target_page = self.__encode(target_page)
+                    target_block = pages.get(target_page)
+
+                    # NOTE: known pages are not added again
+                    if target_block is None:
+                        if len(pages) >= TRAPH_STREAM_PAGES_MEMO_SIZE:
+                            pages.clear()
+
+                        target_node, target_page_report = self.__add_page(target_page)
+                        report += target_page_report
+                        target_block = target_node.block
+                        pages[target_page] = target_block
+
+                    target_blocks.append(target_block)
+                    inlinks.append((target_block, source_block))
+
+                    if state.should_yield(200):
+                        yield state
+                        state.resume()
+
+                source_node.refresh()
+                store.add_outlinks(source_node, target_blocks)
+                self.__add_webentity_links(source_block, target_blocks)
+
+                if len(inlinks) >= run_size:
+                    runs.spill(inlinks)
+                    inlinks = []
+
+            # Merging the inlinks, sorted by target
+            if runs:
+                if inlinks:
+                    runs.spill(inlinks)
+                    inlinks = []
+
+                inlinks = runs.merge()
+            else:
+                inlinks.sort()
+
+            target_node = self.lru_trie.node()
+
+            for target_block, group in groupby(inlinks, key=itemgetter(0)):
+                target_node.read(target_block)
+                store.add_inlinks(target_node, (source_block for _, source_block in group))
+
+                if state.should_yield():
+                    yield state
+                    state.resume()
+        finally:
+            runs.close()
+
+        self.__commit()
+
+        yield state.finalize(report)
+
+    def index_crawl_stream(self, pairs, run_size=TRAPH_STREAM_RUN_SIZE):
+        return run_iterator(self.index_crawl_stream_iter(pairs, run_size=run_size))
+
+    def flush(self):
+        if self.in_memory or self.read_only or self.lru_trie_file.closed:
+            return
+
+        self.lru_trie_storage.flush()
+        self.links_store_storage.flush()
+        self.webentity_index_storage.flush()
+
+    def refresh(self):
+        '''
+        Re-reads the trie's header to follow the batches published by a
+        shared writer & returns the current generation, which is odd if the
+        writer is in the middle of a batch.
+        '''
+        header = self.lru_trie.header
+        generation = header.generation()
+        epoch = header.epoch()
+
+        self.lru_trie_storage.refresh(0)
+        header.read()
+
+        # NOTE: a compaction leaves the former files in the middle of a batch
+        # & swaps the new ones in, which readers follow
+        if header.is_being_written() and self.read_only and self.__files_were_swapped():
+            self.__release()
+            self.__reopen()
+            header = self.lru_trie.header
+
+        elif header.generation() == generation and header.epoch() == epoch:
+            return generation
+
+        # The writer published something: dropping every stale state
+        self.lru_trie_storage.refresh()
+        self.links_store_storage.refresh()
+        self.webentity_index_storage.refresh()
+
+        header.read()
+        self.link_store.header.read()
+
+        # NOTE: the memoized LRUs only go stale if the writer cleared the trie
+        if header.epoch() != epoch or header.generation() < generation:
+            self.lru_trie.windup_cache.clear()
+
+        # NOTE: the index of a compacted Traph is only rebuilt afterwards
+        if (
+            self.read_only and
+            self.webentity_index_file is None and
+            os.path.isfile(self.webentity_index_path)
+        ):
+            self.webentity_index_file = open(self.webentity_index_path, 'rb', 0)
+
+        if self.webentity_index_file is None:
+            self.webentity_index_storage.clear()
+            self.webentity_index.build(self.lru_trie)
+
+        # NOTE: one cannot map an empty file so its map may be missing
+        elif (
+            isinstance(self.webentity_index_storage, MemoryStorage) or
+            (self.mmap and not isinstance(self.webentity_index_storage, MemMapStorage))
+        ):
+            self.webentity_index_storage = self.__webentity_index_storage()
+            self.webentity_index.storage = self.webentity_index_storage
+
+            if self.instrumentation is not None:
+                self.__instrument()
+
+        self.webentity_graph = None
+        self.webentity_graph_is_stale = False
+
+        return header.generation()
+
+    def snapshot(self, fn, *args, **kwargs):
+        '''
+        Calls fn (typically a read method of the Traph, whose results should
+        not be lazy) against a consistent state of the files. The reader waits
+        for the writer to be done with its current batch & calls fn again if
+        the writer published a new generation in the meantime, raising if no
+        consistent snapshot could be read within TRAPH_SNAPSHOT_TIMEOUT.
+
+        Note: the writer must be opened with shared=True for this to work.
+        '''
+        if not self.read_only:
+            return fn(*args, **kwargs)
+
+        deadline = time.time() + TRAPH_SNAPSHOT_TIMEOUT
+
+        while True:
+            if time.time() > deadline:
+                raise TraphException('Timed out waiting for the writer to publish a consistent snapshot.')
+
+            generation = self.refresh()
+
+            if generation % 2:
+                time.sleep(TRAPH_SNAPSHOT_POLL_DELAY)
+                continue
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+
+                # NOTE: the error may come from a torn read
+                if self.refresh() == generation:
+                    raise
+
+                continue
+
+            if self.refresh() == generation:
+                return result
+
+    def enable_instrumentation(self):
+        '''
+        Starts recording the number of calls & the time spent in the hot
+        paths (storage I/O, node & chunk packing, sibling, child & chain
+        hops, windups). Costs nothing until enabled.
+        '''
+        if self.instrumentation is not None:
+            return
+
+        self.instrumentation = Instrumentation()
+        self.__instrument()
+
+    def disable_instrumentation(self):
+        if self.instrumentation is None:
+            return
+
+        self.instrumentation.uninstall()
+        self.instrumentation = None
+
+    def stats(self):
+        '''
+        Returns the counters recorded since the instrumentation was enabled
+        (or reset) as a dict mapping each counter's name, e.g.
+        "storage.lru_trie.read" or "lru_trie.sibling_hop", to its count &
+        cumulated time in seconds. Timings are inclusive.
+        '''
+        if self.instrumentation is None:
+            return {}
+
+        return self.instrumentation.stats()
+
+    def reset_stats(self):
+        if self.instrumentation is not None:
+            self.instrumentation.reset()
+
+    def trace(self, fn, *args, **kwargs):
+        '''
+        Calls fn (typically a method of the Traph, whose results should not
+        be lazy) & returns a (result, stats) tuple, stats being the counters
+        recorded during the call only. The instrumentation is enabled for the
+        duration of the call if needed.
+        '''
+        enabled = self.instrumentation is not None
+
+        if not enabled:
+            self.enable_instrumentation()
+
+        before = self.instrumentation.stats()
+
+        try:
+            result = fn(*args, **kwargs)
+            after = self.instrumentation.stats()
+        finally:
+            if not enabled:
+                self.disable_instrumentation()
+
+        return result, stats_difference(before, after)
+
     def close(self):
 
+        # NOTE: a journaled batch interrupted in the middle of an iterator is
+        # discarded, just as if the process had crashed
+
+        # Publishing an interrupted batch, if any
+        self.__publish()
+
+        self.__release()
+
+    # Method closing the files without publishing anything
+    def __release(self):
+
+        # Writing pending blocks
+        self.flush()
+
+        # Releasing the memory maps
+        if self.mmap:
+            for storage in (self.lru_trie_storage, self.links_store_storage, self.webentity_index_storage):
+                if isinstance(storage, MemMapStorage):
+                    storage.release()
+
         # Cleanup
         if self.lru_trie_file:
             self.lru_trie_file.close()
@@ -1121,24 +1998,155 @@ class Traph(object):
         if self.link_store_file:
             self.link_store_file.close()
 
+        if self.webentity_index_file:
+            self.webentity_index_file.close()
+
+        if self.journal_file:
+            self.journal_file.close()
+
+    @__batch
+    def rebalance(self):
+        '''
+        Maintenance method rebalancing the trie's sibling BSTs, which can
+        degenerate when stems are inserted in a (near) sorted order.
+        '''
+        self.__ensure_writable()
+
+        self.lru_trie.rebalance()
+        self.__commit()
+
+    @__batch
+    def compact(self):
+        '''
+        Maintenance method rewriting the trie & the link store using the
+        TraphBuilder, so that the space taken by dead nodes & by the unused
+        capacity of the link chunks is reclaimed, the trie's nodes being laid
+        out in DFS order & the links of each page contiguously. The new files
+        are written aside & then swapped in, an interrupted compaction being
+        either finished or discarded when the Traph is opened again.
+        Returns the size, in bytes, of the files before & after.
+        Note: the pages & links are held in RAM during the compaction, and
+        the readers of a shared Traph wait until it is done to follow the
+        new files.
+        '''
+
+        # NOTE: the builder imports this module, hence the late import
+        from traph_builder import TraphBuilder
+
+        self.__ensure_writable()
+
+        generation = self.lru_trie.header.generation()
+        epoch = self.lru_trie.header.epoch()
+
+        sizes = {
+            'lru_trie': {'before': len(self.lru_trie_storage)},
+            'link_store': {'before': len(self.links_store_storage)}
+        }
+
+        # Collecting everything the builder needs, in a single DFS
+        pages = []
+        links = []
+        webentities = defaultdict(list)
+        webentity_creation_rules = []
+
+        for node, lru in self.lru_trie.dfs_iter():
+            if node.has_webentity():
+                webentities[node.webentity()].append(lru)
+
+            if node.has_webentity_creation_rule():
+                webentity_creation_rules.append(lru)
+
+            if not node.is_page():
+                continue
+
+            pages.append((lru, node.is_crawled()))
+
+            if node.has_outlinks():
+                for target_block, weight in self.link_store.links_iter(node.outlinks()):
+                    links.append((lru, self.lru_trie.windup_lru(target_block), weight))
+
+        pages.sort()
+
+        if self.in_memory:
+            compaction_folder = tempfile.mkdtemp(prefix='traph-compaction-')
+        else:
+            compaction_folder = os.path.join(self.folder, TRAPH_COMPACTION_FOLDER)
+            shutil.rmtree(compaction_folder, ignore_errors=True)
+
+        try:
+            builder = TraphBuilder(compaction_folder, overwrite=True, encoding=self.encoding)
+            builder.build(
+                pages,
+                links,
+                webentities,
+                webentity_creation_rules,
+                last_webentity_id=self.lru_trie.header.last_webentity_id()
+            )
+
+            del pages
+            del links
+
+            if self.in_memory:
+                for storage, name in zip((self.lru_trie_storage, self.links_store_storage), TRAPH_COMPACTED_FILES):
+                    storage.clear()
+
+                    with open(os.path.join(compaction_folder, name), 'rb') as f:
+                        storage.write(f.read())
+
+                self.webentity_index_storage.clear()
+            else:
+
+                # Marking the new files as complete, once durable
+                for name in TRAPH_COMPACTED_FILES:
+                    fsync_path(os.path.join(compaction_folder, name))
+
+                open(os.path.join(compaction_folder, TRAPH_COMPACTION_MARKER), 'w').close()
+                fsync_path(compaction_folder)
+
+        except BaseException:
+            shutil.rmtree(compaction_folder, ignore_errors=True)
+            raise
+
+        # NOTE: the former files are left in the middle of a batch, so that
+        # readers wait until they find the new files
+        if self.in_memory:
+            shutil.rmtree(compaction_folder)
+        else:
+            self.__release()
+            recover_compaction(self.folder)
+
+        self.__reopen(create=False)
+        self.__renew_header(generation, epoch)
+
+        # The webentity index maps the former blocks & must be rebuilt
+        self.__begin()
+        self.webentity_index.build(self.lru_trie)
+        self.__commit()
+
+        sizes['lru_trie']['after'] = len(self.lru_trie_storage)
+        sizes['link_store']['after'] = len(self.links_store_storage)
+
+        return sizes
+
+    @__batch
     def clear(self):
-        self.close()
+        self.__ensure_writable()
+
+        generation = self.lru_trie.header.generation()
+        epoch = self.lru_trie.header.epoch()
+
+        self.__release()
 
         if self.in_memory:
             self.lru_trie_storage.clear()
             self.links_store_storage.clear()
-        else:
-            self.lru_trie_file = open(self.lru_trie_path, 'wb+')
-            self.link_store_file = open(self.link_store_path, 'wb+')
-
-            self.lru_trie_storage.file = self.lru_trie_file
-            self.links_store_storage.file = self.link_store_file
+            self.webentity_index_storage.clear()
 
-        # LRU Trie re-initialization
-        self.lru_trie = LRUTrie(self.lru_trie_storage, encoding=self.encoding)
+        self.__reopen(create=True)
+        self.__renew_header(generation, epoch)
 
-        # Link Store re-initialization
-        self.link_store = LinkStore(self.links_store_storage)
+        self.__begin()
+        self.__commit()
 
     # =========================================================================
     # Iteration methods
@@ -1148,8 +2156,8 @@ class Traph(object):
             if not page_node.links(out=out):
                 continue
 
-            for link_node in self.link_store.link_nodes_iter(page_node.links(out=out)):
-                yield lru, self.lru_trie.windup_lru(link_node.target())
+            for target_block, _ in self.link_store.links_iter(page_node.links(out=out)):
+                yield lru, self.lru_trie.windup_lru(target_block)
 
     def pages_iter(self):
         return self.lru_trie.pages_iter()
@@ -1172,6 +2180,44 @@ class Traph(object):
                 if node.is_page():
                     yield node, lru
 
+    # =========================================================================
+    # Export methods
+    # =========================================================================
+    def export_arrays(self, links=True):
+        '''
+        Method decoding the whole Traph into NumPy arrays, for analytics.
+
+        Returns a dict of columns indexed by row, row i being the trie's
+        block LRU_TRIE_FIRST_DATA_BLOCK + i * LRU_TRIE_NODE_BLOCK_SIZE:
+        block, flags, webentity, left, right, child, parent, outlinks,
+        inlinks, along with page_webentity (the webentity of each page).
+
+        If links is True, the outlinks & inlinks are also exported as CSR
+        arrays whose indices are rows: outlinks_indptr, outlinks_indices,
+        outlinks_weights & the same for inlinks.
+        '''
+        np = require_numpy()
+
+        arrays = lru_trie_arrays(
+            self.lru_trie_storage.read_blocks(0, self.lru_trie_storage.count_blocks())
+        )
+
+        first = LRU_TRIE_FIRST_DATA_BLOCK // LRU_TRIE_NODE_BLOCK_SIZE
+        index = self.webentity_index.load(self.lru_trie_storage)
+        arrays['page_webentity'] = np.frombuffer(index, dtype=np.uint32)[first:].copy()
+
+        if links:
+            data = self.links_store_storage.read_blocks(0, self.links_store_storage.count_blocks())
+
+            for direction in ('outlinks', 'inlinks'):
+                indptr, indices, weights = link_store_csr(data, arrays[direction])
+
+                arrays[direction + '_indptr'] = indptr
+                arrays[direction + '_indices'] = indices
+                arrays[direction + '_weights'] = weights
+
+        return arrays
+
     # =========================================================================
     # Counting methods
     # =========================================================================
@@ -0,0 +1,415 @@
+# =============================================================================
+# Traph Builder Class
+# =============================================================================
+#
+# Class bulk loading a Traph's files from a sorted stream of pages, typically
+# to rebuild a corpus after data corruption.
+#
+# Instead of inserting LRUs one at a time, the builder walks the sorted stream
+# once and only needs to keep in memory the siblings of the nodes along the
+# current path. This means it can:
+#
+#   1) Allocate the trie's blocks in DFS order, which is good for locality.
+#   2) Write perfectly balanced sibling BSTs since every sibling is known
+#      when its parent is closed.
+#   3) Write every page's links in a single chunk (or in as few chunks as
+#      possible), the whole link store being written sequentially.
+#
+# Note that the links & the page => block index are still kept in RAM.
+#
+# Note also that the builder does not apply webentity creation rules:
+# webentities are expected to be given (they are stored in Hyphe's MongoDB).
+#
+import errno
+import heapq
+import os
+from collections import Counter
+from itertools import chain, groupby
+from traph import TraphException
+from traph_write_report import TraphWriteReport
+from storage import FileStorage, CachedFileStorage
+from lru_trie import LRUTrie, LRU_TRIE_NODE_BLOCK_SIZE
+from lru_trie.node import LRUTrieNode, LRU_TRIE_FIRST_DATA_BLOCK
+from link_store import LinkStore, LINK_STORE_BLOCK_SIZE
+from link_store.chunk import (
+    LinkStoreChunk,
+    LINK_STORE_FIRST_DATA_BLOCK,
+    LINK_STORE_CHUNK_MAX_CAPACITY
+)
+from helpers import lru_iter
+
+# Kinds of items found in the stream (in the order they should be applied)
+BUILDER_PAGE = 0
+BUILDER_WEBENTITY = 1
+BUILDER_WEBENTITY_CREATION_RULE = 2
+
+# Number of blocks cached by the builder's storages
+BUILDER_CACHE_SIZE = 65536
+
+
+# Function returning the capacities of the chunks storing the given number of
+# links, since a chunk's capacity cannot exceed a given maximum
+def chunk_capacities(degree):
+    while degree > 0:
+        capacity = min(degree, LINK_STORE_CHUNK_MAX_CAPACITY)
+        yield capacity
+        degree -= capacity
+
+
+# Function returning the number of blocks needed to store the given number of
+# links
+def links_blocks(degree):
+    return sum(1 + capacity for capacity in chunk_capacities(degree))
+
+
+# Main class
+class TraphBuilder(object):
+
+    # =========================================================================
+    # Constructor
+    # =========================================================================
+    def __init__(self, folder, overwrite=False, encoding='utf-8',
+                 cache_size=BUILDER_CACHE_SIZE):
+
+        # Properties
+        self.folder = folder
+        self.overwrite = overwrite
+        self.encoding = encoding
+        self.cache_size = cache_size
+        self.lru_trie_path = os.path.join(folder, 'lru_trie.dat')
+        self.link_store_path = os.path.join(folder, 'link_store.dat')
+        self.webentity_index_path = os.path.join(folder, 'webentity_index.dat')
+
+    # =========================================================================
+    # Internal methods
+    # =========================================================================
+    def __encode(self, string):
+        if isinstance(string, str):
+            return string
+
+        return string.encode(self.encoding)
+
+    def __stream(self, pages, webentities, webentity_creation_rules):
+        items = []
+
+        for weid, prefixes in webentities.items():
+            for prefix in prefixes:
+                items.append((self.__encode(prefix), BUILDER_WEBENTITY, weid))
+
+        for prefix in webentity_creation_rules:
+            items.append((self.__encode(prefix), BUILDER_WEBENTITY_CREATION_RULE, None))
+
+        items.sort()
+
+        pages = (
+            (self.__encode(lru), BUILDER_PAGE, crawled)
+            for lru, crawled in pages
+        )
+
+        return heapq.merge(pages, items)
+
+    # Method allocating the blocks needed by a node and writing its tail
+    def __allocate(self, node):
+        node.block = self.next_block
+
+        if node.tail:
+            for data in node.pack_tail():
+                self.next_block += LRU_TRIE_NODE_BLOCK_SIZE
+                self.lru_trie_storage.write(data, self.next_block)
+
+        self.next_block += LRU_TRIE_NODE_BLOCK_SIZE
+
+    # Method linking a sorted group of siblings as a balanced BST
+    def __balance(self, group, lo, hi, root=None):
+        if lo > hi:
+            return None
+
+        mid = root if root is not None else (lo + hi) // 2
+        node = group[mid]
+
+        left = self.__balance(group, lo, mid - 1)
+        right = self.__balance(group, mid + 1, hi)
+
+        if left is not None:
+            node.set_left(left.block)
+
+        if right is not None:
+            node.set_right(right.block)
+
+        return node
+
+    def __write_group(self, group):
+        for node in group:
+            self.lru_trie_storage.write(node.pack(), node.block)
+
+    # Method closing the deepest node of the current path
+    def __close(self):
+        depth = len(self.path)
+        node = self.path.pop()
+        group = self.groups.pop()
+
+        if not group:
+            return
+
+        node.set_child(self.__balance(group, 0, len(group) - 1).block)
+
+        # The top level nodes' blocks are only known at the end
+        if depth == 1:
+            self.top_level_groups.append((node, group))
+        else:
+            self.__write_group(group)
+
+    def __open(self, stem):
+        depth = len(self.path)
+        node = LRUTrieNode(self.lru_trie_storage, stem=stem)
+
+        if depth > 0:
+            self.__allocate(node)
+
+            if depth > 1:
+                node.set_parent(self.path[-1].block)
+
+        self.groups[-1].append(node)
+        self.path.append(node)
+        self.groups.append([])
+
+    # Method building the trie and returning the page => block index
+    def __build_lru_trie(self, stream, outdegrees, indegrees, last_webentity_id=0):
+        self.path = []
+        self.groups = [[]]
+        self.top_level_groups = []
+
+        # NOTE: the root block is reserved for the top level BST's root
+        self.next_block = LRU_TRIE_FIRST_DATA_BLOCK + LRU_TRIE_NODE_BLOCK_SIZE
+
+        # NOTE: since the links chunks will be written in the pages' order,
+        # we can allocate them right now: outlinks first, then inlinks
+        next_links_blocks = {
+            True: LINK_STORE_FIRST_DATA_BLOCK,
+            False: (
+                LINK_STORE_FIRST_DATA_BLOCK +
+                sum(links_blocks(degree) for degree in outdegrees.itervalues()) *
+                LINK_STORE_BLOCK_SIZE
+            )
+        }
+
+        pages = {}
+        last_lru = None
+
+        for lru, kind, value in stream:
+            if last_lru is not None and lru < last_lru:
+                raise TraphException('Pages should be sorted: "%s" came after "%s".' % (lru, last_lru))
+
+            stems = list(lru_iter(lru))
+
+            if not stems:
+                continue
+
+            # Finding the common path with the last lru
+            if lru != last_lru:
+                depth = 0
+
+                while (
+                    depth < len(self.path) and
+                    depth < len(stems) and
+                    self.path[depth].stem() == stems[depth]
+                ):
+                    depth += 1
+
+                while len(self.path) > depth:
+                    self.__close()
+
+                for stem in stems[depth:]:
+                    self.__open(stem)
+
+            last_lru = lru
+            node = self.path[-1]
+
+            if kind == BUILDER_PAGE:
+                if value:
+                    node.flag_as_crawled()
+
+                if node.is_page():
+                    continue
+
+                node.flag_as_page()
+                pages[lru] = node.block
+
+                for out, degrees in ((True, outdegrees), (False, indegrees)):
+                    degree = degrees.get(lru)
+
+                    if degree:
+                        node.set_links(next_links_blocks[out], out=out)
+                        next_links_blocks[out] += links_blocks(degree) * LINK_STORE_BLOCK_SIZE
+
+            elif kind == BUILDER_WEBENTITY:
+                node.set_webentity(value)
+                last_webentity_id = max(last_webentity_id, value)
+
+            else:
+                node.flag_as_webentity_creation_rule()
+
+        while self.path:
+            self.__close()
+
+        # Writing the top level, whose root must be stored in the root block
+        top_level = self.groups.pop()
+
+        if top_level:
+            candidates = [i for i, node in enumerate(top_level) if not node.tail]
+
+            if not candidates:
+                raise TraphException('At least one top level stem should fit in a single block.')
+
+            root = min(candidates, key=lambda i: abs(i - len(top_level) // 2))
+
+            for i, node in enumerate(top_level):
+                if i == root:
+                    node.block = LRU_TRIE_FIRST_DATA_BLOCK
+                else:
+                    self.__allocate(node)
+
+                if node.is_page():
+                    pages[node.stem()] = node.block
+
+            self.__balance(top_level, 0, len(top_level) - 1, root=root)
+
+            for parent, group in self.top_level_groups:
+                for node in group:
+                    node.set_parent(parent.block)
+
+                self.__write_group(group)
+
+            self.__write_group(top_level)
+
+        self.lru_trie.header.set_last_webentity_id(last_webentity_id)
+        self.lru_trie.header.write()
+
+        return pages
+
+    # Method writing the links chunks, in the pages' order
+    def __build_link_store(self, links, pages, out=True):
+        for page, group in groupby(links, key=lambda link: link[0][0 if out else 1]):
+            group = list(group)
+            next_block = len(self.link_store_storage)
+            data = []
+            i = 0
+
+            for capacity in chunk_capacities(len(group)):
+                chunk = LinkStoreChunk(self.link_store_storage, capacity=capacity)
+                next_block += chunk.nb_blocks() * LINK_STORE_BLOCK_SIZE
+
+                for (source_page, target_page), weight in group[i:i + capacity]:
+                    chunk.append(pages[target_page if out else source_page], weight)
+
+                i += capacity
+
+                # The last chunk of the chain has no next chunk
+                if i < len(group):
+                    chunk.set_next(next_block)
+
+                data.append(chunk.pack())
+
+            self.link_store_storage.write(''.join(data))
+
+    # =========================================================================
+    # Public interface
+    # =========================================================================
+    def build(self, pages, links=None, webentities=None,
+              webentity_creation_rules=None, last_webentity_id=0):
+        '''
+        pages must be an iterable of (lru, crawled) tuples sorted by lru and
+        must contain every source & target of the given links.
+        links must be an iterable of (source_lru, target_lru) tuples, or of
+        (source_lru, target_lru, weight) tuples.
+        webentities must be a dict webentity id => prefixes.
+        webentity_creation_rules must be an iterable of rule prefixes.
+        last_webentity_id is the minimum id stored in the trie's header, so
+        that the ids of deleted webentities are not given again.
+        '''
+        report = TraphWriteReport()
+
+        # Ensuring the given folder exists
+        try:
+            os.makedirs(self.folder)
+        except OSError as exception:
+            if exception.errno == errno.EEXIST and os.path.isdir(self.folder):
+                pass
+            else:
+                raise
+
+        if not self.overwrite and (
+            os.path.isfile(self.lru_trie_path) or
+            os.path.isfile(self.link_store_path)
+        ):
+            raise TraphException('A traph already exists in "%s".' % self.folder)
+
+        # NOTE: the webentity index will be rebuilt by the Traph when opened
+        if os.path.isfile(self.webentity_index_path):
+            os.remove(self.webentity_index_path)
+
+        lru_trie_file = open(self.lru_trie_path, 'wb+')
+        link_store_file = open(self.link_store_path, 'wb+')
+
+        self.lru_trie_storage = CachedFileStorage(
+            LRU_TRIE_NODE_BLOCK_SIZE,
+            lru_trie_file,
+            cache_size=self.cache_size
+        )
+
+        # NOTE: the link store is written sequentially and never read back
+        self.link_store_storage = FileStorage(
+            LINK_STORE_BLOCK_SIZE,
+            link_store_file
+        )
+
+        self.lru_trie = LRUTrie(self.lru_trie_storage, encoding=self.encoding)
+        self.link_store = LinkStore(self.link_store_storage)
+
+        try:
+            stream = self.__stream(
+                pages,
+                webentities or {},
+                webentity_creation_rules or []
+            )
+
+            weighted_links = Counter()
+
+            for link in links or []:
+                weighted_links[(self.__encode(link[0]), self.__encode(link[1]))] += (
+                    link[2] if len(link) > 2 else 1
+                )
+
+            links = weighted_links
+
+            outdegrees = Counter(source_page for source_page, _ in links)
+            indegrees = Counter(target_page for _, target_page in links)
+
+            pages = self.__build_lru_trie(stream, outdegrees, indegrees, last_webentity_id)
+            report.nb_created_pages = len(pages)
+
+            del outdegrees
+            del indegrees
+
+            for page in chain.from_iterable(links):
+                if page not in pages:
+                    raise TraphException('Linked page "%s" is not among the given pages.' % page)
+
+            self.__build_link_store(sorted(links.iteritems()), pages, out=True)
+            self.__build_link_store(
+                sorted(links.iteritems(), key=lambda link: (link[0][1], link[0][0])),
+                pages,
+                out=False
+            )
+
+            self.link_store.header.set_nb_links(len(links))
+            self.link_store.header.write()
+
+            self.lru_trie_storage.flush()
+            self.link_store_storage.flush()
+
+        finally:
+            lru_trie_file.close()
+            link_store_file.close()
+
+        return report
@@ -2,25 +2,115 @@
 # Traph Iterator State Class
 # =============================================================================
 #
+# Class representing the state of the Traph's cooperative iterators, deciding
+# when they should yield & recording statistics about the slices of work done
+# between two yields.
 #
+# Iterators either yield every N iterations, N being given by the call site,
+# or, when given a time budget (the Traph's one or the one given to a single
+# call), as soon as the current slice has lasted for more than this budget.
+#
+# The iterators writing a batch give callbacks pausing it when they yield &
+# beginning it again when they are resumed.
+#
+# NOTE: python 2 has no monotonic clock, which is why negative durations,
+# caused by the system's clock being adjusted, are ignored.
+#
+import time
+
+clock = time.time
 
 
 class TraphIteratorState(object):
 
-    def __init__(self):
+    def __init__(self, budget=None, on_yield=None, on_resume=None):
         self.done = False
         self.result = None
         self.n_iterations = 0
 
+        # Time budget, in seconds, of a slice
+        self.budget = budget
+
+        # Callbacks run when the iterator yields & when it is resumed
+        self.on_yield = on_yield
+        self.on_resume = on_resume
+
+        # Statistics
+        self.n_slices = 0
+        self.started_at = clock()
+        self.slice_started_at = self.started_at
+        self.busy_time = 0.0
+        self.max_slice_time = 0.0
+        self.wall_time = None
+
+    def __end_slice(self, now):
+        slice_time = max(0.0, now - self.slice_started_at)
+
+        self.n_slices += 1
+        self.busy_time += slice_time
+
+        if slice_time > self.max_slice_time:
+            self.max_slice_time = slice_time
+
+        # NOTE: the next slice starts when the iterator is resumed
+        self.slice_started_at = None
+
+    def __yield(self, now):
+        self.__end_slice(now)
+
+        if self.on_yield is not None:
+            self.on_yield()
+
+        return True
+
+    # Method called by the iterators right after yielding, when resumed
+    def resume(self):
+        self.slice_started_at = clock()
+
+        if self.on_resume is not None:
+            self.on_resume()
+
     def should_yield(self, yield_frequency=1000):
         self.n_iterations += 1
-        return not self.n_iterations % yield_frequency
+
+        if self.slice_started_at is None:
+            self.slice_started_at = clock()
+
+        budget = self.budget
+
+        if budget is None:
+            if self.n_iterations % yield_frequency:
+                return False
+
+            return self.__yield(clock())
+
+        now = clock()
+
+        if 0 <= now - self.slice_started_at < budget:
+            return False
+
+        return self.__yield(now)
 
     def finalize(self, result):
+        now = clock()
+
+        if self.slice_started_at is not None:
+            self.__end_slice(now)
+
         self.done = True
         self.result = result
+        self.wall_time = max(0.0, now - self.started_at)
         return self
 
+    def stats(self):
+        return {
+            'iterations': self.n_iterations,
+            'slices': self.n_slices,
+            'busy_time': self.busy_time,
+            'max_slice_time': self.max_slice_time,
+            'wall_time': self.wall_time
+        }
+
 
 def run_iterator(iterator):
     for state in iterator:
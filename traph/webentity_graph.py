@@ -0,0 +1,164 @@
+# =============================================================================
+# Webentity Graph Class
+# =============================================================================
+#
+# Class representing the aggregated webentity => webentity weighted links.
+# The graph is kept in RAM and is maintained incrementally each time links
+# are added or each time pages move from a webentity to another one.
+#
+# Every modification of an edge is stamped with a version number so that one
+# can retrieve the edges modified since a given version instead of the whole
+# graph. The changelog is compacted from time to time by keeping only the
+# last modification of each edge, which is enough to answer those queries.
+#
+# Since versions start over each time the graph is computed again (when the
+# Traph is opened, cleared or compacted), every graph also has a random
+# epoch, versions only being comparable within the same epoch.
+#
+from bisect import bisect_right
+from uuid import uuid4
+from collections import defaultdict, Counter
+
+# Minimum size of the changelog before it can be compacted
+WEBENTITY_GRAPH_MIN_CHANGELOG_SIZE = 10000
+
+
+# Main class
+class WebentityGraph(object):
+
+    # =========================================================================
+    # Constructor
+    # =========================================================================
+    def __init__(self, edges=None):
+
+        # Properties
+        self.edges = defaultdict(Counter)
+        self.nb_edges = 0
+        self.epoch = uuid4().hex
+        self.version = 0
+
+        # NOTE: changelog is stored as two lists to be able to bisect versions
+        self.changelog_versions = []
+        self.changelog_edges = []
+
+        if edges:
+            for source, targets in edges.iteritems():
+                for target, weight in targets.iteritems():
+                    if weight > 0:
+                        self.edges[source][target] = weight
+                        self.nb_edges += 1
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s edges=%(edges)s epoch=%(epoch)s version=%(version)s>'
+        ) % {
+            'class_name': class_name,
+            'edges': self.nb_edges,
+            'epoch': self.epoch,
+            'version': self.version
+        }
+
+    # =========================================================================
+    # Internal methods
+    # =========================================================================
+    def __compact_changelog(self):
+        last_versions = dict(zip(self.changelog_edges, self.changelog_versions))
+        changelog = sorted((version, edge) for edge, version in last_versions.iteritems())
+
+        self.changelog_versions = [version for version, _ in changelog]
+        self.changelog_edges = [edge for _, edge in changelog]
+
+    # =========================================================================
+    # Mutation methods
+    # =========================================================================
+
+    # Method adding the given weight (possibly negative) to an edge
+    def add(self, source, target, weight):
+        if not source or not target or not weight:
+            return
+
+        targets = self.edges[source]
+        current_weight = targets.get(target, 0)
+        new_weight = current_weight + weight
+
+        if new_weight > 0:
+            targets[target] = new_weight
+
+            if not current_weight:
+                self.nb_edges += 1
+        else:
+            if current_weight:
+                del targets[target]
+                self.nb_edges -= 1
+
+            if not targets:
+                del self.edges[source]
+
+        self.version += 1
+        self.changelog_versions.append(self.version)
+        self.changelog_edges.append((source, target))
+
+        if len(self.changelog_edges) > max(WEBENTITY_GRAPH_MIN_CHANGELOG_SIZE, 2 * self.nb_edges):
+            self.__compact_changelog()
+
+    # =========================================================================
+    # Read methods
+    # =========================================================================
+    def weight(self, source, target):
+        targets = self.edges.get(source)
+
+        if not targets:
+            return 0
+
+        return targets.get(target, 0)
+
+    # Method returning the graph, in the format of Traph.get_webentities_links
+    def links(self, out=True, include_auto=False):
+        graph = defaultdict(Counter)
+
+        for source, targets in self.edges.iteritems():
+            for target, weight in targets.iteritems():
+                if not include_auto and source == target:
+                    continue
+
+                if out:
+                    graph[source][target] = weight
+                else:
+                    graph[target][source] = weight
+
+        return graph
+
+    # Method returning the (epoch, version) token identifying the graph's
+    # current state
+    def token(self):
+        return (self.epoch, self.version)
+
+    # Method returning the edges modified since the given token's version
+    # along with their current weight, 0 meaning the edge does not exist
+    # anymore, or the whole graph if the token comes from another epoch
+    def changes(self, token, out=True, include_auto=False):
+        if token is None:
+            return self.links(out=out, include_auto=include_auto)
+
+        epoch, version = token
+
+        if epoch != self.epoch or version > self.version:
+            return self.links(out=out, include_auto=include_auto)
+
+        graph = defaultdict(dict)
+        i = bisect_right(self.changelog_versions, version)
+
+        for source, target in set(self.changelog_edges[i:]):
+            if not include_auto and source == target:
+                continue
+
+            weight = self.weight(source, target)
+
+            if out:
+                graph[source][target] = weight
+            else:
+                graph[target][source] = weight
+
+        return graph
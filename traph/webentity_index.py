@@ -0,0 +1,104 @@
+# =============================================================================
+# Webentity Index Class
+# =============================================================================
+#
+# Class representing the persistent index mapping the trie's page blocks to
+# the id of the webentity they belong to (i.e. the webentity of their nearest
+# webentity prefix). This way, one does not need to perform a DFS over the
+# whole trie to solve the pages' webentities.
+#
+# The index is an array of 32 bits webentity ids (0 meaning no webentity)
+# having one slot per trie block.
+#
+import struct
+from array import array
+from lru_trie.node import LRU_TRIE_NODE_BLOCK_SIZE
+
+# Binary format
+WEBENTITY_INDEX_FORMAT = 'I'
+WEBENTITY_INDEX_STRUCT = struct.Struct(WEBENTITY_INDEX_FORMAT)
+WEBENTITY_INDEX_BLOCK_SIZE = WEBENTITY_INDEX_STRUCT.size
+
+
+# Main class
+class WebentityIndex(object):
+
+    # =========================================================================
+    # Constructor
+    # =========================================================================
+    def __init__(self, storage):
+
+        # Properties
+        self.storage = storage
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s slots=%(slots)s>'
+        ) % {
+            'class_name': class_name,
+            'slots': self.storage.count_blocks()
+        }
+
+    # =========================================================================
+    # Utilities
+    # =========================================================================
+
+    # Method returning the offset of the given trie block's slot
+    def offset(self, block):
+        return block // LRU_TRIE_NODE_BLOCK_SIZE * WEBENTITY_INDEX_BLOCK_SIZE
+
+    # =========================================================================
+    # Read methods
+    # =========================================================================
+
+    # Method returning the webentity of the given page block
+    def webentity(self, block):
+        data = self.storage.read(self.offset(block))
+
+        if data is None:
+            return None
+
+        return WEBENTITY_INDEX_STRUCT.unpack(data)[0] or None
+
+    # Method returning the whole index as an array of webentity ids, indexed
+    # by block // LRU_TRIE_NODE_BLOCK_SIZE, for the given trie storage
+    def load(self, lru_trie_storage):
+        index = array(WEBENTITY_INDEX_FORMAT)
+        data = self.storage.read_blocks(0, self.storage.count_blocks())
+
+        if data:
+            index.fromstring(str(data))
+
+        missing = lru_trie_storage.count_blocks() - len(index)
+
+        if missing > 0:
+            index.extend([0] * missing)
+
+        return index
+
+    # =========================================================================
+    # Mutation methods
+    # =========================================================================
+
+    # Method setting the webentity of the given page block
+    def set_webentity(self, block, weid):
+        offset = self.offset(block)
+        length = len(self.storage)
+
+        # Padding the index if needed
+        if offset > length:
+            self.storage.write('\0' * (offset - length), length)
+
+        self.storage.write(WEBENTITY_INDEX_STRUCT.pack(weid or 0), offset)
+
+    # Method building the index from scratch using the given trie
+    def build(self, lru_trie):
+        index = array(WEBENTITY_INDEX_FORMAT, [0]) * lru_trie.storage.count_blocks()
+
+        for node, weid in lru_trie.dfs_with_webentity_iter():
+            if node.is_page() and weid:
+                index[node.block // LRU_TRIE_NODE_BLOCK_SIZE] = weid
+
+        self.storage.write(index.tostring(), 0)